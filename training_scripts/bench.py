@@ -0,0 +1,1513 @@
+"""
+bench.py — offline micro-benchmarks for train.py hot paths
+
+Each benchmark builds its own synthetic inputs under a temp dir, so nothing here
+touches Datasets/ or runs/.
+
+Usage:
+    python bench.py coco                          # streaming vs json.loads COCO indexing (wall time + peak RSS)
+    python bench.py coco --images 50000 --anns 400000
+    python bench.py prepare --workers 1 2 4 8     # label-writing throughput vs process count
+    python bench.py rows                          # extract_csv() box -> row conversion, rows/s
+    python bench.py label --batch 1 4 8 16        # label-video fps per --batch-size (CPU)
+    python bench.py every --every 5               # label-video --every speedup + labels match every=1 subset
+    python bench.py writer --writers 0 4          # label-video end-to-end time, inline vs background writes
+    python bench.py backend                       # PyTorch vs ONNX Runtime: cold start + ms/frame (CPU)
+    python bench.py serve --clips 8 --workers 1   # N short clips: cold CLI process per clip vs one `serve` instance
+    python bench.py serve --backend onnx          # same on ONNX Runtime; fails unless jobs reuse the warmed model
+    python bench.py segments --segments 2 4       # one video: serial vs N parallel segments, ID switches at cuts
+    python bench.py stats --rows 5000000          # stats summary: whole file vs --chunk-rows, peak RSS ceiling
+    python bench.py suite --save                  # offline regression suite: record a baseline ...
+    python bench.py suite --threshold 0.15        # ... then exit 1 when throughput / peak RSS regress >15%
+    python bench.py suite --model stub            # same, with a zero-cost stub model (post-processing only)
+    python bench.py roi --crop 320 640            # --roi: fps + player / ball recall vs full-frame 1280
+    python bench.py keyframe --every 2 5 10       # csv --detect-every K: fps gain vs position error against K=1
+    python bench.py upload --rate 100             # roboflow_upload.py vs the old thread pool, local stand-in API
+    python bench.py materialize --images 5000     # collect / roboflow / clean: old serial code vs new, time + disk
+    python bench.py analyze --minutes 90          # analyze on a synthetic match: vectorized vs per-row loop, --follow
+    python bench.py startup --budget 0.5          # light subcommands: import time + wall; exits 1 over budget
+
+Model benchmarks use runs/yolo26n_football/weights/best.pt unless --weights is given.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import json
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+def peak_rss_mb():
+    status = Path("/proc/self/status")
+    if status.exists():         # Linux ru_maxrss survives fork+exec, VmHWM does not
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1e3
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6      # bytes on macOS
+
+
+# ── Synthetic inputs ───────────────────────────────────────────────────────────
+
+def make_coco(path, n_images=20000, n_anns=200000, seed=0):
+    """Write a COCO-instances-shaped file (with polygon segmentations, like the real one)."""
+    rnd = random.Random(seed)
+    images = [{"license": 1, "file_name": f"{i:012d}.jpg", "coco_url": "", "height": 480, "width": 640,
+               "date_captured": "2013-11-14 11:18:45", "flickr_url": "", "id": i}
+              for i in range(1, n_images + 1)]
+    anns = []
+    for a in range(1, n_anns + 1):
+        x, y = rnd.uniform(0, 600), rnd.uniform(0, 440)
+        w, h = rnd.uniform(1, 40), rnd.uniform(1, 40)
+        anns.append({"segmentation": [[round(rnd.uniform(0, 640), 2) for _ in range(32)]],
+                     "area": w * h, "iscrowd": int(rnd.random() < 0.01),
+                     "image_id": rnd.randint(1, n_images), "bbox": [x, y, w, h],
+                     "category_id": rnd.choice((1, 1, 37, 3, 18, 62)), "id": a})
+    cats = [{"supercategory": "x", "id": c, "name": str(c)} for c in range(1, 91)]
+    path.write_text(json.dumps({"info": {"description": "synthetic"}, "licenses": [],
+                                "images": images, "annotations": anns, "categories": cats}))
+    return path
+
+
+def make_video(path, frames=250, size=(1280, 720), fps=25, seed=0, truth=None):
+    """A pitch-coloured clip with moving 'players' and a 'ball'.
+
+    If `truth` is a list, one (n, 5) [class, x1, y1, x2, y2] array per frame is appended
+    to it (0 = player, 1 = ball; boxes clipped to the frame).
+    """
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    W, H = size
+    pos = rng.uniform((0, 0), (W, H), (22, 2)); vel = rng.normal(0, 3, (22, 2))
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for i in range(frames):
+        f = np.full((H, W, 3), (40, 140, 40), np.uint8)
+        pos = (pos + vel) % (W, H)
+        for k, (x, y) in enumerate(pos.astype(int)):
+            cv2.rectangle(f, (x, y), (x + W // 80, y + H // 18), (255, 255, 255) if k < 11 else (30, 30, 200), -1)
+        bx, by, r = int(W / 2 + W / 3 * np.sin(i / 20)), int(H / 2), max(3, W // 250)
+        cv2.circle(f, (bx, by), r, (250, 250, 250), -1)
+        out.write(f)
+        if truth is not None:
+            xy = pos.astype(int)
+            boxes = np.concatenate([np.c_[np.zeros(len(xy)), xy, xy + (W // 80, H // 18)],
+                                    [[1, bx - r, by - r, bx + r, by + r]]]).astype(float)
+            boxes[:, 1:] = boxes[:, 1:].clip(0, (W - 1, H - 1, W - 1, H - 1))
+            truth.append(boxes)
+    out.release()
+    return path
+
+
+def use_weights(train, weights):
+    """Point train.best_weights() at `weights` (default: the repo's trained n model)."""
+    weights = Path(weights) if weights else train.best_weights("n")
+    if not weights.exists():
+        sys.exit(f"[bench] No weights at {weights} — train first or pass --weights")
+    train.best_weights = lambda size: weights
+
+
+def temp_root(tmp, weights):
+    """A throwaway repo root (train.py + runs/.../best.pt) for spawned workers, which use train.ROOT."""
+    shutil.copy(HERE / "train.py", tmp / "train.py")
+    w = tmp / "runs" / "yolo26n_football" / "weights"
+    w.mkdir(parents=True)
+    (w / "best.pt").symlink_to(Path(weights).resolve())
+    if Path(weights).with_suffix(".onnx").exists():
+        (w / "best.onnx").symlink_to(Path(weights).with_suffix(".onnx").resolve())
+    return tmp
+
+
+def run_train(root, call, env=None):
+    """Run `train.<call>` in a fresh interpreter rooted at `root`; returns wall seconds."""
+    code = f"import sys; sys.path.insert(0, {str(root)!r}); import train; train.{call}"
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], capture_output=True, check=True, cwd=root,
+                   env={**os.environ, "CUDA_VISIBLE_DEVICES": "", **(env or {})})
+    return time.perf_counter() - t0
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+# ── coco: streaming index vs json.loads ────────────────────────────────────────
+
+def _legacy_index(ann_file, keep):
+    """The pre-streaming prepare() indexing path, kept here as the reference."""
+    data = json.loads(ann_file.read_text())
+    img_info = {i["id"]: i for i in data["images"]}
+    by_image = defaultdict(list)
+    for ann in data["annotations"]:
+        if ann["category_id"] in keep and not ann.get("iscrowd", 0):
+            by_image[ann["image_id"]].append(ann)
+    return img_info, by_image
+
+
+def _run_coco(mode, ann_file):
+    import train
+    base = peak_rss_mb()
+    t0 = time.perf_counter()
+    if mode == "stream":
+        _, by_image, _ = train.index_coco(Path(ann_file))
+    else:
+        _, by_image = _legacy_index(Path(ann_file), train.COCO_KEEP)
+    print(json.dumps({"mode": mode, "seconds": time.perf_counter() - t0,
+                      "peak_mb": peak_rss_mb() - base, "images": len(by_image)}))
+
+
+def bench_coco(n_images, n_anns):
+    with tempfile.TemporaryDirectory() as tmp:
+        ann_file = make_coco(Path(tmp) / "instances.json", n_images, n_anns)
+        print(f"[bench] coco: {ann_file.stat().st_size / 1e6:.0f} MB, {n_images:,} images, {n_anns:,} annotations")
+        for mode in ("json", "stream"):        # fresh interpreter each, so peak RSS is not shared
+            out = subprocess.run([sys.executable, __file__, "_coco", mode, str(ann_file)],
+                                 capture_output=True, text=True, check=True, cwd=HERE)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"  {r['mode']:<7} {r['seconds']:7.2f} s   peak +{r['peak_mb']:7.1f} MB   ({r['images']:,} images kept)")
+
+
+# ── prepare: label writing vs --workers ────────────────────────────────────────
+
+def make_coco_root(root, n_images, n_anns):
+    """Synthetic Datasets/coco2017 tree: annotations plus empty image files."""
+    (root / "annotations").mkdir(parents=True)
+    for split, n_img, n_ann in (("train2017", n_images, n_anns), ("val2017", n_images // 10, n_anns // 10)):
+        make_coco(root / "annotations" / f"instances_{split}.json", n_img, n_ann)
+        img_dir = root / "images" / split
+        img_dir.mkdir(parents=True)
+        for i in range(1, n_img + 1):
+            if i % 50: (img_dir / f"{i:012d}.jpg").touch()     # leave a few missing, like a partial download
+    return root
+
+
+def tree_digest(*dirs):
+    h = hashlib.sha1()
+    for d in dirs:
+        for f in sorted(Path(d).rglob("*")):
+            if f.is_file():
+                h.update(f.name.encode()); h.update(f.read_bytes())
+    return h.hexdigest()
+
+
+def bench_prepare(workers, n_images, n_anns):
+    import train
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        train.ROOT, train.COCO_ROOT = tmp, make_coco_root(tmp / "coco2017", n_images, n_anns)
+        (tmp / "data").mkdir()
+        print(f"[bench] prepare: {n_images:,} images, {n_anns:,} annotations (train split), {os.cpu_count()} CPUs")
+        ref = None
+        for n in workers:
+            shutil.rmtree(train.COCO_ROOT / "labels", ignore_errors=True)
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                train.prepare(workers=n, full=True)
+            dt = time.perf_counter() - t0
+            digest = tree_digest(train.COCO_ROOT / "labels", tmp / "data" / "train.txt", tmp / "data" / "val.txt")
+            ref = ref or digest
+            print(f"  workers={n:<3} {dt:7.2f} s   {n_images * 1.1 / dt:9,.0f} img/s   "
+                  f"{'identical' if digest == ref else 'OUTPUT DIFFERS'}")
+        for f in list((train.COCO_ROOT / "images" / "val2017").iterdir())[:20]:
+            f.unlink()                                      # small delta: a few images disappear
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            train.prepare(workers=workers[0])
+        summary = [l.strip() for l in out.getvalue().splitlines() if "written" in l]
+        print(f"  incremental  {time.perf_counter() - t0:7.2f} s   " + " | ".join(summary))
+
+
+# ── rows: extract_csv() box conversion ─────────────────────────────────────────
+
+def make_boxes(n, seed=0, tracked=True):
+    """Random ultralytics Boxes for one 1920x1080 frame (needs torch + ultralytics)."""
+    import torch
+    from ultralytics.engine.results import Boxes
+    g  = torch.Generator().manual_seed(seed)
+    xy = torch.rand(n, 2, generator=g) * torch.tensor([1800., 1000.])
+    wh = torch.rand(n, 2, generator=g) * 80 + 2
+    cols = [xy, xy + wh]
+    if tracked: cols.append(torch.arange(1, n + 1, dtype=torch.float32)[:, None])
+    cols += [torch.rand(n, 1, generator=g), (torch.rand(n, 1, generator=g) < 0.05).float()]
+    return Boxes(torch.cat(cols, 1), (1080, 1920))
+
+
+def _legacy_rows(i, boxes, class_names):
+    """The pre-vectorization extract_csv() inner loop, kept here as the reference."""
+    rows = []
+    for box in boxes:
+        cls = int(box.cls.item())
+        x1, y1, x2, y2 = [round(v, 1) for v in box.xyxy[0].tolist()]
+        rows.append([i, int(box.id.item()) if box.id is not None else -1,
+                     class_names[cls], round(float(box.conf.item()), 4),
+                     x1, y1, x2, y2, round((x1+x2)/2, 1), round((y1+y2)/2, 1)])
+    return rows
+
+
+def bench_rows(frames, per_frame):
+    import train
+    boxes = [make_boxes(per_frame, seed=i) for i in range(frames)]
+    n = frames * per_frame
+    t0 = time.perf_counter()
+    old = [row for i, b in enumerate(boxes) for row in _legacy_rows(i, b, train.CLASS_NAMES)]
+    t_old = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = [list(row) for i, b in enumerate(boxes) for row in train.detection_rows(train.detection_columns(i, b))]
+    t_new = time.perf_counter() - t0
+    differ = sum(o != r for o, r in zip(old, new))
+    print(f"[bench] rows: {frames:,} frames x {per_frame} boxes")
+    print(f"  per-box .item()  {n / t_old:12,.0f} rows/s")
+    print(f"  vectorized       {n / t_new:12,.0f} rows/s   ({t_old / t_new:.1f}x)")
+    print(f"  rows differing from the per-box path: {differ}")
+
+
+# ── label: batched inference ───────────────────────────────────────────────────
+
+def bench_label(batches, frames, imgsz, weights):
+    import train
+    use_weights(train, weights)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        video = make_video(tmp / "clip.mp4", frames)
+        train.ROOT = tmp
+        print(f"[bench] label-video: {frames} frames 1280x720, imgsz={imgsz}, CPU")
+        for bs in batches:
+            t0 = time.perf_counter()
+            with quiet():
+                train.label_video(video, imgsz=imgsz, batch_size=bs)
+            dt = time.perf_counter() - t0
+            print(f"  batch={bs:<3} {frames / dt:7.1f} fps")
+
+
+# ── every: decode-side frame skipping ──────────────────────────────────────────
+
+def bench_every(every, frames, imgsz, weights):
+    """label-video --every N vs every frame: speedup, and the kept frames' labels
+    must equal the every=1 labels for the same frame indices."""
+    import train
+    use_weights(train, weights)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        video = make_video(tmp / "clip.mp4", frames)
+        train.ROOT = tmp
+        labels = tmp / "data" / "labeled" / "labels"
+        runs = {}
+        for n in (1, every):
+            shutil.rmtree(tmp / "data", ignore_errors=True)
+            t0 = time.perf_counter()
+            with quiet():
+                train.label_video(video, imgsz=imgsz, every=n)
+            runs[n] = time.perf_counter() - t0, {f.name: f.read_bytes() for f in labels.glob("*.txt")}
+        (t_all, all_labels), (t_n, kept) = runs[1], runs[every]
+        expected = {k: v for k, v in all_labels.items() if int(k.rsplit("_", 1)[1][:-4]) % every == 0}
+        print(f"[bench] label-video: {frames} frames, every={every}")
+        print(f"  every=1      {t_all:7.2f} s")
+        print(f"  every={every:<6} {t_n:7.2f} s   ({t_all / t_n:.1f}x)")
+        print(f"  labels: {'match' if kept == expected else 'MISMATCH'} ({len(kept)} files)")
+        if kept != expected: sys.exit(1)
+
+
+# ── writer: background image / label writes ────────────────────────────────────
+
+def bench_writer(writers, frames, imgsz, preview_pct, weights):
+    import train
+    use_weights(train, weights)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        video = make_video(tmp / "clip.mp4", frames)
+        train.ROOT = tmp
+        print(f"[bench] label-video: {frames} frames 1280x720, preview {preview_pct}%, {os.cpu_count()} CPUs")
+        for n in writers:
+            shutil.rmtree(tmp / "data", ignore_errors=True)
+            t0 = time.perf_counter()
+            with quiet():
+                train.label_video(video, imgsz=imgsz, preview_pct=preview_pct, writers=n)
+            dt = time.perf_counter() - t0
+            print(f"  writers={n:<3} {dt:7.2f} s   {frames / dt:6.1f} fps")
+
+
+# ── backend: PyTorch vs ONNX Runtime ───────────────────────────────────────────
+
+def _run_cold(backend, weights, imgsz):
+    """Child process: import + load + first inference, as a fresh CLI invocation would."""
+    t0 = time.perf_counter()
+    import numpy as np
+    import train
+    train.best_weights = lambda size: Path(weights)
+    model = train.load_model("n", backend)
+    kw = train.run_args(model, imgsz)
+    with quiet():
+        model.predict(np.zeros((720, 1280, 3), np.uint8), verbose=False, **kw)
+    print(json.dumps({"cold_s": time.perf_counter() - t0}))
+
+
+def bench_backend(frames, imgsz, threads, weights):
+    import train
+    use_weights(train, weights)
+    pt = train.best_weights("n")
+    if not pt.with_suffix(".onnx").exists():
+        sys.exit(f"[bench] {pt.with_suffix('.onnx')} missing — run `train.py export --imgsz {imgsz}` first")
+    with tempfile.TemporaryDirectory() as tmp:
+        video = make_video(Path(tmp) / "clip.mp4", frames)
+        imgs = [f for _, f in train.VideoFrames(video)]
+        print(f"[bench] backend: {frames} frames 1280x720, imgsz={imgsz}, {os.cpu_count()} CPUs")
+        for backend in ("pt", "onnx"):
+            out = subprocess.run([sys.executable, __file__, "_cold", backend, str(pt), str(imgsz)],
+                                 capture_output=True, text=True, check=True, cwd=HERE,
+                                 env={**os.environ, "CUDA_VISIBLE_DEVICES": ""})
+            cold = json.loads(out.stdout.strip().splitlines()[-1])["cold_s"]
+            with quiet():
+                model = train.load_model("n", backend, threads)
+                kw = {**train.run_args(model, imgsz), "device": "cpu"}
+                for f in imgs[:3]: model.predict(f, verbose=False, **kw)     # warm-up
+            lat = []
+            for f in imgs:
+                t0 = time.perf_counter()
+                model.predict(f, verbose=False, **kw)
+                lat.append(time.perf_counter() - t0)
+            lat.sort()
+            print(f"  {backend:<5} cold start {cold:6.2f} s   {sum(lat) / len(lat) * 1e3:7.1f} ms/frame mean   "
+                  f"{lat[len(lat) // 2] * 1e3:7.1f} ms p50   imgsz={kw['imgsz']}")
+
+
+# ── serve: resident models vs a cold process per clip ─────────────────────────
+
+def bench_serve(clips, frames, imgsz, workers, port, weights, backend="pt"):
+    import signal
+    from concurrent.futures import ThreadPoolExecutor
+    import train
+    use_weights(train, weights)
+    if backend == "onnx" and not train.best_weights("n").with_suffix(".onnx").exists():
+        sys.exit(f"[bench] {train.best_weights('n').with_suffix('.onnx')} missing — run `train.py export` first")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = temp_root(Path(tmp), train.best_weights("n"))
+        videos = [make_video(tmp / f"clip{i}.mp4", frames, (640, 360), seed=i) for i in range(clips)]
+        env = {**os.environ, "CUDA_VISIBLE_DEVICES": ""}
+        print(f"[bench] serve: {clips} clips x {frames} frames 640x360, imgsz={imgsz}, {backend}, "
+              f"{workers} worker(s), {os.cpu_count()} CPUs")
+
+        cold = sum(run_train(tmp, f"extract_csv({str(v)!r}, imgsz={imgsz}, backend={backend!r})") for v in videos)
+        outs = [tmp / "runs" / f"{v.stem}_detections.csv" for v in videos]
+        ref = [hashlib.sha1(o.read_bytes()).hexdigest() for o in outs]
+
+        t0 = time.perf_counter()
+        srv = subprocess.Popen([sys.executable, str(tmp / "train.py"), "serve", "--port", str(port),
+                                "--workers", str(workers), "--warm", f"n:{backend}"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, cwd=tmp, env=env)
+        try:
+            for line in srv.stdout:
+                if "Ready" in line: break
+            else:
+                sys.exit("[bench] serve exited during warm-up")
+            ready = time.perf_counter() - t0
+            url = f"http://127.0.0.1:{port}"
+            t0 = time.perf_counter()
+            with quiet(), ThreadPoolExecutor(clips) as pool:
+                jobs = list(pool.map(lambda v: train.submit_job(url, "csv", {"video_in": str(v), "imgsz": imgsz,
+                                                                             "backend": backend}), videos))
+            served = time.perf_counter() - t0
+            import urllib.request
+            with urllib.request.urlopen(f"{url}/metrics") as resp:
+                metrics = json.load(resp)
+        finally:
+            srv.send_signal(signal.SIGINT)
+            srv.wait(timeout=30)
+        same = [hashlib.sha1(o.read_bytes()).hexdigest() for o in outs] == ref
+
+    lat = metrics["latency"]["csv"]
+    print(f"  cold CLI   {cold:7.2f} s total   {cold / clips:6.2f} s/clip")
+    print(f"  serve      {served:7.2f} s total   {served / clips:6.2f} s/clip   (+{ready:.2f} s one-off warm-up)")
+    print(f"             latency p50 {lat['latency_p50_s']:.2f} s  p95 {lat['latency_p95_s']:.2f} s  "
+          f"run p50 {lat['run_p50_s']:.2f} s   max queued wait {max(j['wait_s'] for j in jobs):.2f} s")
+    # every job must have run on the warmed model: one cached model per worker, nothing loaded cold
+    reused = all(len(keys) == 1 and keys[0].startswith(f"n:{backend}") for keys in metrics["models"].values())
+    print(f"  speedup    {cold / served:.2f}x   outputs {'identical' if same else 'DIFFER'}   "
+          f"warmed model {'reused' if reused else 'NOT reused'} "
+          f"({', '.join(k for keys in metrics['models'].values() for k in keys)})")
+    if not (same and reused):
+        sys.exit(1)
+
+
+# ── segments: one video split into parallel time ranges ───────────────────────
+
+def boundary_switches(ref, out, cuts, min_iou=0.5):
+    """Tracks continuing across each cut in `ref` (serial run) whose `out` ids change there.
+
+    A ref box is followed into `out` by its best same-class IoU match in that frame.
+    Returns (switches, crossing) summed over all cuts.
+    """
+    import numpy as np
+    import train
+
+    def ids_at(df, f, boxes, cls):
+        d = df[df.frame == f]
+        if not len(d) or not len(boxes): return np.full(len(boxes), -1)
+        iou = train.box_iou(boxes, d[["x1", "y1", "x2", "y2"]].to_numpy())
+        iou[cls[:, None] != d["class"].to_numpy()[None, :]] = 0
+        best = iou.argmax(1)
+        return np.where(iou[np.arange(len(boxes)), best] >= min_iou, d.track_id.to_numpy()[best], -1)
+
+    switches = crossing = 0
+    for b in cuts:
+        before, after = ref[ref.frame == b - 1], ref[ref.frame == b]
+        both = before.merge(after, on="track_id", suffixes=("_0", "_1"))
+        both = both[both.track_id >= 0]
+        crossing += len(both)
+        if not len(both): continue
+        cls = both["class_0"].to_numpy()
+        id0 = ids_at(out, b - 1, both[["x1_0", "y1_0", "x2_0", "y2_0"]].to_numpy(), cls)
+        id1 = ids_at(out, b, both[["x1_1", "y1_1", "x2_1", "y2_1"]].to_numpy(), cls)
+        switches += int(((id0 != id1) | (id0 < 0)).sum())
+    return switches, crossing
+
+
+def bench_segments(segments, frames, overlap, imgsz, weights):
+    import numpy as np
+    import pandas as pd
+    import train
+    use_weights(train, weights)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = temp_root(Path(tmp), train.best_weights("n"))
+        video = make_video(tmp / "match.mp4", frames, (640, 360))
+        out = tmp / "runs" / "match_detections.csv"
+        print(f"[bench] segments: {frames} frames 640x360, imgsz={imgsz}, overlap={overlap}, {os.cpu_count()} CPUs")
+        serial = run_train(tmp, f"extract_csv({str(video)!r}, imgsz={imgsz})")
+        ref = pd.read_csv(out)
+        print(f"  serial     {serial:7.2f} s   {frames / serial:6.1f} fps   {ref.track_id.nunique()} track ids")
+        for n in segments:
+            dt = run_train(tmp, f"extract_csv_segments({str(video)!r}, imgsz={imgsz}, segments={n}, overlap={overlap})")
+            got = pd.read_csv(out)
+            cuts = np.linspace(0, frames, n + 1).astype(int)[1:-1]
+            sw, crossing = boundary_switches(ref, got, cuts)
+            print(f"  {n:>2} segs    {dt:7.2f} s   {frames / dt:6.1f} fps   {serial / dt:5.2f}x   "
+                  f"{got.track_id.nunique()} track ids   ID switches at cuts {sw}/{crossing}   "
+                  f"rows {len(got) - len(ref):+d} vs serial")
+
+
+# ── stats: in-memory vs chunked summary ───────────────────────────────────────
+
+def make_detections(path, fmt, rows, per_frame=25, seed=0):
+    """A synthetic extract_csv() output: `per_frame` detections per frame, ~10% ball."""
+    import numpy as np
+    import train
+    rng = np.random.default_rng(seed)
+    with train.DetectionWriter(path, fmt) as w:
+        for start in range(0, rows, 1 << 18):
+            n = min(1 << 18, rows - start)
+            x1 = rng.uniform(0, 1800, n).round(1)
+            y1 = rng.uniform(0, 1000, n).round(1)
+            w.write({"frame": np.arange(start, start + n) // per_frame, "track_id": rng.integers(1, 5000, n),
+                     "class": (rng.random(n) < 0.1).astype(np.int8), "conf": rng.uniform(0.25, 1, n).round(4),
+                     "x1": x1, "y1": y1, "x2": x1 + 40, "y2": y1 + 90, "cx": x1 + 20, "cy": y1 + 45})
+    return path
+
+
+def _run_stats(mode, path, chunk_rows):
+    import pandas, pyarrow.parquet                 # noqa: F401  (imports are not part of the measurement)
+    import train
+    base = peak_rss_mb()
+    t0 = time.perf_counter()
+    if mode == "memory":
+        s = train.stats_summary(train.read_detections(path, ["frame", "track_id", "class", "conf"]))
+    else:
+        s = train.stats_summary_chunked(path, int(chunk_rows))
+    summary = {k: s[k] for k in ("detections", "frames", "frames_w_ball", "track_ids", "class_counts")}
+    summary["mean_conf"] = round(float(s["mean_conf"]), 6)
+    summary["hist"] = {k: v[0].tolist() for k, v in s["hist"].items()}
+    summary["per_frame"] = {k: hashlib.sha1(v.tobytes()).hexdigest() for k, v in s["per_frame"][1].items()}
+    print(json.dumps({"mode": mode, "seconds": time.perf_counter() - t0,
+                      "peak_mb": peak_rss_mb() - base, "summary": summary}))
+
+
+def bench_stats(rows, chunk_rows, fmt, ceiling_mb):
+    import train
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_detections(Path(tmp) / f"season{train.DETECTION_FORMATS[fmt]}", fmt, rows)
+        print(f"[bench] stats: {rows:,} rows, {fmt} {path.stat().st_size / 1e6:.0f} MB, chunk {chunk_rows:,} rows")
+        res = {}
+        for mode in ("memory", "chunked"):
+            out = subprocess.run([sys.executable, __file__, "_stats", mode, str(path), str(chunk_rows)],
+                                 capture_output=True, text=True, check=True, cwd=HERE)
+            res[mode] = r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"  {mode:<8} {r['seconds']:7.2f} s   peak +{r['peak_mb']:7.1f} MB")
+    same = res["memory"]["summary"] == res["chunked"]["summary"]
+    under = res["chunked"]["peak_mb"] <= ceiling_mb
+    print(f"  summaries {'identical' if same else 'DIFFER'}   chunked peak "
+          f"{'within' if under else 'ABOVE'} the {ceiling_mb:.0f} MB ceiling")
+    if not (same and under):
+        sys.exit(1)
+
+
+# ── startup: CLI import cost of the lightweight subcommands ────────────────────
+
+LIGHT_CMDS = ["clean", "collect", "roboflow", "stats", "analyze"]
+HEAVY_MODS = ("torch", "ultralytics")
+
+
+def bench_startup(budget, runs):
+    """`python -X importtime train.py <cmd> --help` for each lightweight subcommand.
+
+    --help returns straight after argument parsing, so the run is pure startup cost.
+    Fails when the best wall time exceeds --budget or torch/ultralytics get imported.
+    """
+    print(f"[bench] startup: best of {runs} runs, budget {budget:.2f} s")
+    failed = False
+    for cmd in LIGHT_CMDS:
+        best = imp = None
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            out = subprocess.run([sys.executable, "-X", "importtime", str(HERE / "train.py"), cmd, "--help"],
+                                 capture_output=True, text=True, check=True, cwd=HERE)
+            dt = time.perf_counter() - t0
+            rows = [l.split("|") for l in out.stderr.splitlines() if l.startswith("import time:")]
+            rows = [f for f in rows if len(f) == 3 and f[1].strip().isdigit()]     # drop the header
+            mods = {f[2].strip() for f in rows}
+            us = sum(int(f[1]) for f in rows if not f[2][1:].startswith(" "))     # top-level only
+            if best is None or dt < best:
+                best, imp = dt, us / 1e6
+        heavy = [m for m in HEAVY_MODS if m in mods]
+        ok = best <= budget and not heavy
+        failed |= not ok
+        print(f"  {cmd:<9} {best:6.3f} s wall   {imp:6.3f} s imports   "
+              f"{'OK' if ok else 'FAIL'}{'  imports ' + ', '.join(heavy) if heavy else ''}")
+    if failed:
+        sys.exit(1)
+
+
+# ── suite: offline throughput / peak-memory regression check ─────────────────
+
+SUITE_CASES = ["prepare", "csv", "label-video", "stats"]
+BASELINE    = HERE / "bench_baseline.json"
+
+
+def make_tiny_weights(path, seed=0):
+    """A randomly initialised yolo26n (nc=2) built from the bundled yaml — no download.
+
+    The class-score bias is raised so every frame yields max_det boxes, which keeps
+    NMS, tracking and writing under full load instead of benchmarking empty frames.
+    """
+    import torch
+    from ultralytics.nn.tasks import DetectionModel, yaml_model_load
+    torch.manual_seed(seed)
+    m = DetectionModel({**yaml_model_load("yolo26n.yaml"), "nc": 2}, verbose=False)
+    m.names = {0: "person", 1: "sports_ball"}
+    head = m.model[-1]
+    for seq in [*head.cv3, *getattr(head, "one2one_cv3", [])]:
+        seq[-1].bias.data[:] = torch.tensor([2.0, -1.0])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({"model": m, "train_args": {}, "date": None, "version": None}, path)
+    return path
+
+
+class StubModel:
+    """Stands in for a YOLO model with zero inference cost, so only the repo's own
+    decode / post-processing / writing is measured: 22 players and a ball per frame,
+    moving linearly with stable track ids."""
+
+    def __init__(self, n=23, seed=0):
+        import numpy as np
+        rng = np.random.default_rng(seed)
+        self.n, self.i = n, 0
+        self.pos, self.vel = rng.uniform(0, 1, (n, 2)), rng.normal(0, 0.004, (n, 2))
+        self.conf = rng.uniform(0.3, 0.95, n)
+
+    def _result(self, frame, tracked):
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+        h, w = frame.shape[:2]
+        xy = ((self.pos + self.vel * self.i) % 1) * (w - 40, h - 90)
+        cls = (np.arange(self.n) == self.n - 1).astype(np.float32)          # last one is the ball
+        cols = [xy, xy + (40, 90)] + ([np.arange(1, self.n + 1)[:, None]] if tracked else [])
+        boxes = np.concatenate(cols + [self.conf[:, None], cls[:, None]], 1).astype(np.float32)
+        self.i += 1
+        r = Results(frame, path="", names={0: "person", 1: "sports_ball"}, boxes=torch.from_numpy(boxes))
+        r.speed = {"preprocess": 0.0, "inference": 0.0, "postprocess": 0.0}
+        return r
+
+    def predict(self, source, **kw):
+        return [self._result(f, False) for f in (source if isinstance(source, list) else [source])]
+
+    def track(self, source=None, stream=False, **kw):
+        import train
+        if isinstance(source, str):
+            gen = (self._result(f, True) for _, f in train.VideoFrames(source))
+            return gen if stream else list(gen)
+        return [self._result(source, True)]
+
+
+def _run_suite(case, model, root):
+    """Child process: one suite case against the temp root; prints {seconds, units, peak_mb}."""
+    import train
+    root = Path(root)
+    train.ROOT, train.COCO_ROOT = root, root / "coco2017"
+    if case in ("csv", "label-video"):
+        import ultralytics                                          # noqa: F401  (not part of the measurement)
+        if model == "stub": train._MODELS["n", "pt"] = StubModel()
+        else:               train.load_model("n")
+    import pandas, matplotlib.pyplot                               # noqa: F401,E401
+    spec = json.loads((root / "suite.json").read_text())
+    base = peak_rss_mb()
+    t0 = time.perf_counter()
+    with quiet():
+        if case == "prepare":
+            train.prepare(full=True); units = spec["images"]
+        elif case == "csv":
+            train.extract_csv(root / "clip.mp4", imgsz=spec["imgsz"]); units = spec["frames"]
+        elif case == "label-video":
+            shutil.rmtree(root / "data" / "labeled", ignore_errors=True)
+            train.label_video(root / "clip.mp4", imgsz=spec["imgsz"], batch_size=4, writers=2)
+            units = spec["frames"]
+        else:
+            train.stats(root / "detections.parquet"); units = spec["rows"]
+    dt = time.perf_counter() - t0
+    print(json.dumps({"seconds": dt, "units": units, "peak_mb": peak_rss_mb() - base}))
+
+
+def machine_info():
+    import platform
+    from importlib.metadata import version
+    return {"cpus": os.cpu_count(), "machine": platform.machine(), "python": platform.python_version(),
+            "torch": version("torch"), "ultralytics": version("ultralytics")}
+
+
+def bench_suite(model, cases, frames, imgsz, repeat, threshold, mem_slack, baseline, save):
+    """Throughput and peak RSS of each subcommand on synthetic inputs, checked against a baseline.
+
+    A case fails when its throughput drops, or its peak memory grows, by more than
+    `threshold` (memory also needs to grow by more than `mem_slack` MB, to ignore noise).
+    Without `save`, a missing baseline (or a case it does not cover) is a failure too, so
+    a check can never pass by having nothing to compare against.
+    """
+    key = f"{model}@{imgsz}/{frames}"
+    stored = json.loads(baseline.read_text()) if baseline.exists() else {}
+    ref = stored.get(key, {}).get("results", {})
+    if not save and not ref:
+        sys.exit(f"[bench] no baseline for {key} in {baseline} — run with --save to record one first")
+    units = {"prepare": "img/s", "csv": "fps", "label-video": "fps", "stats": "rows/s"}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        import train
+        spec = {"frames": frames, "imgsz": imgsz, "images": 2200, "rows": 1_000_000}
+        (root / "suite.json").write_text(json.dumps(spec))
+        (root / "data").mkdir()
+        make_coco_root(root / "coco2017", 2000, 20000)
+        make_video(root / "clip.mp4", frames)
+        make_detections(root / "detections.parquet", "parquet", spec["rows"])
+        if model == "tiny":
+            make_tiny_weights(root / "runs" / "yolo26n_football" / "weights" / "best.pt")
+        print(f"[bench] suite: model={model}, {frames} frames 1280x720 @ imgsz {imgsz}, best of {repeat}, "
+              f"{os.cpu_count()} CPUs")
+        results = {}
+        for case in cases:
+            runs = []
+            for _ in range(repeat):
+                out = subprocess.run([sys.executable, __file__, "_suite", case, model, str(root)],
+                                     capture_output=True, text=True, cwd=HERE,
+                                     env={**os.environ, "CUDA_VISIBLE_DEVICES": ""})
+                if out.returncode:
+                    sys.exit(f"[bench] {case} failed:\n{out.stderr[-2000:]}")
+                runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            results[case] = {"throughput": max(r["units"] / r["seconds"] for r in runs),
+                             "peak_mb": min(r["peak_mb"] for r in runs), "unit": units[case]}
+
+    if ref and stored[key].get("machine") != machine_info():
+        print(f"  note: baseline was recorded on {stored[key]['machine']}")
+    failed = False
+    print(f"  {'case':<12}{'throughput':>16}{'baseline':>12}{'Δ':>8}{'peak MB':>10}{'baseline':>10}{'Δ':>8}")
+    for case, r in results.items():
+        b = ref.get(case)
+        line = f"  {case:<12}{r['throughput']:>10,.1f} {r['unit']:<6}"
+        if not b:
+            failed |= not save
+            print(line + f"{'—':>12}{'':>8}{r['peak_mb']:>10.1f}{'':>18}  {'recorded' if save else 'NO BASELINE'}")
+            continue
+        d_tp = r["throughput"] / b["throughput"] - 1
+        d_mb = r["peak_mb"] / max(b["peak_mb"], 1e-9) - 1
+        bad = d_tp < -threshold or (d_mb > threshold and r["peak_mb"] - b["peak_mb"] > mem_slack)
+        failed |= bad
+        print(line + f"{b['throughput']:>12,.1f}{d_tp * 100:>+7.1f}%{r['peak_mb']:>10.1f}{b['peak_mb']:>10.1f}"
+                     f"{d_mb * 100:>+7.1f}%  {'REGRESSION' if bad else 'ok'}")
+    if save:
+        stored[key] = {"machine": machine_info(), "time": time.strftime("%Y-%m-%d %H:%M"),
+                       "results": {**ref, **results}}
+        baseline.write_text(json.dumps(stored, indent=2) + "\n")
+        print(f"  baseline saved -> {baseline}")
+    if failed:
+        print(f"  FAIL: regression above {threshold * 100:.0f}% or case missing from {baseline.name}")
+        sys.exit(1)
+
+
+# ── roi: coarse pass + full-resolution crops vs full-frame inference ─────────
+
+class BlobModel:
+    """A colour-blob detector with a real detector's resolution limit, for recall checks
+    on make_video() clips: the input is resized to `imgsz` like a letterboxed predict(),
+    and blobs under `min_px` pixels at that scale are missed — so a small ball vanishes
+    at low imgsz exactly as it does for YOLO. With `cost` (a YOLO model) each call also
+    runs that model at the same imgsz and batch, so timings carry real inference cost.
+    """
+
+    names = {0: "person", 1: "sports_ball"}
+
+    def __init__(self, cost=None, min_px=6):
+        self.cost, self.min_px = cost, min_px
+
+    def _detect(self, img, imgsz, conf):
+        import cv2
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+        h, w = img.shape[:2]
+        k = imgsz / max(h, w)
+        small = cv2.resize(img, (max(1, round(w * k)), max(1, round(h * k))), interpolation=cv2.INTER_AREA)
+        b, g, r = (small[..., c].astype(int) for c in range(3))
+        white, red = (b > 200) & (g > 200) & (r > 200), (r > 150) & (g < 90)
+        boxes = []
+        for mask, colour in ((white, "white"), (red, "red")):
+            n, _, st, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=4)
+            for x, y, bw, bh, _ in st[1:]:
+                if min(bw, bh) < self.min_px: continue
+                ball = colour == "white" and bh < 1.6 * bw
+                boxes.append([x / k, y / k, (x + bw) / k, (y + bh) / k, 0.9, float(ball)])
+        data = torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6)
+        return Results(img, path="", names=self.names, boxes=data[data[:, 4] >= conf])
+
+    def predict(self, source, imgsz=640, conf=0.25, **kw):
+        source = source if isinstance(source, list) else [source]
+        speed = {}
+        if self.cost is not None:
+            speed = self.cost.predict(source, imgsz=imgsz, device="cpu", verbose=False)[0].speed
+        out = [self._detect(f, imgsz, conf) for f in source]
+        for r in out: r.speed = dict(speed)
+        return out
+
+
+def detection_recall(truth, pred, min_iou=0.5):
+    """Fraction of truth boxes per class with a same-class prediction at IoU >= min_iou."""
+    import numpy as np
+    import train
+    hits = defaultdict(lambda: [0, 0])
+    for t, d in zip(truth, pred):
+        for c in (0, 1):
+            tc, dc = t[t[:, 0] == c, 1:], d[d[:, 5] == c, :4]
+            if len(tc):
+                found = (train.box_iou(tc, dc) >= min_iou).any(1) if len(dc) else np.zeros(len(tc), bool)
+                hits[c][0] += int(found.sum()); hits[c][1] += len(tc)
+    return {c: n / max(total, 1) for c, (n, total) in hits.items()}
+
+
+def bench_roi(frames, size, imgsz, coarse, crops, refresh, weights):
+    """Detection fps and player / ball recall against the clip's ground truth:
+    full frame at --imgsz and at --coarse, vs RoiDetector (coarse pass + crops)."""
+    import numpy as np
+    import train
+    from ultralytics import YOLO
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        truth = []
+        video = make_video(tmp / "clip.mp4", frames, size=size, truth=truth)
+        cost = YOLO(str(Path(weights) if weights else make_tiny_weights(tmp / "tiny.pt")), task="detect")
+        model = BlobModel(cost)
+        with quiet():                                               # warm-up: first-call setup
+            model.predict(np.zeros((size[1], size[0], 3), np.uint8), imgsz=imgsz)
+        modes = [(f"full {imgsz}", None, imgsz), (f"full {coarse}", None, coarse)]
+        modes += [(f"roi {coarse}+{c}", c, imgsz) for c in crops]
+        print(f"[bench] roi: {frames} frames {size[0]}x{size[1]}, blob detector + {'--weights' if weights else 'tiny yolo26n'} "
+              f"inference cost, CPU")
+        print(f"  {'mode':<16}{'fps':>7}{'speedup':>9}{'crops/fr':>10}{'player R':>10}{'ball R':>8}")
+        base = None
+        for name, crop, sz in modes:
+            pred, busy = [], 0.0
+            with quiet():
+                det = train.RoiDetector(model, 0.25, sz, coarse, crop, refresh) if crop else None
+                for _, f in train.VideoFrames(video):
+                    t0 = time.perf_counter()
+                    r = det(f) if det else model.predict(f, imgsz=sz, conf=0.25)[0]
+                    busy += time.perf_counter() - t0
+                    pred.append(r.boxes.data.numpy())
+            fps = frames / busy
+            base = base or fps
+            rec = detection_recall(truth, pred)
+            print(f"  {name:<16}{fps:7.1f}{fps / base:8.2f}x{(det.crops / frames if det else 0):10.2f}"
+                  f"{rec.get(0, 0):10.1%}{rec.get(1, 0):8.1%}")
+
+
+# ── keyframe: detect every K frames, optical flow in between ─────────────────
+
+def position_error(ref, out, max_px=50):
+    """Centre distance from each `ref` box to the nearest same-class `out` box of its frame.
+
+    Both are per-frame (n, >=6) [x1, y1, x2, y2, ..., conf, cls] arrays. Returns the
+    distances of matched boxes and the share of ref boxes with none within max_px.
+    """
+    import numpy as np
+    dist, missed, total = [], 0, 0
+    for r, o in zip(ref, out):
+        for c in (0, 1):
+            rc, oc = r[r[:, -1] == c], o[o[:, -1] == c]
+            total += len(rc)
+            if not len(rc): continue
+            if not len(oc): missed += len(rc); continue
+            ctr = lambda b: (b[:, :2] + b[:, 2:4]) / 2
+            d = np.linalg.norm(ctr(rc)[:, None] - ctr(oc)[None], axis=2).min(1)
+            dist += d[d <= max_px].tolist(); missed += int((d > max_px).sum())
+    return np.array(dist), missed / max(total, 1)
+
+
+def bench_keyframe(every, frames, size, imgsz, min_ratio, weights):
+    """csv --detect-every K vs detecting every frame: fps gain against position error
+    (and missed boxes) relative to the every-frame run, on a make_video() clip."""
+    import numpy as np
+    import train
+    from ultralytics import YOLO
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        video = make_video(tmp / "clip.mp4", frames, size=size)
+        cost = YOLO(str(Path(weights) if weights else make_tiny_weights(tmp / "tiny.pt")), task="detect")
+        model = BlobModel(cost)
+        detect = lambda f: model.predict(f, imgsz=imgsz, conf=0.25)[0]
+        with quiet():
+            detect(np.zeros((size[1], size[0], 3), np.uint8))
+        print(f"[bench] keyframe: {frames} frames {size[0]}x{size[1]}, imgsz={imgsz}, min ratio {min_ratio}, blob detector + "
+              f"{'--weights' if weights else 'tiny yolo26n'} inference cost, CPU")
+        print(f"  {'every':<7}{'fps':>7}{'speedup':>9}{'detected':>10}{'forced':>8}"
+              f"{'err mean':>10}{'err p95':>9}{'missed':>8}   (error vs every=1, interpolated frames, px)")
+        ref = base = None
+        for k in [1] + [k for k in every if k > 1]:
+            tracker = train.KeyframeTracker(detect, k, min_ratio) if k > 1 else train.FrameTracker(detect)
+            out, interp, busy = [], [], 0.0
+            for _, f in train.VideoFrames(video):
+                t0 = time.perf_counter()
+                r = tracker(f)
+                busy += time.perf_counter() - t0
+                out.append(r.boxes.data.numpy()); interp.append(getattr(r, "interpolated", False))
+            fps = frames / busy
+            if ref is None:
+                ref, base = out, fps
+                print(f"  {k:<7}{fps:7.1f}{1:8.2f}x{frames:10}{0:8}{'-':>10}{'-':>9}{'-':>8}")
+                continue
+            keep = [i for i, x in enumerate(interp) if x]
+            dist, missed = position_error([ref[i] for i in keep], [out[i] for i in keep])
+            err = (f"{dist.mean():10.2f}{np.percentile(dist, 95):9.2f}" if len(dist) else f"{'-':>10}{'-':>9}")
+            print(f"  {k:<7}{fps:7.1f}{fps / base:8.2f}x{tracker.keyframes:10}{tracker.forced:8}{err}{missed:8.1%}")
+
+
+# ── upload: Roboflow uploader against a local stand-in server ────────────────
+
+def stand_in_server(port, latency, rate, error_rate, seed=0):
+    """A local Roboflow upload/annotate API: `latency` s per request, a token bucket of
+    `rate` requests/s (over it: 429 + Retry-After), `error_rate` random 500s.
+    Returns (server, counters); serve it from a thread."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    counters, lock, rnd = defaultdict(int), threading.Lock(), random.Random(seed)
+    bucket = {"tokens": float(rate or 0), "t": time.monotonic()}
+
+    def admit():
+        if not rate: return True
+        with lock:
+            now = time.monotonic()
+            bucket["tokens"] = min(rate, bucket["tokens"] + (now - bucket["t"]) * rate); bucket["t"] = now
+            if bucket["tokens"] < 1: return False
+            bucket["tokens"] -= 1
+            return True
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"                               # keep-alive, like the real API
+
+        def setup(self):
+            super().setup()
+            with lock: counters["connections"] += 1
+
+        def log_message(self, *a): pass
+
+        def reply(self, code, body, headers=()):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            for k, v in headers: self.send_header(k, v)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            with lock: counters["requests"] += 1
+            if not admit():
+                with lock: counters["429"] += 1
+                return self.reply(429, {"error": "rate limited"}, [("Retry-After", "1")])
+            with lock: fail = rnd.random() < error_rate
+            if fail:
+                with lock: counters["500"] += 1
+                return self.reply(500, {"error": "internal"})
+            kind = "annotate" if "/annotate/" in self.path else "upload"
+            with lock: counters[kind] += 1; n = counters[kind]
+            self.reply(200, {"success": True, "id": f"img{n}"})
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    return server, counters
+
+
+def _legacy_upload(api_url, tasks, workers, log_path, retries=3):
+    """The old upload_split(): a fixed thread pool, a new connection per request (as the
+    SDK's module-level requests.post makes), immediate retries, one log open per image."""
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+    lock, stats = __import__("threading").Lock(), defaultdict(int)
+
+    def post(url, **kw):
+        for _ in range(retries + 1):
+            r = requests.post(url, params={"api_key": "local"}, timeout=60, **kw)
+            if r.status_code < 400: return r.json()
+            stats["retried"] += 1
+        raise RuntimeError(f"HTTP {r.status_code}")
+
+    def one(args):
+        img, lbl = args
+        with open(img, "rb") as f:
+            res = post(f"{api_url}/dataset/p/upload", files={"file": (img.name, f, "image/jpeg")})
+        post(f"{api_url}/dataset/p/annotate/{res['id']}", data=lbl.read_text())
+        with lock:
+            with open(log_path, "a") as f: f.write(str(img) + "\n")
+
+    with ThreadPoolExecutor(workers) as pool:
+        for fut in [pool.submit(one, t) for t in tasks]:
+            try: fut.result(); stats["uploaded"] += 1
+            except Exception: stats["failed"] += 1
+    return stats
+
+
+def bench_upload(images, workers, latency, rate, error_rate, port):
+    """Images/s, connections opened and retry behaviour: old thread pool vs the asyncio uploader."""
+    import asyncio
+    import threading
+    import roboflow_upload as ru
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "images").mkdir(); (tmp / "labels").mkdir()
+        blob = os.urandom(30_000)                                   # ~ a small JPEG
+        paths = []
+        for i in range(images):
+            img = tmp / "images" / f"{i:06d}.jpg"
+            img.write_bytes(blob); (tmp / "labels" / f"{i:06d}.txt").write_text("0 0.5 0.5 0.1 0.2\n")
+            paths.append(img)
+        print(f"[bench] upload: {images} images (+label each), {latency * 1e3:.0f} ms/request, "
+              f"rate limit {rate or 'none'} req/s, {error_rate:.0%} 500s")
+        print(f"  {'engine':<26}{'img/s':>8}{'failed':>8}{'retries':>9}{'429s':>7}{'500s':>7}{'conns':>7}")
+        for name in ("legacy", "async"):
+            server, counters = stand_in_server(port, latency, rate, error_rate)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{port}"
+            log_path = tmp / f"{name}_uploaded.txt"
+            t0 = time.perf_counter()
+            if name == "legacy":
+                st = _legacy_upload(url, [(p, ru.label_path_for(p)) for p in paths], workers // 2, log_path)
+                label, up, failed, retried = f"threads x{workers // 2}, no pooling", st["uploaded"], st["failed"], st["retried"]
+            else:
+                uploader, log = ru.Uploader(url, "local", "p", {"0": "person"}, pool=workers), ru.ResumeLog(log_path)
+
+                async def run():
+                    limit = ru.AdaptiveLimit(start=4, ceiling=workers)
+                    with quiet():
+                        res = await ru.upload_all(uploader, paths, "train", None, 5, limit, log)
+                    return res, limit
+                (up, failed, retried), limit = asyncio.run(run())
+                log.close()
+                label = f"async <= {workers} (peak {limit.peak})"
+            dt = time.perf_counter() - t0
+            server.shutdown(); server.server_close()
+            logged = len(log_path.read_text().splitlines()) if log_path.exists() else 0
+            assert logged == up, (logged, up)
+            if name == "async":                      # one shared pool: never more sockets than the ceiling
+                assert counters["connections"] <= workers, (counters["connections"], workers)
+            print(f"  {label:<26}{up / dt:8.1f}{failed:8}{retried:9}{counters['429']:7}{counters['500']:7}"
+                  f"{counters['connections']:7}")
+
+
+# ── materialize: collect / roboflow / clean ──────────────────────────────────
+
+def make_image_tree(root, n_images, kb, seed=0):
+    """coco2017/images/train2017 with n incompressible 'JPEGs' (+ labels, .npy caches,
+    data/train.txt) and a data/labeled/ copy for roboflow."""
+    rnd = random.Random(seed)
+    imgs, lbls = root / "coco2017" / "images" / "train2017", root / "coco2017" / "labels" / "train2017"
+    lab_i, lab_l = root / "data" / "labeled" / "images", root / "data" / "labeled" / "labels"
+    for d in (imgs, lbls, lab_i, lab_l): d.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(n_images):
+        img = imgs / f"{i:012d}.jpg"
+        img.write_bytes(rnd.randbytes(int(kb * 1000 * rnd.uniform(0.5, 1.5))))
+        (lbls / f"{i:012d}.txt").write_text("0 0.5 0.5 0.1 0.2\n")
+        (imgs / f"{i:012d}.npy").write_bytes(b"\0" * 4096)
+        os.link(img, lab_i / img.name); os.link(lbls / f"{i:012d}.txt", lab_l / f"{i:012d}.txt")
+        paths.append(str(img))
+    (root / "coco2017" / "labels" / "train2017.cache").write_bytes(b"\0" * 4096)
+    (root / "data" / "train.txt").write_text("\n".join(paths))
+    return paths
+
+
+def _legacy_collect(paths, dest):
+    dest.mkdir(parents=True, exist_ok=True)
+    for p in paths:
+        shutil.copy(p, dest / Path(p).name)
+
+
+def _legacy_roboflow(labeled, out_zip, classes):
+    import zipfile
+    with zipfile.ZipFile(out_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("classes.txt", classes)
+        for img in sorted((labeled / "images").glob("*")): zf.write(img, f"images/{img.name}")
+        for lbl in sorted((labeled / "labels").glob("*.txt")): zf.write(lbl, f"labels/{lbl.name}")
+
+
+def _legacy_clean(root):
+    n = 0
+    for path in root.rglob("*"):
+        if path.suffix in {".npy", ".cache"} and path.is_file():
+            path.stat().st_size; path.unlink(); n += 1
+    return n
+
+
+def disk_used(path):
+    st = os.statvfs(path)
+    return (st.f_blocks - st.f_bfree) * st.f_frsize
+
+
+def bench_materialize(n_images, kb, workers, mode):
+    """collect, roboflow and clean: the old serial code vs the new one — wall time, extra
+    disk written, and identical outputs (same files; same zip members and CRCs)."""
+    import zipfile
+    import train
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        paths = make_image_tree(tmp, n_images, kb)
+        train.ROOT, train.COCO_ROOT = tmp, tmp / "coco2017"
+        mb = sum(os.path.getsize(p) for p in paths) / 1e6
+        print(f"[bench] materialize: {n_images:,} images ({mb:,.0f} MB), {workers} workers, collect --mode {mode}")
+        print(f"  {'job':<10}{'old s':>8}{'new s':>8}{'speedup':>9}{'old disk MB':>13}{'new disk MB':>13}")
+
+        def timed(fn):
+            os.sync()
+            d0, t0 = disk_used(tmp), time.perf_counter()
+            out = fn()
+            os.sync()
+            return out, time.perf_counter() - t0, (disk_used(tmp) - d0) / 1e6
+
+        dest = tmp / "data" / "coco_filtered" / "train2017"
+        _, t_old, d_old = timed(lambda: _legacy_collect(paths, tmp / "legacy_collect"))
+        with quiet():
+            _, t_new, d_new = timed(lambda: train.collect_used_images(mode, workers))
+        assert sorted(os.listdir(dest)) == sorted(os.listdir(tmp / "legacy_collect"))
+        assert all(filecmp_same(dest / n, tmp / "legacy_collect" / n) for n in os.listdir(dest)[:200])
+        print(f"  {'collect':<10}{t_old:8.2f}{t_new:8.2f}{t_old / t_new:8.1f}x{d_old:13.1f}{d_new:13.1f}")
+
+        classes = "\n".join(train.CLASS_NAMES[i] for i in sorted(train.CLASS_NAMES))
+        old_zip, new_zip = tmp / "legacy.zip", tmp / "data" / "roboflow_export.zip"
+        _, t_old, d_old = timed(lambda: _legacy_roboflow(tmp / "data" / "labeled", old_zip, classes))
+        with quiet():
+            _, t_new, d_new = timed(lambda: train.roboflow_export(workers))
+        members = lambda z: [(i.filename, i.CRC, i.file_size) for i in zipfile.ZipFile(z).infolist()]
+        assert members(old_zip) == members(new_zip)
+        assert zipfile.ZipFile(new_zip).testzip() is None
+        print(f"  {'roboflow':<10}{t_old:8.2f}{t_new:8.2f}{t_old / t_new:8.1f}x{d_old:13.1f}{d_new:13.1f}")
+
+        caches_copied = lambda a, b: shutil.copyfile(a, b) if Path(a).suffix in {".npy", ".cache"} else os.link(a, b)
+        shutil.copytree(tmp / "coco2017", tmp / "coco2017_b", copy_function=caches_copied)   # both sides free blocks
+        n_old, t_old, _ = timed(lambda: _legacy_clean(tmp / "coco2017_b"))
+        with quiet():
+            _, t_new, _ = timed(lambda: train.clean_cache(workers))
+        left = [p for p in (tmp / "coco2017").rglob("*") if p.suffix in {".npy", ".cache"}]
+        assert not left and n_old == n_images + 1
+        print(f"  {'clean':<10}{t_old:8.2f}{t_new:8.2f}{t_old / t_new:8.1f}x{'-':>13}{'-':>13}")
+
+
+def filecmp_same(a, b):
+    import filecmp
+    return filecmp.cmp(a, b, shallow=False)
+
+
+# ── analyze: possession / passes / heatmaps over a full match ─────────────────
+
+def make_match(path, minutes=90, fps=25, players=22, seed=0):
+    """A synthetic match as extract_csv() output: `players` tracked players on random walks
+    plus a ball that is dribbled (at a player's feet) and passed (straight line to where the
+    receiver will be), missed in 5% of frames. Returns the scripted passes
+    (from, to, release, arrive) as ground truth."""
+    import numpy as np
+    import train
+    rng = np.random.default_rng(seed)
+    n = int(minutes * 60 * fps)
+    pos, vel = np.empty((n, players, 2)), np.zeros((players, 2))
+    pos[0] = rng.uniform((60, 120), (1860, 1040), (players, 2))
+    for f in range(1, n):
+        vel = 0.95 * vel + rng.normal(0, 0.5, (players, 2))
+        pos[f] = np.clip(pos[f - 1] + vel, (40, 100), (1880, 1060))
+
+    ball, passes, f, owner = np.empty((n, 2)), [], 0, 0
+    while f < n:
+        keep = min(int(rng.integers(20, 100)), n - f)
+        ball[f:f + keep] = pos[f:f + keep, owner] + (8, -10)
+        f += keep
+        fly, to = int(rng.integers(8, 30)), int(rng.choice([p for p in range(players) if p != owner]))
+        if f + fly >= n: ball[f:] = ball[f - 1]; break
+        t = np.linspace(0, 1, fly + 1)[1:, None]
+        ball[f:f + fly] = (1 - t) * ball[f - 1] + t * (pos[f + fly, to] + (8, -10))
+        passes.append((owner + 1, to + 1, f - 1, f + fly))
+        f, owner = f + fly, to
+    seen = rng.random(n) >= 0.05
+
+    with train.DetectionWriter(path, "csv" if path.suffix == ".csv" else path.suffix[1:]) as w:
+        for lo in range(0, n, 5000):
+            hi = min(lo + 5000, n)
+            fr = np.arange(lo, hi)
+            x, y = np.moveaxis(pos[lo:hi] + rng.normal(0, 1, (hi - lo, players, 2)), 2, 0)   # feet
+            bf = fr[seen[lo:hi]]
+            frame = np.r_[np.repeat(fr, players), bf]
+            cx, cy = np.r_[x.ravel(), ball[bf, 0]], np.r_[(y - 45).ravel(), ball[bf, 1]]
+            half_w = np.r_[np.full(x.size, 20.0), np.full(len(bf), 5.0)]
+            half_h = np.r_[np.full(x.size, 45.0), np.full(len(bf), 5.0)]
+            order = np.argsort(frame, kind="stable")
+            cols = {"frame": frame, "track_id": np.r_[np.tile(np.arange(1, players + 1), hi - lo),
+                                                     np.full(len(bf), players + 1)],
+                    "class": np.r_[np.zeros(x.size, np.int8), np.ones(len(bf), np.int8)],
+                    "conf": rng.uniform(0.3, 1, len(frame)).round(4),
+                    "x1": cx - half_w, "y1": cy - half_h, "x2": cx + half_w, "y2": cy + half_h,
+                    "cx": cx, "cy": cy}
+            w.write({k: np.round(v, 1)[order] if v.dtype.kind == "f" and k != "conf" else v[order]
+                     for k, v in cols.items()})
+    return passes
+
+
+def _legacy_analyze(path, fps=25.0, reach=0.6, hold=5, max_gap=50, grid=(48, 27), extent=(1920, 1080)):
+    """MatchAnalyzer.report() + heatmaps computed row by row in plain Python (csv.DictReader,
+    dicts, per-frame loops): the reference for speed and for identical results."""
+    import csv
+    import math
+    import numpy as np
+    by_frame = defaultdict(list)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            by_frame[int(row["frame"])].append(row)
+    (gx, gy), (w, h) = grid, extent
+    ball, owner, heat, dist, last = {}, {}, {}, {}, {}
+    for fr in sorted(by_frame):
+        rows, best = by_frame[fr], None
+        for r in rows:
+            if r["class"] == "sports_ball" and (best is None or float(r["conf"]) > float(best["conf"])):
+                best = r
+        if best is not None:
+            ball[fr] = (float(best["cx"]), float(best["cy"]))
+        near = None
+        for r in rows:
+            t = int(r["track_id"])
+            if r["class"] != "person" or t < 0:
+                continue
+            x, y, top = float(r["cx"]), float(r["y2"]), float(r["y1"])
+            cell = heat.setdefault(t, [[0] * gx for _ in range(gy)])
+            cell[min(max(int(y / h * gy), 0), gy - 1)][min(max(int(x / w * gx), 0), gx - 1)] += 1
+            dist.setdefault(t, 0.0)
+            if t in last and fr - last[t][0] <= max_gap:
+                dist[t] += math.hypot(x - last[t][1], y - last[t][2])
+            last[t] = (fr, x, y)
+            if fr in ball:
+                dx, dy = ball[fr][0] - x, ball[fr][1] - y
+                d = math.sqrt(dx * dx + dy * dy) / (y - top)
+                if d <= reach and (near is None or d < near[0]):
+                    near = (d, t)
+        if near is not None:
+            owner[fr] = near[1]
+
+    frames = max(by_frame) + 1 if by_frame else 0
+    runs, start = [], 0
+    for fr in range(1, frames + 1):
+        if fr == frames or owner.get(fr, -1) != owner.get(start, -1):
+            if owner.get(start, -1) >= 0 and fr - start >= hold:
+                runs.append((owner[start], start, fr))
+            start = fr
+    held, passes = defaultdict(int), []
+    for o, s, e in runs:
+        held[o] += e - s
+    for (o1, s1, e1), (o2, s2, e2) in zip(runs, runs[1:]):
+        if o1 != o2 and s2 - e1 <= max_gap:
+            (bx1, by1), (bx2, by2) = ball[e1 - 1], ball[s2]
+            passes.append({"from": o1, "to": o2, "release": e1 - 1, "arrive": s2,
+                           "px": round(math.hypot(bx2 - bx1, by2 - by1), 1)})
+    speeds, prev = [], None
+    for fr in sorted(ball):
+        if prev is not None and fr - prev <= max_gap:
+            speeds.append(math.hypot(ball[fr][0] - ball[prev][0], ball[fr][1] - ball[prev][1]) / (fr - prev) * fps)
+        prev = fr
+    pct = lambda q: round(float(np.percentile(speeds, q)), 1) if speeds else None
+    report = {
+        "frames": frames, "fps": fps, "ball_frames": len(ball),
+        "possession": dict(sorted(held.items(), key=lambda kv: (-kv[1], kv[0]))),
+        "passes": passes,
+        "ball_speed": {"median": pct(50), "p95": pct(95), "max": pct(100)},
+        "distance": {t: round(d, 1) for t, d in sorted(dist.items())},
+    }
+    return report, np.array([heat[t] for t in sorted(heat)])
+
+
+def same_report(a, b, tol=0.11):
+    """Reports equal, floats allowed to differ by summation order / rounding (< tol)."""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and list(a) == list(b) and all(same_report(a[k], b[k], tol) for k in a)
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(same_report(x, y, tol) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) <= tol + 1e-9 * abs(a)
+    return a == b
+
+
+def bench_analyze(minutes, fps, appends, fmt):
+    """analyze on a synthetic match: vectorized vs a per-row loop (time, identical results),
+    scripted passes found, and --follow-style incremental updates vs re-running everything."""
+    import numpy as np
+    import train
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"match{train.DETECTION_FORMATS[fmt]}"
+        t0 = time.perf_counter()
+        truth = make_match(path, minutes, fps)
+        rows = sum(1 for _ in open(path)) - 1 if fmt == "csv" else None
+        print(f"[bench] analyze: {minutes} min at {fps} fps, 23 objects, {fmt} "
+              f"{path.stat().st_size / 1e6:.0f} MB (built in {time.perf_counter() - t0:.0f} s)")
+
+        def vectorized():
+            a = train.MatchAnalyzer(fps)
+            for df in train.iter_detections(path, train.ANALYZE_COLUMNS):
+                a.update(df)
+            a.update(None, final=True)
+            return a
+
+        t0 = time.perf_counter(); a = vectorized(); t_new = time.perf_counter() - t0
+        report = a.report()
+        print(f"  {'path':<14}{'s':>8}{'rows/s':>12}")
+        rate = lambda s: f"{rows / s:12,.0f}" if rows else f"{'-':>12}"
+        if fmt == "csv":
+            t0 = time.perf_counter(); old, old_heat = _legacy_analyze(path, fps); t_old = time.perf_counter() - t0
+            print(f"  {'per-row loop':<14}{t_old:8.2f}{rate(t_old)}")
+        print(f"  {'vectorized':<14}{t_new:8.2f}{rate(t_new)}")
+        if fmt == "csv":
+            same = same_report(old, report) and np.array_equal(old_heat, a.heat)
+            print(f"  {t_old / t_new:.1f}x faster, reports {'identical' if same else 'DIFFER'}")
+
+        found = {(p["from"], p["to"], p["arrive"]) for p in report["passes"]}
+        hits = sum(any((f, t, arr + k) in found for k in range(-10, 11)) for f, t, _, arr in truth)
+        print(f"  passes: {len(report['passes']):,} found / {len(truth):,} scripted — recall "
+              f"{hits / len(truth) * 100:.1f}%, precision {hits / max(len(found), 1) * 100:.1f}%")
+
+        if fmt != "csv":
+            return
+        live, data = Path(tmp) / "live.csv", path.read_bytes()
+        b = train.MatchAnalyzer(fps)
+        tail, times = train.CsvFollower(live, train.ANALYZE_COLUMNS), []
+        cuts = np.linspace(0, len(data), appends + 1).astype(int)           # arbitrary byte offsets
+        with open(live, "wb") as f:
+            for lo, hi in zip(cuts[:-1], cuts[1:]):
+                f.write(data[lo:hi]); f.flush()
+                t0 = time.perf_counter(); b.update(tail.read()); times.append(time.perf_counter() - t0)
+        b.update(tail.read(), final=True)
+        same = same_report(report, b.report()) and np.array_equal(a.heat, b.heat)
+        print(f"  --follow: {appends} appends of ~{minutes / appends * 60:.0f} s of play, "
+              f"{np.mean(times) * 1e3:.0f} ms per append (re-analysing the file: up to {t_new:.2f} s); "
+              f"result {'identical' if same else 'DIFFERS'}")
+
+        # the real thing: another process writes <name>.csv.part and renames it when done
+        final = Path(tmp) / "run_detections.csv"
+        writer = subprocess.Popen([sys.executable, __file__, "_grow", str(path), str(final), str(appends)])
+        with quiet():
+            live = train.analyze(final.with_name(final.name + ".part"), fps, follow=0.02, idle=30)
+        writer.wait()
+        followed = same_report(report, live)
+        print(f"  --follow on a .part another process writes, then renames: "
+              f"{'identical' if followed else 'DIFFERS'} ({live['frames']:,} frames)")
+        if not (same and followed):
+            sys.exit(1)
+
+
+def _grow(src, dst, appends):
+    """Write `src` to <dst>.part in `appends` pieces, then rename it — what extract_csv() does."""
+    data, part = Path(src).read_bytes(), Path(dst).with_name(Path(dst).name + ".part")
+    with open(part, "wb") as f:
+        for k in range(appends):
+            f.write(data[k * len(data) // appends:(k + 1) * len(data) // appends]); f.flush()
+            time.sleep(0.05)
+    part.replace(dst)
+
+
+# ── CLI ────────────────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(HERE))
+    if len(sys.argv) == 4 and sys.argv[1] == "_coco":     # internal: one measured run in a child process
+        _run_coco(sys.argv[2], sys.argv[3])
+        sys.exit()
+    if len(sys.argv) == 5 and sys.argv[1] == "_suite":
+        _run_suite(sys.argv[2], sys.argv[3], sys.argv[4])
+        sys.exit()
+    if len(sys.argv) == 5 and sys.argv[1] == "_stats":
+        _run_stats(sys.argv[2], sys.argv[3], sys.argv[4])
+        sys.exit()
+    if len(sys.argv) == 5 and sys.argv[1] == "_grow":
+        _grow(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        sys.exit()
+    if len(sys.argv) == 5 and sys.argv[1] == "_cold":
+        _run_cold(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        sys.exit()
+
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    c = sub.add_parser("coco")
+    c.add_argument("--images", type=int, default=20000)
+    c.add_argument("--anns",   type=int, default=200000)
+
+    pr = sub.add_parser("prepare")
+    pr.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    pr.add_argument("--images",  type=int, default=20000)
+    pr.add_argument("--anns",    type=int, default=200000)
+
+    rw = sub.add_parser("rows")
+    rw.add_argument("--frames",    type=int, default=2000)
+    rw.add_argument("--per-frame", type=int, default=25)
+
+    lb = sub.add_parser("label")
+    lb.add_argument("--batch",   type=int, nargs="+", default=[1, 4, 8, 16])
+    lb.add_argument("--frames",  type=int, default=160)
+    lb.add_argument("--imgsz",   type=int, default=640)
+    lb.add_argument("--weights", default=None)
+
+    ev = sub.add_parser("every")
+    ev.add_argument("--every",   type=int, default=5)
+    ev.add_argument("--frames",  type=int, default=150)
+    ev.add_argument("--imgsz",   type=int, default=640)
+    ev.add_argument("--weights", default=None)
+
+    wr = sub.add_parser("writer")
+    wr.add_argument("--writers", type=int, nargs="+", default=[0, 4])
+    wr.add_argument("--frames",  type=int, default=150)
+    wr.add_argument("--imgsz",   type=int, default=640)
+    wr.add_argument("--preview-pct", type=int, default=100)
+    wr.add_argument("--weights", default=None)
+
+    bk = sub.add_parser("backend")
+    bk.add_argument("--frames",  type=int, default=50)
+    bk.add_argument("--imgsz",   type=int, default=640, help="must match the exported ONNX size")
+    bk.add_argument("--threads", type=int, default=None)
+    bk.add_argument("--weights", default=None)
+
+    sv = sub.add_parser("serve")
+    sv.add_argument("--clips",   type=int, default=8)
+    sv.add_argument("--frames",  type=int, default=25)
+    sv.add_argument("--imgsz",   type=int, default=640)
+    sv.add_argument("--workers", type=int, default=1)
+    sv.add_argument("--port",    type=int, default=8766)
+    sv.add_argument("--backend", default="pt", choices=["pt", "onnx"])
+    sv.add_argument("--weights", default=None)
+
+    sg = sub.add_parser("segments")
+    sg.add_argument("--segments", type=int, nargs="+", default=[2, 4])
+    sg.add_argument("--frames",   type=int, default=300)
+    sg.add_argument("--overlap",  type=int, default=30)
+    sg.add_argument("--imgsz",    type=int, default=640)
+    sg.add_argument("--weights",  default=None)
+
+    sa = sub.add_parser("stats")
+    sa.add_argument("--rows",       type=int, default=5_000_000)
+    sa.add_argument("--chunk-rows", type=int, default=500_000)
+    sa.add_argument("--format",     default="csv", choices=["csv", "parquet", "arrow"])
+    sa.add_argument("--ceiling-mb", type=float, default=150, help="max peak RSS growth of the chunked pass")
+
+    ss = sub.add_parser("suite")
+    ss.add_argument("--model",     default="tiny", choices=["tiny", "stub"],
+                    help="tiny: random-weight yolo26n built offline; stub: no inference at all")
+    ss.add_argument("--cases",     nargs="+", default=SUITE_CASES, choices=SUITE_CASES)
+    ss.add_argument("--frames",    type=int, default=100)
+    ss.add_argument("--imgsz",     type=int, default=320)
+    ss.add_argument("--repeat",    type=int, default=3, help="runs per case; best throughput / lowest peak kept")
+    ss.add_argument("--threshold", type=float, default=0.15, help="allowed fractional regression")
+    ss.add_argument("--mem-slack", type=float, default=20, help="MB of peak growth always tolerated")
+    ss.add_argument("--baseline",  type=Path, default=BASELINE)
+    ss.add_argument("--save",      action="store_true", help="record these results as the new baseline")
+
+    ro = sub.add_parser("roi")
+    ro.add_argument("--frames",  type=int, default=100)
+    ro.add_argument("--size",    type=int, nargs=2, default=[1920, 1080], metavar=("W", "H"))
+    ro.add_argument("--imgsz",   type=int, default=1280, help="full-frame baseline size")
+    ro.add_argument("--coarse",  type=int, default=640, help="--roi coarse pass size")
+    ro.add_argument("--crop",    type=int, nargs="+", default=[320, 640], help="--roi-crop sizes to compare")
+    ro.add_argument("--refresh", type=int, default=30, help="full-frame pass every N frames")
+    ro.add_argument("--weights", default=None, help="model whose inference cost is charged (default: tiny yolo26n)")
+
+    kf = sub.add_parser("keyframe")
+    kf.add_argument("--every",   type=int, nargs="+", default=[2, 5, 10])
+    kf.add_argument("--frames",  type=int, default=150)
+    kf.add_argument("--size",    type=int, nargs=2, default=[1280, 720], metavar=("W", "H"))
+    kf.add_argument("--imgsz",   type=int, default=640)
+    kf.add_argument("--min-ratio", type=float, default=0.9, help="force a detection below this share of keyframe conf")
+    kf.add_argument("--weights", default=None, help="model whose inference cost is charged (default: tiny yolo26n)")
+
+    up = sub.add_parser("upload")
+    up.add_argument("--images",     type=int,   default=1000)
+    up.add_argument("--workers",    type=int,   default=32, help="async ceiling; the old pool ran half (16)")
+    up.add_argument("--latency",    type=float, default=0.05, help="server seconds per request")
+    up.add_argument("--rate",       type=float, default=0, help="server rate limit, requests/s (0 = none)")
+    up.add_argument("--error-rate", type=float, default=0.02, help="share of requests answered 500")
+    up.add_argument("--port",       type=int,   default=8767)
+
+    ma = sub.add_parser("materialize")
+    ma.add_argument("--images",  type=int,   default=5000)
+    ma.add_argument("--kb",      type=float, default=150, help="mean image size")
+    ma.add_argument("--workers", type=int,   default=8)
+    ma.add_argument("--mode",    default="auto", help="collect --mode")
+
+    an = sub.add_parser("analyze")
+    an.add_argument("--minutes", type=float, default=90)
+    an.add_argument("--fps",     type=int, default=25)
+    an.add_argument("--appends", type=int, default=90, help="pieces the CSV grows in for the --follow check")
+    an.add_argument("--format",  default="csv", choices=["csv", "parquet", "arrow"])
+
+    su = sub.add_parser("startup")
+    su.add_argument("--budget", type=float, default=0.5, help="max wall seconds per subcommand")
+    su.add_argument("--runs",   type=int,   default=5)
+
+    args = p.parse_args()
+
+    if   args.cmd == "coco":    bench_coco(args.images, args.anns)
+    elif args.cmd == "prepare": bench_prepare(args.workers, args.images, args.anns)
+    elif args.cmd == "rows":    bench_rows(args.frames, args.per_frame)
+    elif args.cmd == "label":   bench_label(args.batch, args.frames, args.imgsz, args.weights)
+    elif args.cmd == "every":   bench_every(args.every, args.frames, args.imgsz, args.weights)
+    elif args.cmd == "writer":  bench_writer(args.writers, args.frames, args.imgsz, args.preview_pct, args.weights)
+    elif args.cmd == "backend": bench_backend(args.frames, args.imgsz, args.threads, args.weights)
+    elif args.cmd == "serve":   bench_serve(args.clips, args.frames, args.imgsz, args.workers, args.port, args.weights,
+                                            args.backend)
+    elif args.cmd == "segments": bench_segments(args.segments, args.frames, args.overlap, args.imgsz, args.weights)
+    elif args.cmd == "stats":   bench_stats(args.rows, args.chunk_rows, args.format, args.ceiling_mb)
+    elif args.cmd == "suite":   bench_suite(args.model, args.cases, args.frames, args.imgsz, args.repeat,
+                                            args.threshold, args.mem_slack, args.baseline, args.save)
+    elif args.cmd == "roi":     bench_roi(args.frames, tuple(args.size), args.imgsz, args.coarse, args.crop,
+                                          args.refresh, args.weights)
+    elif args.cmd == "keyframe": bench_keyframe(args.every, args.frames, tuple(args.size), args.imgsz,
+                                                  args.min_ratio, args.weights)
+    elif args.cmd == "upload":  bench_upload(args.images, args.workers, args.latency, args.rate, args.error_rate,
+                                             args.port)
+    elif args.cmd == "materialize": bench_materialize(args.images, args.kb, args.workers, args.mode)
+    elif args.cmd == "analyze": bench_analyze(args.minutes, args.fps, args.appends, args.format)
+    elif args.cmd == "startup": bench_startup(args.budget, args.runs)
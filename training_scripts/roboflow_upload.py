@@ -2,10 +2,16 @@
 roboflow_upload.py — upload the filtered COCO dataset to a Roboflow project
 
 Reads image paths from data/train.txt and data/val.txt (produced by `python train.py prepare`)
-and uploads each image with its YOLO label to Roboflow using parallel threads.
+and uploads each image with its YOLO label through Roboflow's REST upload API.
 
-Successfully uploaded images are logged to data/uploaded.txt so that re-running
-the script after a failure will skip already-uploaded images automatically.
+An asyncio loop hands uploads to a thread pool whose threads share one pool of keep-alive
+HTTP connections (sized to --workers), and caps how many are in flight. Concurrency
+adapts to the server: it grows while requests succeed and halves on 429 / 503.
+Those, other 5xx and dropped connections are retried with jittered backoff
+(honouring Retry-After), so --workers is an upper bound, not a fixed thread count.
+
+Successfully uploaded images are appended to data/uploaded.txt in batches, so that
+re-running the script after a failure will skip already-uploaded images automatically.
 
 Credentials are loaded from .env in the project root, which should contain:
     ROBOFLOW_API_KEY=...
@@ -13,17 +19,21 @@ Credentials are loaded from .env in the project root, which should contain:
     ROBOFLOW_PROJECT=...
 
 Usage:
-    python roboflow_upload.py                     # upload train + val (16 threads)
+    python roboflow_upload.py                     # upload train + val (up to 32 concurrent requests)
     python roboflow_upload.py --split train        # train only
     python roboflow_upload.py --split valid        # val only
     python roboflow_upload.py --batch "coco_v1"   # group into a named batch
-    python roboflow_upload.py --workers 32         # more threads = faster (watch rate limits)
+    python roboflow_upload.py --workers 64         # higher concurrency ceiling (backs off on 429s anyway)
+    python roboflow_upload.py --api-url http://127.0.0.1:9000   # a local stand-in server (see bench.py upload)
 """
 
 import argparse
+import asyncio
+import json
 import os
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -35,8 +45,11 @@ load_dotenv(ROOT / ".env")
 API_KEY      = os.environ.get("ROBOFLOW_API_KEY")
 WORKSPACE_ID = os.environ.get("ROBOFLOW_WORKSPACE")
 PROJECT_ID   = os.environ.get("ROBOFLOW_PROJECT")
+API_URL      = "https://api.roboflow.com"
 
 UPLOAD_LOG = ROOT / "data" / "uploaded.txt"
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+BUSY_STATUS  = {429, 503}                          # the server asking us to slow down
 
 
 def label_path_for(img_path: Path) -> Path:
@@ -44,32 +57,186 @@ def label_path_for(img_path: Path) -> Path:
 
 
 def load_uploaded() -> set:
-    if UPLOAD_LOG.exists():
-        return set(UPLOAD_LOG.read_text().splitlines())
-    return set()
-
-
-def _upload_one(args):
-    project, img_path, split, batch_name, retries, log_lock, log_file = args
-    lbl = label_path_for(img_path)
-    kwargs = dict(
-        image_path        = str(img_path),
-        split             = split,
-        num_retry_uploads = retries,
-    )
-    if batch_name:
-        kwargs["batch_name"] = batch_name
-    if lbl.exists() and lbl.stat().st_size > 0:
-        kwargs["annotation_path"] = str(lbl)
-
-    project.upload(**kwargs)
-
-    with log_lock:
-        with open(log_file, "a") as f:
-            f.write(str(img_path) + "\n")
-
-
-def upload_split(project, txt_file: Path, split: str, batch_name, retries: int, workers: int, already_uploaded: set):
+    if not UPLOAD_LOG.exists():
+        return set()
+    with open(UPLOAD_LOG) as f:                    # line by line: no second copy of the whole log in memory
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def load_labelmap() -> dict:
+    """Class index -> name from data/football.yaml, so Roboflow can read the YOLO labels."""
+    yaml_path = ROOT / "data" / "football.yaml"
+    if not yaml_path.exists():
+        return {}
+    import yaml
+    return {str(k): v for k, v in (yaml.safe_load(yaml_path.read_text()).get("names") or {}).items()}
+
+
+class ResumeLog:
+    """Append-only data/uploaded.txt, written in batches: one open file, flushed
+    every `every` seconds or `batch` entries (and on close), instead of one
+    open/append/close per image."""
+
+    def __init__(self, path, batch=500, every=2.0):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.f, self.batch, self.every = open(path, "a"), batch, every
+        self.pending, self.last = [], time.monotonic()
+
+    def add(self, entry):
+        self.pending.append(entry)
+        if len(self.pending) >= self.batch or time.monotonic() - self.last >= self.every:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.f.write("".join(e + "\n" for e in self.pending))
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.pending = []
+        self.last = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit, as TCP does it: +1 slot per success until the server first
+    pushes back (slow start), then +1 per `limit` consecutive successes, up to `ceiling`.
+    A 429 / 503 halves it, at most once per `cooldown` seconds."""
+
+    def __init__(self, start=4, ceiling=32, cooldown=1.0):
+        self.limit, self.ceiling, self.cooldown = min(start, ceiling), ceiling, cooldown
+        self.active, self.streak, self.last_cut = 0, 0, 0.0
+        self.peak, self.cuts = self.limit, 0
+        self.cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self, ok=True, busy=False):
+        async with self.cond:
+            self.active -= 1
+            if ok:
+                self.streak += 1
+                if (self.streak >= self.limit or not self.cuts) and self.limit < self.ceiling:
+                    self.limit, self.streak = self.limit + 1, 0
+                    self.peak = max(self.peak, self.limit)
+            elif busy and time.monotonic() - self.last_cut >= self.cooldown:
+                self.limit, self.streak, self.last_cut = max(1, self.limit // 2), 0, time.monotonic()
+                self.cuts += 1
+            self.cond.notify_all()
+
+
+class RetryableError(Exception):
+    def __init__(self, message, retry_after=None, busy=False):
+        super().__init__(message)
+        self.retry_after, self.busy = retry_after, busy
+
+
+class Uploader:
+    """Blocking Roboflow REST calls, made from worker threads over one shared requests.Session.
+
+    The Session's adapter keeps a single urllib3 pool of up to `pool` keep-alive connections
+    (one per concurrent request), which is thread-safe to share; no cookies are involved.
+    """
+
+    def __init__(self, api_url, api_key, project, labelmap=None, pool=32, timeout=60):
+        import requests
+        self.api_url, self.api_key, self.project = api_url.rstrip("/"), api_key, project
+        self.labelmap, self.timeout = labelmap or {}, timeout
+        self.ids = {}                                     # image -> id, so a retry only re-sends the label
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool)
+        self.session.mount("http://", adapter); self.session.mount("https://", adapter)
+
+    def _post(self, url, params, **kwargs):
+        import requests
+        try:
+            r = self.session.post(url, params={"api_key": self.api_key, **params}, timeout=self.timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(type(e).__name__) from e
+        if r.status_code in RETRY_STATUS:
+            after = r.headers.get("Retry-After")
+            raise RetryableError(f"HTTP {r.status_code}", float(after) if after and after.isdigit() else None,
+                                 busy=r.status_code in BUSY_STATUS)
+        r.raise_for_status()
+        return r.json()
+
+    def upload(self, img_path: Path, split, batch_name=None):
+        if img_path not in self.ids:
+            params = {"name": img_path.name, "split": split}
+            if batch_name:
+                params["batch"] = batch_name
+            with open(img_path, "rb") as f:
+                res = self._post(f"{self.api_url}/dataset/{self.project}/upload", params,
+                                 files={"file": (img_path.name, f, "image/jpeg")})
+            if not (res.get("success") or res.get("duplicate")) or "id" not in res:
+                raise RuntimeError(res.get("error") or res)
+            self.ids[img_path] = res["id"]
+        lbl = label_path_for(img_path)
+        if lbl.exists() and lbl.stat().st_size > 0:
+            res = self._post(f"{self.api_url}/dataset/{self.project}/annotate/{self.ids[img_path]}", {"name": lbl.name},
+                             data=json.dumps({"annotationFile": lbl.read_text(), "labelmap": self.labelmap}),
+                             headers={"Content-Type": "application/json"})
+            if not res.get("success"):
+                raise RuntimeError(res.get("error") or res)
+        del self.ids[img_path]
+
+
+async def upload_all(uploader, paths, split, batch_name, retries, limit, log, progress=None):
+    """Upload `paths` under the adaptive limit; returns (uploaded, failed, retried)."""
+    stats = {"uploaded": 0, "failed": 0, "retried": 0}
+
+    async def one(img_path):
+        for attempt in range(retries + 1):
+            await limit.acquire()
+            try:
+                await asyncio.to_thread(uploader.upload, img_path, split, batch_name)
+            except RetryableError as e:
+                await limit.release(False, e.busy)
+                if attempt == retries:
+                    print(f"\n  Failed: {img_path.name} — {e} after {retries} retries"); break
+                stats["retried"] += 1
+                delay = e.retry_after if e.retry_after is not None else min(30.0, 0.5 * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))     # jitter: don't retry in lockstep
+                continue
+            except Exception as e:
+                await limit.release(True)                                  # the server is fine; this image is not
+                print(f"\n  Failed: {img_path.name} — {e}"); break
+            await limit.release(True)
+            log.add(str(img_path))
+            stats["uploaded"] += 1
+            if progress: progress.update()
+            return
+        stats["failed"] += 1
+        if progress: progress.update()
+
+    async def flusher():
+        while True:
+            await asyncio.sleep(log.every)
+            log.flush()
+
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(limit.ceiling))
+    flush_task = asyncio.create_task(flusher())
+    try:
+        queue = iter(paths)
+        running = set()
+        for img_path in queue:                     # never more tasks than the ceiling: big splits stay cheap
+            running.add(asyncio.create_task(one(img_path)))
+            if len(running) >= limit.ceiling * 2:
+                _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        if running:
+            await asyncio.wait(running)
+    finally:
+        flush_task.cancel()
+        log.flush()
+    return stats["uploaded"], stats["failed"], stats["retried"]
+
+
+def upload_split(uploader, txt_file: Path, split: str, batch_name, retries: int, workers: int, already_uploaded: set):
     if not txt_file.exists():
         print(f"  {txt_file.name} not found — skipping.")
         return 0, 0, 0
@@ -86,48 +253,46 @@ def upload_split(project, txt_file: Path, split: str, batch_name, retries: int,
     if not paths:
         return 0, 0, skipped
 
-    log_lock = threading.Lock()
-    uploaded = failed = 0
-    tasks = [(project, img, split, batch_name, retries, log_lock, UPLOAD_LOG) for img in paths]
-
-    with ThreadPoolExecutor(max_workers=workers) as pool:
-        futures = {pool.submit(_upload_one, t): t[1] for t in tasks}
-        for future in tqdm(as_completed(futures), total=len(futures), desc=split, unit="img"):
-            try:
-                future.result()
-                uploaded += 1
-            except Exception as e:
-                print(f"\n  Failed: {futures[future].name} — {e}")
-                failed += 1
-
+    log = ResumeLog(UPLOAD_LOG)
+    t0 = time.perf_counter()
+    try:
+        with tqdm(total=len(paths), desc=split, unit="img") as bar:
+            async def run():
+                limit = AdaptiveLimit(start=min(4, workers), ceiling=workers)
+                result = await upload_all(uploader, paths, split, batch_name, retries, limit, log, bar)
+                return result, limit
+            (uploaded, failed, retried), limit = asyncio.run(run())
+    finally:
+        log.close()
+    dt = time.perf_counter() - t0
+    print(f"  {split}: {uploaded / max(dt, 1e-9):.1f} img/s, {retried} retries, "
+          f"concurrency peaked at {limit.peak} ({limit.cuts} back-offs)")
     return uploaded, failed, skipped
 
 
-def main(split="both", batch_name=None, retries=3, workers=16):
-    if not API_KEY:
+def main(split="both", batch_name=None, retries=3, workers=32, api_url=API_URL):
+    if not API_KEY and api_url == API_URL:
         print("ERROR: ROBOFLOW_API_KEY not found. Create a .env file in the project root.")
         print("  ROBOFLOW_API_KEY=your_key")
         print("  ROBOFLOW_WORKSPACE=your_workspace")
         print("  ROBOFLOW_PROJECT=your_project")
         return
 
-    from roboflow import Roboflow
-
     already_uploaded = load_uploaded()
     if already_uploaded:
         print(f"Resuming — {len(already_uploaded):,} images already logged in {UPLOAD_LOG.name}")
 
-    print(f"Connecting to {WORKSPACE_ID}/{PROJECT_ID} ...")
-    project = Roboflow(api_key=API_KEY).workspace(WORKSPACE_ID).project(PROJECT_ID)
+    print(f"Uploading to {WORKSPACE_ID}/{PROJECT_ID} via {api_url} ...")
+    uploader = Uploader(api_url, API_KEY or "local", PROJECT_ID, load_labelmap(), pool=workers)
 
     total_uploaded = total_failed = total_skipped = 0
 
     if split in ("both", "train"):
-        u, f, s = upload_split(project, ROOT / "data" / "train.txt", "train", batch_name, retries, workers, already_uploaded)
+        u, f, s = upload_split(uploader, ROOT / "data" / "train.txt", "train", batch_name, retries, workers, already_uploaded)
         total_uploaded += u; total_failed += f; total_skipped += s
 
     if split in ("both", "valid"):
-        u, f, s = upload_split(project, ROOT / "data" / "val.txt", "valid", batch_name, retries, workers, already_uploaded)
+        u, f, s = upload_split(uploader, ROOT / "data" / "val.txt", "valid", batch_name, retries, workers, already_uploaded)
         total_uploaded += u; total_failed += f; total_skipped += s
 
     print(f"\nDone: {total_uploaded:,} uploaded, {total_skipped:,} skipped, {total_failed} failed")
@@ -140,7 +305,8 @@ if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--split",   default="both",  choices=["both", "train", "valid"])
     p.add_argument("--batch",   default=None,    help="Roboflow batch name")
-    p.add_argument("--retries", type=int, default=3)
-    p.add_argument("--workers", type=int, default=16, help="parallel upload threads")
+    p.add_argument("--retries", type=int, default=3, help="retries per image on 429 / 5xx / connection errors")
+    p.add_argument("--workers", type=int, default=32, help="max concurrent uploads (adapts below this)")
+    p.add_argument("--api-url", default=API_URL, help="Roboflow API base URL (e.g. a local stand-in server)")
     args = p.parse_args()
-    main(args.split, args.batch, args.retries, args.workers)
+    main(args.split, args.batch, args.retries, args.workers, args.api_url)
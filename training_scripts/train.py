@@ -3,31 +3,54 @@ main.py — YOLO26 football detector
 
 Usage:
     python main.py prepare
+    python main.py prepare --workers 8   # write labels from 8 processes
     python main.py train --size n --epochs 50 --batch 40 --imgsz 1280
     python main.py train --size n --resume
     python main.py validate --size n
     python main.py export --size n
+    python main.py export --size n --int8 --compare   # + calibrated INT8 ONNX, FP32 vs INT8 table
     python main.py track --video data/clip.mp4
+    python main.py csv --video data/clip.mp4 --backend onnx --threads 8   # exported ONNX on ONNX Runtime (CPU)
     python main.py csv --video data/clip.mp4
+    python main.py csv --video data/clip.mp4 --format parquet   # typed, columnar output for stats
+    python main.py csv --video data/matchday/ --jobs 4            # every clip in the folder, 4 worker processes
+    python main.py csv --video "data/*/*.mp4" --jobs 4            # or a glob; finished outputs are skipped
+    python main.py csv --video data/match.mp4 --segments 8       # one long video, 8 segments in parallel
+    python main.py csv --video data/clip.mp4 --pipeline         # threaded decode/infer/write + stage timings
+    python main.py csv --video data/clip.mp4 --profile runs/csv.prom   # p50/p95/p99 per stage, Prometheus text
+    python main.py csv --video data/clip.mp4 --detect-every 5    # detector on every 5th frame, optical flow between
+    python main.py csv --video data/clip.mp4 --roi 640           # 640px pass finds players / ball, native-res crops there
     python main.py label --images data/my_images
-    python main.py stats --csv runs/detections.csv
+    python main.py label --images data/my_images --batch-size 8   # 8 images per forward pass
+    python main.py stats --csv runs/detections.csv            # also reads .parquet / .arrow
+    python main.py stats --csv runs/season.parquet --chunk-rows 1000000   # streamed, bounded memory
+    python main.py analyze --csv runs/detections.csv          # possession, passes, ball speed, heatmaps per track
+    python main.py analyze --csv runs/live.csv --follow 2      # CSV still being written: read only the new rows
     python main.py label-video --video data/clip.mp4 --every 5   # extract + auto-label video frames for Roboflow
-    python main.py collect          # copy only the filtered training images to data/coco_filtered/
+    python main.py serve --workers 2 --warm n:pt     # resident, warmed models behind a local HTTP job queue
+    python main.py csv --video data/clip.mp4 --server http://127.0.0.1:8765   # run the job on `serve`
+    python main.py collect          # link (or copy) only the filtered training images to data/coco_filtered/
+    python main.py collect --mode symlink --workers 16
     python main.py clean            # delete .npy/.cache files from the dataset dir (frees ~50 GB after training)
     python main.py roboflow         # zip data/labeled/ into roboflow_export.zip ready for Roboflow upload
 """
 
 import argparse
+import contextlib
 import csv
 import glob
+import hashlib
 import json
 import shutil
 from collections import defaultdict
+from functools import partial
 from pathlib import Path
 
-import torch
+import numpy as np
 from tqdm.auto import tqdm
-from ultralytics import YOLO
+
+# torch / ultralytics are imported inside the model subcommands — together they cost
+# ~2 s of startup that clean, collect, roboflow and stats never need.
 
 # ── Repo root (all paths relative to this file) ────────────────────────────────
 ROOT = Path(__file__).parent
@@ -39,6 +62,7 @@ CLASS_NAMES = {0: "person", 1: "sports_ball"}
 
 
 def get_device():
+    import torch
     if torch.cuda.is_available():
         print(f"[device] CUDA — {torch.cuda.get_device_name(0)}")
         return 0
@@ -53,11 +77,999 @@ def best_weights(size):
     return ROOT / "runs" / f"yolo26{size}_football" / "weights" / "best.pt"
 
 
+# ── Model loading ──────────────────────────────────────────────────────────────
+
+_MODELS   = {}      # (size, backend[, threads]) -> YOLO, reused by every call in this process
+_SESSIONS = {}      # (onnx path, threads) -> tuned onnxruntime.InferenceSession
+
+
+def _ort_options(threads=None):
+    """CPU SessionOptions with explicit thread settings for the exported YOLO graph."""
+    import os
+    import onnxruntime as ort
+    so = ort.SessionOptions()
+    so.intra_op_num_threads     = threads or os.cpu_count()   # parallelism inside each op (convs)
+    so.inter_op_num_threads     = 1                            # the YOLO graph is a single chain
+    so.execution_mode           = ort.ExecutionMode.ORT_SEQUENTIAL
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return so
+
+
+def _ort_session(path, threads=None):
+    """CPU InferenceSession for `path` built from _ort_options(), once per (path, threads)."""
+    if (path, threads) not in _SESSIONS:
+        import onnxruntime as ort
+        _SESSIONS[path, threads] = ort.InferenceSession(str(path), _ort_options(threads),
+                                                        providers=["CPUExecutionProvider"])
+    return _SESSIONS[path, threads]
+
+
+def _onnx_input_size(path):
+    """Square input size an ONNX export was fixed to, or 0 when its spatial dims are dynamic."""
+    import onnx
+    dims = onnx.load(str(path), load_external_data=False).graph.input[0].type.tensor_type.shape.dim
+    h, w = (d.dim_value for d in dims[2:4])               # dim_value is 0 for a symbolic dim
+    return h if h and h == w else 0
+
+
+def _onnx_yolo(path, threads=None):
+    """YOLO on an ONNX export whose predictors build their session with _ort_options(threads).
+
+    AutoBackend takes no session options, so while a predictor sets up, its "onnx" entry
+    is pointed at an ONNXBackend that has them — the session is created once, already tuned.
+    """
+    from ultralytics import YOLO
+    from ultralytics.models.yolo.detect import DetectionPredictor
+    from ultralytics.nn.autobackend import AutoBackend
+    from ultralytics.nn.backends.onnx import ONNXBackend
+    options = _ort_options(threads)
+
+    class TunedPredictor(DetectionPredictor):
+        def setup_model(self, model, verbose=True):
+            stock = AutoBackend._BACKEND_MAP
+            AutoBackend._BACKEND_MAP = {**stock, "onnx": partial(ONNXBackend, session_options=options)}
+            try:
+                super().setup_model(model, verbose)
+            finally:
+                AutoBackend._BACKEND_MAP = stock
+
+    class TunedYOLO(YOLO):
+        def _smart_load(self, key):
+            return TunedPredictor if key == "predictor" else super()._smart_load(key)
+
+    return TunedYOLO(str(path), task="detect")
+
+
+def load_model(size="n", backend="pt", threads=None):
+    """Return the trained model for `size`, loading it only once per process.
+
+    backend="onnx" runs best.onnx (written by `export`) on ONNX Runtime's CPU
+    provider; its session is built with _ort_options(threads) from the start rather
+    than replaced afterwards, and the cache is keyed by `threads` as well.
+    """
+    key = (size, backend, threads) if backend == "onnx" else (size, backend)
+    if key in _MODELS:
+        return _MODELS[key]
+    w = best_weights(size)
+    if backend == "onnx":
+        w = w.with_suffix(".onnx")
+        if not w.exists():
+            raise FileNotFoundError(f"No ONNX model at {w} — run `export --size {size}` first")
+        model = _onnx_yolo(w, threads)
+        model.onnx_imgsz = _onnx_input_size(w)           # fixed exports run at their one size; 0 = dynamic
+    else:
+        from ultralytics import YOLO
+        model = YOLO(str(w), task="detect")
+    _MODELS[key] = model
+    return model
+
+
+def reset_trackers(model):
+    """Clear ByteTrack state (and its ID counter) left on a cached model by a previous video."""
+    for t in getattr(getattr(model, "predictor", None), "trackers", []):
+        t.reset()
+
+
+def run_args(model, imgsz):
+    """imgsz/device for predict() and track(): ONNX models run on CPU at their exported size."""
+    if getattr(model, "onnx_imgsz", None) is not None:
+        return {"imgsz": model.onnx_imgsz or imgsz, "device": "cpu"}
+    return {"imgsz": imgsz, "device": get_device()}
+
+
+# ── Streaming COCO reader ──────────────────────────────────────────────────────
+
+class _JSONStream:
+    """Minimal incremental reader: decodes one JSON value at a time from a file
+    so that only the current chunk (plus one partial value) is held in memory."""
+
+    def __init__(self, f, chunk_size=1 << 22):
+        self.f, self.chunk_size = f, chunk_size
+        self.buf, self.pos, self.eof = "", 0, False
+        self.dec = json.JSONDecoder()
+
+    def _fill(self):
+        data = self.f.read(self.chunk_size)
+        self.buf, self.pos, self.eof = self.buf[self.pos:] + data, 0, not data
+        return not self.eof
+
+    def peek(self):
+        """Skip whitespace and return the next character ('' at end of file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def take(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"Expected {ch!r} at offset {self.pos} of {self.f.name}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.dec.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:     # a number may continue in the next chunk
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self._fill()
+
+
+def iter_json_arrays(path, keys):
+    """Yield (key, item) for each element of the top-level arrays named in `keys`.
+
+    Other top-level values (info, licenses, categories, ...) are decoded and dropped.
+    """
+    with open(path, encoding="utf-8") as f:
+        s = _JSONStream(f)
+        s.take("{")
+        while s.peek() != "}":
+            key = s.value(); s.take(":")
+            if s.peek() == "[":
+                s.take("[")
+                while s.peek() != "]":
+                    item = s.value()
+                    if key in keys: yield key, item
+                    if s.peek() == ",": s.take(",")
+                s.take("]")
+            else:
+                s.value()
+            if s.peek() == ",": s.take(",")
+
+
+def index_coco(ann_file):
+    """Stream a COCO instances file and index only the COCO_KEEP annotations.
+
+    Returns (img_info, by_image, n_anns):
+        img_info  {image_id: (file_name, width, height)}
+        by_image  {image_id: [(yolo_cls, [x, y, w, h]), ...]}  in file order
+        n_anns    total number of annotations seen
+    """
+    img_info, by_image, n_anns = {}, defaultdict(list), 0
+    for key, item in iter_json_arrays(ann_file, ("images", "annotations")):
+        if key == "images":
+            img_info[item["id"]] = (item["file_name"], item["width"], item["height"])
+            continue
+        n_anns += 1
+        if item["category_id"] in COCO_KEEP and not item.get("iscrowd", 0):
+            by_image[item["image_id"]].append((COCO_KEEP[item["category_id"]], item["bbox"]))
+    return img_info, by_image, n_anns
+
+
+def _write_label_chunk(img_dir, label_dir, items):
+    """Write YOLO labels for [(file_name, W, H, [(cls, bbox), ...], prev_hash), ...].
+
+    A label whose content hash equals prev_hash (from the manifest) and still exists
+    on disk is left untouched. Returns (image paths kept, kept, skipped, {stem: hash},
+    written) with paths in input order.
+    """
+    paths, kept, skipped, hashes, written = [], 0, 0, {}, 0
+    for file_name, W, H, anns, prev_hash in items:
+        img_path = img_dir / file_name
+        if not img_path.exists():
+            skipped += 1; continue
+        lines = []
+        for cls, (x, y, w, h) in anns:
+            cx = max(0.0, min(1.0, (x + w/2) / W))
+            cy = max(0.0, min(1.0, (y + h/2) / H))
+            nw = max(0.0, min(1.0, w / W))
+            nh = max(0.0, min(1.0, h / H))
+            if nw > 0 and nh > 0:
+                lines.append(f"{cls} {cx:.6f} {cy:.6f} {nw:.6f} {nh:.6f}")
+        if lines:
+            stem, text = Path(file_name).stem, "\n".join(lines)
+            h = hashlib.sha1(text.encode()).hexdigest()[:16]
+            lbl = (label_dir / stem).with_suffix(".txt")
+            if h != prev_hash or not lbl.exists():
+                lbl.write_text(text); written += 1
+            hashes[stem] = h
+            paths.append(str(img_path)); kept += 1
+        else:
+            skipped += 1
+    return paths, kept, skipped, hashes, written
+
+
+def _map_chunks(fn, items, workers, *args, chunk=2000):
+    """Yield fn(*args, items[i:i+chunk]) in order, from a process pool when workers > 1."""
+    chunks = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+    if workers <= 1:
+        yield from (fn(*args, c) for c in chunks)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(partial(fn, *args), chunks)
+
+
+# ── Detection output ───────────────────────────────────────────────────────────
+
+CSV_COLUMNS = ["frame", "track_id", "class", "conf", "x1", "y1", "x2", "y2", "cx", "cy"]
+_CLASS_LOOKUP = np.array([CLASS_NAMES[i] for i in sorted(CLASS_NAMES)], dtype=object)
+
+
+def _round1(d):
+    """Vectorized round(d, 1) that matches Python's correctly-rounded result bit for bit.
+
+    d*10 is formed exactly as (16d + 4d)/2 via TwoSum, so values that merely look
+    like .x5 midpoints round the same way Python's round() does.
+    """
+    a, b = d * 16, d * 4
+    s    = a + b
+    bb   = s - a
+    e    = (a - (s - bb)) + (b - bb)                 # s + e == 20*d exactly
+    fl   = np.floor(s / 2)
+    diff = (s - (2 * fl + 1)) + e                    # sign of 10*d - (fl + 0.5)
+    up   = (diff > 0) | ((diff == 0) & (fl % 2 == 1))
+    return (fl + up) / 10
+
+
+def detection_columns(i, boxes):
+    """One frame of ultralytics Boxes -> dict of CSV_COLUMNS arrays (class as index).
+
+    Copies the boxes to host memory once and rounds in NumPy instead of per-box
+    .item() calls; values are identical to the old per-box round() path.
+    """
+    b    = boxes.cpu().numpy()
+    n    = len(b.cls)
+    xyxy = np.rint(b.xyxy.astype(np.float64) * 10) / 10   # float32 * 10 is exact in float64
+    x1, y1, x2, y2 = xyxy.T
+    return {
+        "frame":    np.full(n, i, dtype=np.int64),
+        "track_id": b.id.astype(np.int64) if b.id is not None else np.full(n, -1, dtype=np.int64),
+        "class":    b.cls.astype(np.int8),                     # class index; names applied on write
+        "conf":     np.round(b.conf.astype(np.float64), 4),
+        "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+        "cx": _round1((x1 + x2) / 2),
+        "cy": _round1((y1 + y2) / 2),
+    }
+
+
+def detection_rows(cols, columns=CSV_COLUMNS):
+    cols = dict(cols, **{"class": _CLASS_LOOKUP[cols["class"]]})
+    return zip(*(cols[c].tolist() for c in columns))
+
+
+DETECTION_FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _arrow_schema(interpolated=False):
+    import pyarrow as pa
+    f32 = pa.float32()
+    return pa.schema([("frame", pa.int32()), ("track_id", pa.int32()),
+                      ("class", pa.dictionary(pa.int8(), pa.string())), ("conf", f32),
+                      *((c, f32) for c in CSV_COLUMNS[4:]),
+                      *([("interpolated", pa.bool_())] if interpolated else [])])
+
+
+class DetectionWriter:
+    """Writes detection_columns() batches as CSV, Parquet or Arrow IPC (Feather v2).
+
+    Columnar formats are typed (int32 frame/track_id, dictionary class, float32
+    values) and flushed every `batch_rows` rows as one row group / record batch.
+    interpolated=True adds a trailing 0/1 (bool) column of that name to every row.
+    """
+
+    def __init__(self, path, fmt="csv", batch_rows=1 << 16, interpolated=False):
+        self.path, self.fmt, self.batch_rows = Path(path), fmt, batch_rows
+        self.columns = CSV_COLUMNS + ["interpolated"] if interpolated else CSV_COLUMNS
+        self.pending, self.n_pending, self.rows = [], 0, 0
+        if fmt == "csv":
+            self.f = open(self.path, "w", newline="")
+            self.w = csv.writer(self.f)
+            self.w.writerow(self.columns)
+            return
+        import pyarrow as pa
+        self.schema = _arrow_schema(interpolated)
+        self.classes = pa.array(list(_CLASS_LOOKUP), pa.string())
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self.w = pq.ParquetWriter(self.path, self.schema, compression="zstd")
+        else:
+            self.w = pa.ipc.new_file(self.path, self.schema,
+                                     options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+    def write(self, cols):
+        self.rows += len(cols["frame"])
+        if self.fmt == "csv":
+            self.w.writerows(detection_rows(cols, self.columns)); return
+        self.pending.append(cols); self.n_pending += len(cols["frame"])
+        if self.n_pending >= self.batch_rows: self._flush()
+
+    def _flush(self):
+        if not self.pending: return
+        import pyarrow as pa
+        cat = {c: np.concatenate([p[c] for p in self.pending]) for c in self.columns}
+        arrays = [pa.array(cat["frame"], pa.int32()), pa.array(cat["track_id"], pa.int32()),
+                  pa.DictionaryArray.from_arrays(pa.array(cat["class"], pa.int8()), self.classes),
+                  *(pa.array(cat[c], pa.float32()) for c in CSV_COLUMNS[3:]),
+                  *([pa.array(cat["interpolated"].astype(bool))] if len(self.columns) > len(CSV_COLUMNS) else [])]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self.w.write_batch(batch)
+        self.pending, self.n_pending = [], 0
+
+    def close(self):
+        if self.fmt == "csv":
+            self.f.close(); return
+        self._flush()
+        self.w.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+def read_detections(path, columns=None):
+    """Load an extract_csv() output of any DETECTION_FORMATS, reading only `columns`."""
+    import pandas as pd
+    path = Path(path)
+    if path.suffix == ".parquet": return pd.read_parquet(path, columns=columns)
+    if path.suffix == ".arrow":   return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def iter_detections(path, columns=None, chunk_rows=1 << 20):
+    """Yield an extract_csv() output as DataFrames of at most `chunk_rows` rows.
+
+    Arrow record batches are sliced to `chunk_rows`, but each stored batch is still
+    decompressed whole (extract_csv() stores one per ~65k rows, per-frame writes).
+    """
+    import pandas as pd
+    path = Path(path)
+    if path.suffix == ".csv":
+        dtype = {"class": "category"} if columns is None or "class" in columns else None
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows, dtype=dtype)
+        return
+    import pyarrow as pa
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(chunk_rows, columns=columns)
+    else:
+        reader  = pa.ipc.open_file(pa.memory_map(str(path)))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    for batch in batches:
+        if columns: batch = batch.select(columns)
+        for lo in range(0, batch.num_rows, chunk_rows):        # Arrow batches come as they were written
+            yield batch.slice(lo, chunk_rows).to_pandas()
+
+
+# ── Video pipeline ─────────────────────────────────────────────────────────────
+
+class VideoFrames:
+    """Iterate (frame_index, BGR frame) over a video with OpenCV.
+
+    With every=N only frames 0, N, 2N, ... are retrieved; the rest are grab()bed,
+    which advances the stream without the colour conversion and copy, and never
+    reach the model. `total` counts every frame read so far, kept or not.
+    start / stop restrict iteration to frames [start, stop); indices stay global.
+    """
+
+    def __init__(self, video_in, every=1, start=0, stop=None):
+        self.video_in, self.every, self.total = video_in, max(1, every), 0
+        self.start, self.stop = start, stop
+
+    def __iter__(self):
+        import cv2
+        cap = cv2.VideoCapture(str(self.video_in))
+        if not cap.isOpened():
+            raise FileNotFoundError(f"Cannot open video {self.video_in}")
+        if self.start and not (cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+                               and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == self.start):
+            cap.release()                                  # backend cannot seek: decode up to start
+            cap = cv2.VideoCapture(str(self.video_in))
+            for _ in range(self.start): cap.grab()
+        try:
+            while True:
+                i = self.start + self.total
+                if self.stop is not None and i >= self.stop: return
+                if i % self.every:
+                    if not cap.grab(): return
+                    self.total += 1
+                    continue
+                ok, frame = cap.read()
+                if not ok: return
+                self.total += 1
+                yield i, frame
+        finally:
+            cap.release()
+
+
+def iter_images(source):
+    """Yield (path, BGR image) for an image file, every image in a directory, or every
+    image matching a glob pattern (sorted). Raises FileNotFoundError when nothing matches."""
+    from ultralytics.data.utils import IMG_FORMATS
+    from ultralytics.utils.patches import imread
+    source = Path(source)
+    if source.is_file():
+        files = [source]
+    elif source.is_dir():
+        files = sorted(source.iterdir())
+    elif glob.has_magic(str(source)):
+        files = sorted(Path(p) for p in glob.glob(str(source), recursive=True))
+    else:
+        files = []
+    if not any(p.suffix[1:].lower() in IMG_FORMATS for p in files):
+        raise FileNotFoundError(f"No images found at {source}")
+    for p in files:
+        if p.suffix[1:].lower() in IMG_FORMATS and (im := imread(str(p))) is not None:
+            yield p, im
+
+
+def predict_batched(model, items, batch_size=1, **kwargs):
+    """Yield (key, Results) for (key, frame) items, running model.predict on up to
+    `batch_size` frames per forward pass.
+
+    A batch is flushed early when the frame shape changes, so every batch is
+    letterboxed exactly like a single frame would be and results match batch_size=1.
+    """
+    batch = []
+
+    def run():
+        keys = [k for k, _ in batch]
+        return zip(keys, model.predict([f for _, f in batch], **kwargs))
+
+    for key, frame in items:
+        if batch and (len(batch) >= batch_size or frame.shape != batch[0][1].shape):
+            yield from run()
+            batch = []
+        batch.append((key, frame))
+    if batch:
+        yield from run()
+
+
+def video_fps(video_in):
+    import cv2
+    cap = cv2.VideoCapture(str(video_in))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+    return fps
+
+
+def video_frame_count(video_in):
+    import cv2
+    cap = cv2.VideoCapture(str(video_in))
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return n
+
+
+class StageTimer:
+    """Per-frame wall time of each named pipeline stage.
+
+    add_result() splits one model call into Ultralytics' own r.speed stages
+    (preprocess / inference / postprocess) plus the remainder (the tracker);
+    summary() / dump() give p50 / p95 / p99 latency per stage for --profile.
+    """
+
+    def __init__(self):
+        self.samples, self.wall = defaultdict(list), 0.0
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def add_result(self, r, seconds=None, rest="track"):
+        known = 0.0
+        for stage in ("preprocess", "inference", "postprocess"):
+            ms = (getattr(r, "speed", None) or {}).get(stage)
+            if ms is not None:
+                self.add(stage, ms / 1e3); known += ms / 1e3
+        if seconds is not None:
+            self.add(rest, max(0.0, seconds - known))
+
+    def timed(self, iterable, stage="decode"):
+        """Yield from `iterable`, recording how long each item took to produce."""
+        from time import perf_counter
+        it = iter(iterable)
+        while True:
+            t0 = perf_counter()
+            item = next(it, _DONE)
+            if item is _DONE: return
+            self.add(stage, perf_counter() - t0)
+            yield item
+
+    def summary(self):
+        out = {}
+        for stage, xs in self.samples.items():
+            ms = np.array(xs) * 1e3
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            out[stage] = {"frames": len(xs), "busy_s": float(ms.sum() / 1e3), "mean_ms": float(ms.mean()),
+                          "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                          "max_fps": float(1e3 / ms.mean()) if ms.mean() > 0 else None}
+        return out
+
+    def report(self, tag, frames=None):
+        fps = f", {frames / self.wall:.1f} fps" if frames and self.wall else ""
+        print(f"[{tag}] {self.wall:.1f} s wall{fps} — per-stage busy time:")
+        slowest = max(self.samples, key=lambda k: sum(self.samples[k]), default=None)
+        for stage, m in self.summary().items():
+            print(f"  {stage:<12}{m['busy_s']:8.1f} s {m['mean_ms']:7.1f} ms/frame  "
+                  f"p50 {m['p50_ms']:6.1f}  p95 {m['p95_ms']:6.1f}  p99 {m['p99_ms']:6.1f} ms  "
+                  f"{m['busy_s'] / max(self.wall, 1e-9) * 100:5.1f}% busy{'  <- limiting stage' if stage == slowest else ''}")
+
+    def dump(self, path, cmd, frames, **meta):
+        """Write the summary as JSON, or Prometheus text exposition format for *.prom."""
+        import platform
+        import time
+        from importlib.metadata import PackageNotFoundError, version
+        versions = {"python": platform.python_version()}
+        for pkg in ("torch", "ultralytics", "onnxruntime", "opencv-python"):
+            try: versions[pkg] = version(pkg)
+            except PackageNotFoundError: pass
+        path, stages = Path(path), self.summary()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fps = frames / self.wall if self.wall else 0.0
+        if path.suffix != ".prom":
+            path.write_text(json.dumps({"cmd": cmd, "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                                        "frames": frames, "wall_s": self.wall, "fps": fps, **meta,
+                                        "versions": versions, "stages": stages}, indent=2))
+            return path
+        labels = ",".join(f'{k}="{v}"' for k, v in {"cmd": cmd, **meta}.items())
+        name = "football_stage_latency_seconds"
+        lines = [f"# HELP {name} Per-frame latency of each pipeline stage.", f"# TYPE {name} summary"]
+        for stage, m in stages.items():
+            for q in ("0.5", "0.95", "0.99"):
+                ms = m[f"p{round(float(q) * 100)}_ms"]
+                lines.append(f'{name}{{{labels},stage="{stage}",quantile="{q}"}} {ms / 1e3:.6g}')
+            lines.append(f'{name}_sum{{{labels},stage="{stage}"}} {m["busy_s"]:.6g}')
+            lines.append(f'{name}_count{{{labels},stage="{stage}"}} {m["frames"]}')
+        lines += ["# HELP football_fps Frames per second over the whole run.", "# TYPE football_fps gauge",
+                  f"football_fps{{{labels}}} {fps:.6g}",
+                  "# HELP football_wall_seconds Wall time of the run.", "# TYPE football_wall_seconds gauge",
+                  f"football_wall_seconds{{{labels}}} {self.wall:.6g}"]
+        path.write_text("\n".join(lines) + "\n")
+        return path
+
+
+class AsyncWriter:
+    """Bounded background pool for image / label writes.
+
+    At most `max_pending` writes are queued; submitting more blocks the caller, so
+    memory stays bounded when the disk is the bottleneck. workers=0 writes inline.
+    JPEGs are encoded with OpenCV at `jpeg_quality` (95 = cv2's default).
+    With a StageTimer, the run time of every write is recorded as stage "bg_write".
+    """
+
+    def __init__(self, workers=4, max_pending=64, jpeg_quality=95, timer=None):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        self.jpeg_quality, self.errors, self.timer = jpeg_quality, [], timer
+        self.pool  = ThreadPoolExecutor(workers, thread_name_prefix="writer") if workers > 0 else None
+        self.slots = threading.BoundedSemaphore(max(1, max_pending))
+        self.lock, self.pending = threading.Lock(), 0
+
+    def submit(self, fn, *args):
+        if self.timer is not None:
+            fn, args = self._timed, (fn, *args)
+        if self.pool is None:
+            fn(*args); return
+        self.slots.acquire()
+        with self.lock: self.pending += 1
+        self.pool.submit(fn, *args).add_done_callback(self._done)
+
+    def _done(self, fut):
+        with self.lock: self.pending -= 1
+        self.slots.release()
+        if fut.exception(): self.errors.append(fut.exception())
+
+    def _timed(self, fn, *args):
+        from time import perf_counter
+        t0 = perf_counter()
+        fn(*args)
+        self.timer.add("bg_write", perf_counter() - t0)
+
+    def _imwrite(self, path, img):
+        import cv2
+        if callable(img): img = img()                     # e.g. Results.plot, drawn off the main thread
+        ext = Path(path).suffix.lower()
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality] if ext in (".jpg", ".jpeg") else []
+        ok, buf = cv2.imencode(ext, img, params)
+        if not ok: raise OSError(f"Could not encode {path}")
+        buf.tofile(str(path))
+
+    def imwrite(self, path, img):
+        """Queue an image write; `img` is an array or a zero-argument callable returning one."""
+        self.submit(self._imwrite, path, img)
+
+    def write_text(self, path, text):
+        self.submit(Path(path).write_text, text)
+
+    def copy(self, src, dst):
+        self.submit(shutil.copy, src, dst)
+
+    def close(self, tag="writer", raise_errors=True):
+        if self.pool is not None:
+            if self.pending: print(f"[{tag}] Flushing {self.pending} queued writes ...", flush=True)
+            self.pool.shutdown(wait=True)
+        if self.errors and raise_errors: raise self.errors[0]
+        if self.errors: print(f"[{tag}] {len(self.errors)} writes also failed, first: {self.errors[0]!r}")
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb):
+        self.close(raise_errors=exc is None)              # never mask the exception already propagating
+
+
+_DONE = object()
+
+
+def run_pipeline(frames, infer, write, depth=8, profile=False):
+    """Run decode → infer → write as three overlapping stages.
+
+    `frames` yields (i, frame) and is consumed on a decoder thread; infer(frame) runs
+    on the calling thread (it owns the model and tracker state); write(i, result)
+    runs on a writer thread. Stages are joined by queues of `depth` items, so a slow
+    stage blocks the ones feeding it, and each queue has a single consumer, so
+    frames reach write() in decode order. Returns a StageTimer; with profile=True
+    the infer stage is split into the model's r.speed stages plus the tracker.
+    """
+    import queue
+    import threading
+    from time import perf_counter
+    timer, stop, errors = StageTimer(), threading.Event(), []
+    decoded, inferred = queue.Queue(depth), queue.Queue(depth)
+
+    def put(q, item):
+        while not stop.is_set():
+            try: q.put(item, timeout=0.1); return
+            except queue.Full: pass
+
+    def get(q):
+        while True:
+            try: return q.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set(): return _DONE
+
+    def decode():
+        try:
+            it = iter(frames)
+            while not stop.is_set():
+                t0 = perf_counter()
+                item = next(it, _DONE)
+                if item is _DONE: break
+                timer.add("decode", perf_counter() - t0)
+                put(decoded, item)
+            put(decoded, _DONE)
+        except BaseException as e:
+            errors.append(e); stop.set()
+
+    def drain():
+        while (item := inferred.get()) is not _DONE:
+            if stop.is_set(): continue               # keep draining so infer never blocks
+            try:
+                t0 = perf_counter()
+                write(*item)
+                timer.add("write", perf_counter() - t0)
+            except BaseException as e:
+                errors.append(e); stop.set()
+
+    threads = [threading.Thread(target=decode, daemon=True), threading.Thread(target=drain, daemon=True)]
+    for t in threads: t.start()
+    t_start = perf_counter()
+    try:
+        while not stop.is_set() and (item := get(decoded)) is not _DONE:
+            i, frame = item
+            t0 = perf_counter()
+            result = infer(frame)
+            if profile: timer.add_result(result, perf_counter() - t0)
+            else:       timer.add("infer", perf_counter() - t0)
+            inferred.put((i, result))
+    except BaseException:
+        stop.set(); raise
+    finally:
+        inferred.put(_DONE)
+        for t in threads: t.join()
+    if errors: raise errors[0]
+    timer.wall = perf_counter() - t_start
+    return timer
+
+
+def run_serial(frames, infer, write, profile=False):
+    """run_pipeline() on one thread: same stages and StageTimer, no overlap."""
+    from time import perf_counter
+    timer = StageTimer()
+    t_start = perf_counter()
+    for i, frame in timer.timed(frames):
+        t0 = perf_counter()
+        result = infer(frame)
+        if profile: timer.add_result(result, perf_counter() - t0)
+        else:       timer.add("infer", perf_counter() - t0)
+        t0 = perf_counter()
+        write(i, result)
+        timer.add("write", perf_counter() - t0)
+    timer.wall = perf_counter() - t_start
+    return timer
+
+
+def profile_path(profile, video_in, cmd):
+    """--profile value -> output path (bare flag: runs/<stem>_<cmd>_profile.json)."""
+    return ROOT / "runs" / f"{Path(video_in).stem}_{cmd}_profile.json" if profile is True else Path(profile)
+
+
+# ── ROI inference ──────────────────────────────────────────────────────────────
+
+def roi_windows(boxes, shape, crop=640, margin=32):
+    """Cover xyxy `boxes` (grown by `margin`) with crop x crop windows inside a frame of `shape`.
+
+    Boxes are taken in the given order and merged first-fit into a window while their
+    union still fits, so earlier boxes get the earlier windows. Each window is then
+    centred on its cluster and shifted back inside the frame. Returns (x0, y0, x1, y1).
+    """
+    H, W = shape[:2]
+    cw, ch = min(crop, W), min(crop, H)
+    clusters = []
+    for x1, y1, x2, y2 in np.asarray(boxes, dtype=float).reshape(-1, 4).tolist():
+        e = [max(0.0, x1 - margin), max(0.0, y1 - margin), min(W, x2 + margin), min(H, y2 + margin)]
+        for c in clusters:
+            u = [min(c[0], e[0]), min(c[1], e[1]), max(c[2], e[2]), max(c[3], e[3])]
+            if u[2] - u[0] <= cw and u[3] - u[1] <= ch:
+                c[:] = u
+                break
+        else:
+            clusters.append(e)
+    windows = []
+    for x1, y1, x2, y2 in clusters:
+        x0 = int(min(max(0, round((x1 + x2 - cw) / 2)), W - cw))
+        y0 = int(min(max(0, round((y1 + y2 - ch) / 2)), H - ch))
+        if (win := (x0, y0, x0 + cw, y0 + ch)) not in windows:
+            windows.append(win)
+    return windows
+
+
+class RoiDetector:
+    """predict() for one frame from a cheap low-resolution pass plus full-resolution crops.
+
+    The whole frame runs at `coarse` imgsz; the ball (last frame's and any the coarse
+    pass sees) and then the player boxes are covered by windows from roi_windows(), which
+    run batched at native resolution (imgsz = `crop`). At most `max_crops` are run, and
+    never more pixels than half a full-frame pass at `imgsz` — past that there is no gain. Inside a
+    window the crop's boxes replace the coarse ones; everything is shifted back to frame
+    coordinates and merged with class-wise NMS, so the Results look like a full-frame
+    predict() with the same columns. Every `refresh` frames the frame runs whole at
+    `imgsz` instead, to pick up a ball the coarse pass and the crops both lost.
+    """
+
+    def __init__(self, model, conf=0.25, imgsz=1280, coarse=640, crop=320, refresh=30, max_crops=4,
+                 margin=32, iou=0.7, ball_class=1):
+        kw = run_args(model, imgsz)
+        self.model, self.conf, self.device = model, conf, kw["device"]
+        self.imgsz = kw["imgsz"]
+        fixed = getattr(model, "onnx_imgsz", 0)           # fixed-size ONNX export: every pass at that size
+        self.coarse, self.crop = (fixed, fixed) if fixed else (coarse, crop)
+        self.refresh, self.max_crops, self.margin, self.iou = refresh, max_crops, margin, iou
+        self.ball_class, self.ball, self.vel, self.lost = ball_class, np.zeros((0, 4)), np.zeros(2), 0
+        self.frames = self.crops = self.full = 0
+
+    def predict(self, source, imgsz, conf):
+        return self.model.predict(source, imgsz=imgsz, conf=conf, device=self.device, verbose=False)
+
+    def __call__(self, frame):
+        import torch
+        from torchvision.ops import batched_nms
+        from ultralytics.engine.results import Results
+        self.frames += 1
+        if self.refresh and (self.frames - 1) % self.refresh == 0:
+            self.full += 1
+            return self._remember(self.predict(frame, self.imgsz, self.conf)[0])
+
+        H, W = frame.shape[:2]
+        coarse = self.predict(frame, self.coarse, self.conf)[0]
+        d = coarse.boxes.data.cpu().numpy()
+        is_ball = d[:, 5] == self.ball_class
+        seeds = np.concatenate([self._ball_seed(), d[is_ball, :4], d[~is_ball, :4]])
+        budget  = int(self.imgsz ** 2 * min(H, W) / max(H, W) / 2 / min(self.crop, H, W) ** 2)
+        windows = roi_windows(seeds, frame.shape, self.crop, self.margin)[:max(1, min(self.max_crops, budget))]
+        parts, speed = [], dict(coarse.speed)
+        if windows:
+            self.crops += len(windows)
+            for (x0, y0, x1, y1), r in zip(windows, self.predict([frame[y0:y1, x0:x1] for x0, y0, x1, y1 in windows],
+                                                                 self.crop, self.conf)):
+                for k, ms in r.speed.items(): speed[k] = speed.get(k, 0) + (ms or 0)
+                c = r.boxes.data.cpu().numpy().copy()
+                c[:, [0, 2]] += x0; c[:, [1, 3]] += y0
+                cut = (((c[:, 0] <= x0 + 1) & (x0 > 0)) | ((c[:, 2] >= x1 - 1) & (x1 < W))
+                       | ((c[:, 1] <= y0 + 1) & (y0 > 0)) | ((c[:, 3] >= y1 - 1) & (y1 < H)))
+                parts.append(c[~cut])                      # truncated by the window edge
+                cx, cy = (d[:, 0] + d[:, 2]) / 2, (d[:, 1] + d[:, 3]) / 2
+                inside = ((cx > x0 + (x0 > 0) * self.margin) & (cx < x1 - (x1 < W) * self.margin)
+                          & (cy > y0 + (y0 > 0) * self.margin) & (cy < y1 - (y1 < H) * self.margin))
+                d = d[~inside]                             # the crop saw these at full resolution
+        d = torch.from_numpy(np.concatenate([d, *parts]).astype(np.float32))
+        d = d[batched_nms(d[:, :4], d[:, 4], d[:, 5].long(), self.iou)]
+        out = Results(frame, path=coarse.path, names=coarse.names, boxes=d)
+        out.speed = speed
+        return self._remember(out)
+
+    def _ball_seed(self):
+        """Last frame's ball boxes; the followed one (first) stretched along its motion to now."""
+        if not len(self.ball):
+            return self.ball
+        b, step = self.ball[:1], np.tile(self.vel * (self.lost + 1), 2)
+        b = np.concatenate([np.minimum(b, b + step)[:, :2], np.maximum(b, b + step)[:, 2:]], 1)
+        return np.concatenate([b, self.ball[1:]])
+
+    def _remember(self, r, hold=5):
+        d = r.boxes.data.cpu().numpy()
+        ball = d[d[:, 5] == self.ball_class]
+        if len(ball):
+            c = (ball[:, :2] + ball[:, 2:4]) / 2
+            if len(self.ball):                             # follow the candidate nearest the predicted position
+                last = (self.ball[0, :2] + self.ball[0, 2:]) / 2
+                k = np.linalg.norm(c - (last + self.vel * (self.lost + 1)), axis=1).argmin()
+                self.vel = (c[k] - last) / (self.lost + 1)
+            else:
+                k = ball[:, 4].argmax()
+            self.ball, self.lost = np.concatenate([ball[k:k + 1, :4], np.delete(ball[:, :4], k, 0)]), 0
+        elif len(self.ball):
+            self.lost += 1                                 # keep looking along its path for `hold` frames
+            if self.lost > hold:
+                self.ball, self.vel, self.lost = np.zeros((0, 4)), np.zeros(2), 0
+        return r
+
+    def report(self, tag):
+        if self.frames:
+            print(f"[{tag}] ROI: {self.crops / self.frames:.2f} crops/frame, "
+                  f"{self.full} full-frame refreshes in {self.frames:,} frames")
+
+
+class FrameTracker:
+    """ByteTrack over any frame -> Results detector: the same Results (with ids) that
+    model.track(persist=True) returns, for detectors model.track cannot wrap."""
+
+    def __init__(self, detector, tracker="bytetrack.yaml"):
+        from ultralytics.trackers.byte_tracker import BYTETracker
+        from ultralytics.utils import YAML, IterableSimpleNamespace
+        from ultralytics.utils.checks import check_yaml
+        self.detector = detector
+        self.tracker = BYTETracker(args=IterableSimpleNamespace(**YAML.load(check_yaml(tracker))))
+
+    def __call__(self, frame):
+        return self.update(self.detector(frame))
+
+    def update(self, r):
+        import torch
+        tracks = self.tracker.update(r.boxes.cpu().numpy(), r.orig_img)
+        if len(tracks) == 0:                               # hide new tracks until confirmed, as track() does
+            return r[:0] if any(not t.is_activated for t in self.tracker.tracked_stracks) else r
+        r = r[tracks[:, -1].astype(int)]
+        r.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return r
+
+    def report(self, tag):
+        if hasattr(self.detector, "report"): self.detector.report(tag)
+
+
+# ── Keyframe detection ─────────────────────────────────────────────────────────
+
+class KeyframeTracker(FrameTracker):
+    """FrameTracker that runs the detector only every `every` frames.
+
+    In between, each box of the previous frame is moved by the median Lucas-Kanade
+    flow of a 5x5 grid of points inside it (on a grey copy at most `flow_width` px
+    wide) and its confidence scaled by the share of points that track forward and
+    back consistently. Propagated frames go through the same ByteTrack, so ids carry
+    on, and come back with r.interpolated = True. A detection is forced early when
+    the propagated confidence falls below `min_ratio` of the last detection's.
+    """
+
+    def __init__(self, detector, every=5, min_ratio=0.9, flow_width=960, tracker="bytetrack.yaml"):
+        super().__init__(detector, tracker)
+        self.every, self.min_ratio, self.flow_width = every, min_ratio, flow_width
+        self.since, self.prev, self.raw, self.key_conf = every, None, None, 0.0
+        self.frames = self.keyframes = self.forced = 0
+
+    def _grey(self, frame):
+        import cv2
+        g = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if g.shape[1] > self.flow_width:
+            k = self.flow_width / g.shape[1]
+            g = cv2.resize(g, (self.flow_width, round(g.shape[0] * k)), interpolation=cv2.INTER_AREA)
+        return g
+
+    def _propagate(self, grey, d):
+        """Shift (n, 6) xyxy/conf/cls boxes from self.prev to `grey`; conf scaled by the tracked share.
+
+        Only grid points with a Shi-Tomasi corner response are tracked (flat kit or
+        grass has no flow to measure); a box with none left stays put at conf 0.
+        """
+        import cv2
+        k = grey.shape[1] / self.raw.orig_img.shape[1]
+        g = np.linspace(0.1, 0.9, 5)
+        grid = np.stack(np.meshgrid(g, g), -1).reshape(1, -1, 2)
+        pts = (d[:, None, :2] + grid * (d[:, None, 2:4] - d[:, None, :2])) * k
+        h, w = self.prev.shape
+        px = pts.round().astype(int).clip(0, (w - 1, h - 1))
+        eig = cv2.cornerMinEigenVal(self.prev, 5)
+        usable = eig[px[..., 1], px[..., 0]] > 1e-3 * eig.max()
+        good = np.zeros_like(usable)
+        flow = np.zeros(pts.shape)
+        if usable.any():
+            p0 = pts[usable].reshape(-1, 1, 2).astype(np.float32)
+            lk = dict(winSize=(15, 15), maxLevel=2)
+            p1, st1, _ = cv2.calcOpticalFlowPyrLK(self.prev, grey, p0, None, **lk)
+            pb, st2, _ = cv2.calcOpticalFlowPyrLK(grey, self.prev, p1, None, **lk)
+            good[usable] = ((st1 & st2).ravel() == 1) & (np.abs(pb - p0).reshape(-1, 2).max(1) < 1.0)
+            flow[usable] = (p1 - p0).reshape(-1, 2) / k
+        share = good.sum(1) / np.maximum(usable.sum(1), 1)
+        flow[share == 0], good[share == 0] = 0.0, True     # nothing tracked: box stays put, conf 0
+        flow[~good] = np.nan
+        out = d.copy()
+        out[:, :4] += np.tile(np.nanmedian(flow, axis=1), 2)
+        out[:, 4] *= share
+        return out
+
+    def __call__(self, frame):
+        import torch
+        from ultralytics.engine.results import Results
+        self.frames += 1
+        grey, raw = self._grey(frame), None
+        if self.since < self.every and self.raw is not None and len(self.raw.boxes):
+            moved = self._propagate(grey, self.raw.boxes.data.cpu().numpy())
+            if moved[:, 4].mean() >= self.min_ratio * self.key_conf:
+                moved = moved[moved[:, 4] > 0].astype(np.float32)
+                raw = Results(frame, path="", names=self.raw.names, boxes=torch.from_numpy(moved))
+            else:
+                self.forced += 1
+        if raw is None:                                    # keyframe: untracked detections, as predict() gives
+            raw, self.since = self.detector(frame), 0
+            self.keyframes += 1
+            self.key_conf = float(raw.boxes.conf.mean()) if len(raw.boxes) else 0.0
+        r = self.update(raw)
+        r.interpolated = self.since > 0
+        self.since += 1
+        self.prev, self.raw = grey, raw
+        return r
+
+    def report(self, tag):
+        super().report(tag)
+        if self.frames:
+            print(f"[{tag}] keyframes: {self.keyframes:,} of {self.frames:,} frames detected "
+                  f"({self.forced} forced by a confidence drop)")
+
+
+def frame_tracker(model, conf=0.25, imgsz=1280, roi=0, roi_crop=320, detect_every=1):
+    """frame -> tracked Results for the frame-at-a-time paths: plain model.track(), or
+    ByteTrack over RoiDetector (--roi) and / or keyframes + flow (--detect-every)."""
+    kw = run_args(model, imgsz)
+    if not roi and detect_every <= 1:
+        return lambda f: model.track(f, tracker="bytetrack.yaml", conf=conf, persist=True, verbose=False, **kw)[0]
+    detect = (RoiDetector(model, conf, imgsz, roi, roi_crop) if roi else
+              lambda f: model.predict(f, conf=conf, verbose=False, **kw)[0])
+    return KeyframeTracker(detect, detect_every) if detect_every > 1 else FrameTracker(detect)
+
+
 # ── Functions ──────────────────────────────────────────────────────────────────
 
-def prepare():
+def prepare(workers=1, full=False):
     """Filter COCO annotations → YOLO labels + football.yaml.
 
+    --workers N    write label files from N processes (output is identical to N=1)
+    --full         ignore data/prepare_manifest.json and rewrite every label
+
+    Re-runs are incremental: the manifest stores the class mapping and a content
+    hash per label, so only changed labels are rewritten and labels no longer
+    produced are deleted. A changed COCO_KEEP / CLASS_NAMES mapping forces a full
+    rebuild, which (like --full) deletes every .txt in the label dir it did not write.
+
     Dataset layout produced (standard Ultralytics structure so that
     Ultralytics' label auto-resolution works: swap \\images\\ for \\labels\\):
         Datasets/coco2017/
@@ -69,48 +1081,52 @@ def prepare():
             train.txt           <- filtered list (only images with person/ball)
             val.txt
             football.yaml
+            prepare_manifest.json
     """
+    import os
     images_root = COCO_ROOT / "images"
     labels_root = COCO_ROOT / "labels"
     yaml_path   = ROOT / "data" / "football.yaml"
+    manifest_path = ROOT / "data" / "prepare_manifest.json"
+
+    mapping  = {"coco_keep": {str(k): v for k, v in COCO_KEEP.items()},
+                "class_names": {str(k): v for k, v in CLASS_NAMES.items()}}
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() and not full else {}
+    if manifest and manifest.get("mapping") != mapping:
+        print("[prepare] Class mapping changed — full rebuild", flush=True)
+        manifest = {}
+    manifest = {"mapping": mapping, "splits": manifest.get("splits", {})}
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
 
     def build(ann_file, split, list_out):
         img_dir   = images_root / split
         label_dir = labels_root / split
         label_dir.mkdir(parents=True, exist_ok=True)
-        print(f"[prepare] Reading {ann_file.name} ...", flush=True)
-        data = json.loads(ann_file.read_text())
-        print(f"[prepare] Indexing {len(data['annotations']):,} annotations ...", flush=True)
-        img_info = {i["id"]: i for i in data["images"]}
-        by_image = defaultdict(list)
-        for ann in data["annotations"]:
-            if ann["category_id"] in COCO_KEEP and not ann.get("iscrowd", 0):
-                by_image[ann["image_id"]].append(ann)
-        print(f"[prepare] Writing labels for {len(by_image):,} images ...", flush=True)
-        paths, kept, skipped = [], 0, 0
-        for img_id, anns in tqdm(by_image.items(), desc=ann_file.stem):
-            info = img_info[img_id]
-            W, H = info["width"], info["height"]
-            img_path = img_dir / info["file_name"]
-            if not img_path.exists():
-                skipped += 1; continue
-            lines = []
-            for ann in anns:
-                cls = COCO_KEEP[ann["category_id"]]
-                x, y, w, h = ann["bbox"]
-                cx = max(0.0, min(1.0, (x + w/2) / W))
-                cy = max(0.0, min(1.0, (y + h/2) / H))
-                nw = max(0.0, min(1.0, w / W))
-                nh = max(0.0, min(1.0, h / H))
-                if nw > 0 and nh > 0:
-                    lines.append(f"{cls} {cx:.6f} {cy:.6f} {nw:.6f} {nh:.6f}")
-            if lines:
-                (label_dir / Path(info["file_name"]).stem).with_suffix(".txt").write_text("\n".join(lines))
-                paths.append(str(img_path)); kept += 1
-            else:
-                skipped += 1
+        prev_lbl = manifest["splits"].get(split, {}).get("labels")
+        print(f"[prepare] Streaming {ann_file.name} ({'incremental' if prev_lbl else 'full'}) ...", flush=True)
+        prev_lbl = prev_lbl or {}
+        img_info, by_image, n_anns = index_coco(ann_file)
+        print(f"[prepare] Indexed {n_anns:,} annotations", flush=True)
+        print(f"[prepare] Writing labels for {len(by_image):,} images ({workers} workers) ...", flush=True)
+        items = [(*img_info[img_id], anns, prev_lbl.get(Path(img_info[img_id][0]).stem))
+                 for img_id, anns in by_image.items()]
+        paths, kept, skipped, hashes, written = [], 0, 0, {}, 0
+        with tqdm(total=len(items), desc=ann_file.stem) as bar:
+            for p, k, s, h, n in _map_chunks(_write_label_chunk, items, workers, img_dir, label_dir):
+                paths += p; kept += k; skipped += s; hashes.update(h); written += n
+                bar.update(k + s)
+        if prev_lbl:
+            stale = [stem for stem in prev_lbl if stem not in hashes]
+        else:                                              # no manifest to go by: check the directory
+            stale = [e.name[:-4] for e in os.scandir(label_dir)
+                     if e.name.endswith(".txt") and e.name[:-4] not in hashes]
+        for stem in stale:
+            (label_dir / stem).with_suffix(".txt").unlink(missing_ok=True)
         list_out.write_text("\n".join(paths))
-        print(f"  {split}: {kept:,} kept, {skipped:,} skipped")
+        manifest["splits"][split] = {"labels": hashes}
+        manifest_path.write_text(json.dumps(manifest))
+        print(f"  {split}: {kept:,} kept, {skipped:,} skipped — {written:,} written, "
+              f"{kept - written:,} unchanged, {len(stale):,} stale removed")
 
     ann_dir = COCO_ROOT / "annotations"
     print("[prepare] Starting train split ...", flush=True)
@@ -124,6 +1140,7 @@ def prepare():
 
 
 def train(size="n", epochs=50, batch=-1, imgsz=1280, resume=False):
+    from ultralytics import YOLO
     model_name = f"yolo26{size}"
     if resume:
         last = best_weights(size).parent / "last.pt"
@@ -160,30 +1177,157 @@ def train(size="n", epochs=50, batch=-1, imgsz=1280, resume=False):
 def validate(size="n", imgsz=640):
     w = best_weights(size)
     print(f"[validate] Loading model {w.name} ...", flush=True)
+    from ultralytics import YOLO
     metrics = YOLO(str(w)).val(data=str(ROOT / "data" / "football.yaml"), imgsz=imgsz, device=get_device())
     print(f"mAP50: {metrics.box.map50:.4f}  mAP50-95: {metrics.box.map:.4f}")
     for i, ap in enumerate(metrics.box.ap50):
         print(f"  {CLASS_NAMES[i]}: {ap:.4f}")
 
 
-def export(size="n", imgsz=640):
+def export(size="n", imgsz=640, int8=False, calib=200, compare=False):
+    """Export best.pt to CoreML and ONNX.
+
+    --int8        also write best_int8.onnx, statically quantized (QDQ, per-channel
+                  INT8 Conv/MatMul weights) and calibrated on --calib images from data/val.txt
+    --compare     validate FP32 vs INT8 ONNX on data/football.yaml and print latency,
+                  size, mAP50 and per-class AP50 side by side
+    """
     w = best_weights(size)
     print(f"[export] Loading model {w.name} ...", flush=True)
+    from ultralytics import YOLO
     model = YOLO(str(w))
     print("[export] Exporting CoreML ...", flush=True)
     model.export(format="coreml", imgsz=imgsz, nms=True,  half=False)
     print("[export] Exporting ONNX ...", flush=True)
-    model.export(format="onnx",   imgsz=imgsz, opset=17,  simplify=True)
+    fp32 = Path(model.export(format="onnx", imgsz=imgsz, opset=17, simplify=True))
+    if int8:
+        print(f"[export] Quantizing INT8 (calibrating on {calib} val images) ...", flush=True)
+        q = quantize_int8(fp32, imgsz, calib)
+        print(f"[export] INT8 -> {q}", flush=True)
+        if compare:
+            compare_onnx({"FP32": fp32, "INT8": q}, imgsz)
     print("[export] Done.", flush=True)
 
 
-def track(video_in, size="n", conf=0.25, imgsz=1280):
+def letterbox_blob(img, size):
+    """BGR image -> 1x3xSxS float32 RGB blob, letterboxed like Ultralytics (pad 114, centred)."""
+    import cv2
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nh, nw = round(h * r), round(w * r)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out = np.full((size, size, 3), 114, np.uint8)
+    out[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(out[..., ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255
+
+
+def quantize_int8(fp32, imgsz, n_calib=200, seed=0):
+    """Static INT8 quantization of an exported ONNX model, calibrated on data/val.txt images."""
+    import random
+    import cv2
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    val_txt = ROOT / "data" / "val.txt"
+    if not val_txt.exists():
+        raise FileNotFoundError(f"{val_txt} not found — run prepare first")
+    val    = [p for p in val_txt.read_text().splitlines() if p]
+    sample = random.Random(seed).sample(val, min(n_calib, len(val)))
+    name   = onnx.load(str(fp32), load_external_data=False).graph.input[0].name
+
+    class ValImages(CalibrationDataReader):
+        def __init__(self):
+            self.it = ({name: letterbox_blob(im, imgsz)} for p in tqdm(sample, desc="calibrate")
+                       if (im := cv2.imread(p)) is not None)
+
+        def get_next(self):
+            return next(self.it, None)
+
+    out = fp32.with_name(f"{fp32.stem}_int8.onnx")
+    quantize_static(str(fp32), str(out), ValImages(),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    op_types_to_quantize=["Conv", "MatMul"])    # box decoding / top-k stay FP32
+    # keep the Ultralytics metadata (names, stride, imgsz, task) so YOLO() can load it
+    src, dst = onnx.load(str(fp32)), onnx.load(str(out))
+    del dst.metadata_props[:]
+    dst.metadata_props.extend(src.metadata_props)
+    onnx.save(dst, str(out))
+    return out
+
+
+def compare_onnx(models, imgsz, runs=50):
+    """Print latency / size / mAP50 / per-class AP50 for {label: onnx_path} on the val split."""
+    from time import perf_counter
+    from ultralytics import YOLO
+    data, rows = str(ROOT / "data" / "football.yaml"), {}
+    for tag, path in models.items():
+        sess = _ort_session(path)
+        x = np.random.default_rng(0).random((1, 3, imgsz, imgsz), dtype=np.float32)
+        feed = {sess.get_inputs()[0].name: x}
+        for _ in range(5): sess.run(None, feed)
+        t0 = perf_counter()
+        for _ in range(runs): sess.run(None, feed)
+        ms = (perf_counter() - t0) / runs * 1e3
+        print(f"[export] Validating {tag} ({path.name}) ...", flush=True)
+        m = YOLO(str(path), task="detect").val(data=data, imgsz=imgsz, device="cpu", verbose=False, plots=False)
+        rows[tag] = [ms, path.stat().st_size / 1e6, m.box.map50, *m.box.ap50]
+    names = [CLASS_NAMES[i] for i in sorted(CLASS_NAMES)]
+    print(f"\n{'':<6}{'ms/img':>9}{'MB':>8}{'mAP50':>8}" + "".join(f"{n:>13}" for n in names))
+    for tag, (ms, mb, map50, *aps) in rows.items():
+        print(f"{tag:<6}{ms:9.1f}{mb:8.1f}{map50:8.4f}" + "".join(f"{ap:13.4f}" for ap in aps))
+    if len(rows) == 2:
+        (_, a), (_, b) = rows.items()
+        print(f"{'Δ':<6}{a[0] / b[0]:8.2f}x{a[1] / b[1]:7.2f}x{b[2] - a[2]:+8.4f}"
+              + "".join(f"{y - x:+13.4f}" for x, y in zip(a[3:], b[3:])))
+
+
+def track(video_in, size="n", conf=0.25, imgsz=1280, pipeline=False, depth=8, backend="pt", threads=None,
+          profile=None, roi=0, roi_crop=320):
+    """Track a video with ByteTrack and save the annotated copy to runs/.
+
+    --pipeline      decode, infer+track and encode on separate threads (prints per-stage times)
+    --backend onnx  run the exported best.onnx on ONNX Runtime (CPU, --threads intra-op threads)
+    --profile [P]   per-stage p50/p95/p99 + fps, dumped to P (.json, or .prom for Prometheus text)
+    --roi [N]       find players / ball at imgsz N, then infer only --roi-crop crops around them
+    """
     video_in = Path(video_in)
     video_out = ROOT / "runs" / f"{video_in.stem}_tracked.mp4"
     print(f"[track] Loading model ...", flush=True)
-    YOLO(str(best_weights(size))).track(
+    model = load_model(size, backend, threads)
+    reset_trackers(model)
+    kw = run_args(model, imgsz)
+    if pipeline or profile or roi:
+        import cv2
+        writer = None
+
+        def write(i, r):
+            nonlocal writer
+            frame = r.plot()
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(str(video_out), cv2.VideoWriter_fourcc(*"mp4v"), video_fps(video_in), (w, h))
+            writer.write(frame)
+
+        video_out.parent.mkdir(parents=True, exist_ok=True)
+        infer = frame_tracker(model, conf, imgsz, roi, roi_crop)
+        try:
+            if pipeline: timer = run_pipeline(VideoFrames(video_in), infer, write, depth, profile=bool(profile))
+            else:        timer = run_serial(VideoFrames(video_in), infer, write, profile=bool(profile))
+        finally:
+            if writer is not None: writer.release()
+        frames = len(timer.samples["decode"])
+        timer.report("track", frames)
+        if roi: infer.report("track")
+        if profile:
+            out = timer.dump(profile_path(profile, video_in, "track"), "track", frames, backend=backend,
+                             imgsz=kw["imgsz"], pipeline=pipeline, roi=roi)
+            print(f"[track] Profile -> {out}")
+        print(f"Saved -> {video_out}")
+        return video_out
+    model.track(
         source=str(video_in), tracker="bytetrack.yaml",
-        conf=conf, imgsz=imgsz, device=get_device(),
+        conf=conf, **kw,
         persist=True, save=True,
         project=str(ROOT / "runs"), name="tracking", exist_ok=True,
     )
@@ -191,64 +1335,363 @@ def track(video_in, size="n", conf=0.25, imgsz=1280):
     if tracked:
         shutil.copy(tracked[0], video_out)
         print(f"Saved -> {video_out}")
+        return video_out
 
 
-def extract_csv(video_in, size="n", conf=0.25, imgsz=1280):
+def extract_csv(video_in, size="n", conf=0.25, imgsz=1280, fmt="csv", pipeline=False, depth=8,
+                backend="pt", threads=None, profile=None, roi=0, roi_crop=320, detect_every=1):
+    """Track a video and write one row per detection to runs/<stem>_detections.<fmt>.
+
+    --pipeline      decode, infer+track and write on separate threads (prints per-stage times)
+    --backend onnx  run the exported best.onnx on ONNX Runtime (CPU, --threads intra-op threads)
+    --profile [P]   per-stage p50/p95/p99 + fps, dumped to P (.json, or .prom for Prometheus text)
+    --roi [N]       find players / ball at imgsz N, then infer only --roi-crop crops around them
+    --detect-every K  detect on every Kth frame, optical flow in between (adds an `interpolated` column)
+    """
     video_in = Path(video_in)
-    csv_out  = ROOT / "runs" / f"{video_in.stem}_detections.csv"
+    csv_out  = ROOT / "runs" / f"{video_in.stem}_detections{DETECTION_FORMATS[fmt]}"
     csv_out.parent.mkdir(parents=True, exist_ok=True)
     print(f"[csv] Loading model ...", flush=True)
-    model = YOLO(str(best_weights(size)))
-    with open(csv_out, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["frame", "track_id", "class", "conf", "x1", "y1", "x2", "y2", "cx", "cy"])
-        for i, r in enumerate(model.track(source=str(video_in), tracker="bytetrack.yaml",
-                                           conf=conf, imgsz=imgsz, device=get_device(),
-                                           persist=True, stream=True, verbose=False)):
-            if not r.boxes: continue
-            for box in r.boxes:
-                cls = int(box.cls.item())
-                x1, y1, x2, y2 = [round(v, 1) for v in box.xyxy[0].tolist()]
-                w.writerow([i, int(box.id.item()) if box.id is not None else -1,
-                             CLASS_NAMES[cls], round(float(box.conf.item()), 4),
-                             x1, y1, x2, y2, round((x1+x2)/2, 1), round((y1+y2)/2, 1)])
+    model = load_model(size, backend, threads)
+    reset_trackers(model)
+    kw = run_args(model, imgsz)
+    part = csv_out.with_name(csv_out.name + ".part")     # renamed on success, so a finished file is complete
+    keyframes = detect_every > 1
+    with DetectionWriter(part, fmt, interpolated=keyframes) as w:
+        def write(i, r):
+            if not r.boxes: return
+            cols = detection_columns(i, r.boxes)
+            if keyframes: cols["interpolated"] = np.full(len(r.boxes), r.interpolated, dtype=np.int8)
+            w.write(cols)
             if i % 100 == 0: print(f"  frame {i:,}")
+
+        infer = frame_tracker(model, conf, imgsz, roi, roi_crop, detect_every)
+        timer = None
+        if pipeline: timer = run_pipeline(VideoFrames(video_in), infer, write, depth, profile=bool(profile))
+        elif profile or roi or keyframes:
+            timer = run_serial(VideoFrames(video_in), infer, write, profile=bool(profile))
+        else:
+            for i, r in enumerate(model.track(source=str(video_in), tracker="bytetrack.yaml",
+                                               conf=conf, **kw, persist=True, stream=True, verbose=False)):
+                write(i, r)
+    part.replace(csv_out)
+    if timer is not None:
+        frames = len(timer.samples["decode"])
+        timer.report("csv", frames)
+        if roi or keyframes: infer.report("csv")
+        if profile:
+            out = timer.dump(profile_path(profile, video_in, "csv"), "csv", frames, backend=backend,
+                             imgsz=kw["imgsz"], pipeline=pipeline, format=fmt, roi=roi, detect_every=detect_every)
+            print(f"[csv] Profile -> {out}")
     print(f"Saved -> {csv_out}")
+    return csv_out
+
+
+VIDEO_EXTS = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".mpg", ".mpeg", ".wmv"}
+
+
+def find_videos(source):
+    """Videos in a directory (sorted), matching a glob pattern, or None for a single file.
+
+    An existing path is never read as a pattern, so "match [HD].mp4" stays one video.
+    """
+    if Path(source).is_file():
+        return None
+    if Path(source).is_dir():
+        return sorted(p for p in Path(source).iterdir() if p.suffix.lower() in VIDEO_EXTS)
+    if glob.has_magic(str(source)):
+        return sorted(Path(p) for p in glob.glob(str(source), recursive=True) if Path(p).suffix.lower() in VIDEO_EXTS)
+    return None
+
+
+@contextlib.contextmanager
+def spawn_env(threads):
+    """Cap OpenMP / BLAS threads in os.environ while worker processes are spawned.
+
+    Those libraries read the caps once, when numpy / torch are first imported, which a
+    spawned worker does while re-importing this module — before any initializer runs.
+    Processes started inside the block inherit the caps; the parent's values are restored.
+    """
+    import os
+    caps  = {var: str(threads) for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")}
+    saved = {var: os.environ.get(var) for var in caps}
+    os.environ.update(caps)
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None: os.environ.pop(var, None)
+            else:             os.environ[var] = value
+
+
+def _csv_worker_init(size, backend, threads):
+    """Pool initializer: pin torch / decode threads, then load the model once per worker
+    (OpenMP / BLAS caps come from spawn_env())."""
+    import cv2
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    load_model(size, backend, threads)
+
+
+def _csv_worker_run(video, size, conf, imgsz, fmt, backend, threads, roi=0, roi_crop=320, detect_every=1):
+    import contextlib
+    import io
+    from time import perf_counter
+    t0 = perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):    # per-frame progress would interleave across workers
+        out = extract_csv(video, size, conf, imgsz, fmt, backend=backend, threads=threads, roi=roi, roi_crop=roi_crop,
+                          detect_every=detect_every)
+    return str(video), str(out), video_frame_count(video), perf_counter() - t0
+
+
+def extract_csv_batch(videos, size="n", conf=0.25, imgsz=1280, fmt="csv", jobs=1, backend="pt", threads=None,
+                      roi=0, roi_crop=320, detect_every=1):
+    """Run extract_csv() over many videos in `jobs` worker processes, one resident model each.
+
+    Threads per worker default to cores / jobs so the pool never oversubscribes the CPU.
+    Videos whose runs/<stem>_detections.<fmt> already exists are skipped (outputs are
+    written as .part and renamed when complete), so an interrupted batch can be re-run.
+    Two videos with the same file name (e.g. from different folders) are refused up front,
+    since both would map to one output.
+    """
+    import multiprocessing as mp
+    import os
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from time import perf_counter
+
+    outputs = {v: ROOT / "runs" / f"{v.stem}_detections{DETECTION_FORMATS[fmt]}" for v in videos}
+    by_out = defaultdict(list)
+    for v, out in outputs.items(): by_out[out].append(v)
+    clashes = [vs for vs in by_out.values() if len(vs) > 1]
+    if clashes:                                          # would write (and later skip) the same output
+        raise ValueError("Videos share an output name: " +
+                         "; ".join(" / ".join(str(v) for v in vs) for vs in clashes) + " — rename them")
+    todo = [v for v in videos if not outputs[v].exists()]
+    print(f"[csv] {len(videos)} videos: {len(videos) - len(todo)} already done, {len(todo)} to process", flush=True)
+    if not todo:
+        return
+    todo.sort(key=lambda v: v.stat().st_size, reverse=True)      # longest first → better load balance
+    jobs    = max(1, min(jobs, len(todo)))
+    threads = threads or max(1, (os.cpu_count() or 1) // jobs)
+    print(f"[csv] {jobs} worker(s) x {threads} threads ...", flush=True)
+    t0, frames, busy, failed = perf_counter(), 0, 0.0, []
+    with spawn_env(threads), ProcessPoolExecutor(jobs, mp_context=mp.get_context("spawn"),
+                                                 initializer=_csv_worker_init,
+                                                 initargs=(size, backend, threads)) as pool:
+        futures = {pool.submit(_csv_worker_run, v, size, conf, imgsz, fmt, backend, threads, roi, roi_crop,
+                               detect_every): v for v in todo}
+        for k, fut in enumerate(as_completed(futures), 1):
+            try:
+                video, out, n, dt = fut.result()
+            except Exception as e:
+                failed.append(futures[fut]); print(f"  [{k}/{len(todo)}] {futures[fut].name} failed — {e}"); continue
+            frames, busy = frames + n, busy + dt
+            print(f"  [{k}/{len(todo)}] {Path(video).name}: {n:,} frames in {dt:.1f} s ({n / dt:.1f} fps) -> {out}")
+    wall = perf_counter() - t0
+    print(f"[csv] Done: {len(todo) - len(failed)} videos, {frames:,} frames in {wall:.1f} s — "
+          f"{frames / wall:.1f} fps aggregate, {frames / max(busy, 1e-9):.1f} fps per worker")
+    if failed:
+        print(f"  {len(failed)} failed — re-run to retry them")
+
+
+def _segment_worker_run(video, start, stop, size, conf, imgsz, backend, threads, roi=0, roi_crop=320):
+    """Track frames [start, stop) of one video from a fresh tracker -> detection_columns arrays."""
+    model = load_model(size, backend, threads)
+    reset_trackers(model)
+    infer, parts = frame_tracker(model, conf, imgsz, roi, roi_crop), []
+    for i, frame in VideoFrames(video, start=start, stop=stop):
+        r = infer(frame)
+        if r.boxes: parts.append(detection_columns(i, r.boxes))
+    if not parts:
+        return {k: np.empty(0) for k in CSV_COLUMNS}
+    return {k: np.concatenate([c[k] for c in parts]) for k in CSV_COLUMNS}
+
+
+def box_iou(a, b):
+    """Pairwise IoU of (n, 4) and (m, 4) xyxy boxes -> (n, m)."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area = lambda x: (x[:, 2] - x[:, 0]) * (x[:, 3] - x[:, 1])
+    return inter / np.maximum(area(a)[:, None] + area(b)[None, :] - inter, 1e-9)
+
+
+def _frame_slices(cols):
+    """frame index -> slice of its rows (rows are in frame order)."""
+    frames, starts = np.unique(cols["frame"], return_index=True)
+    ends = np.append(starts[1:], len(cols["frame"]))
+    return {int(f): slice(s, e) for f, s, e in zip(frames, starts, ends)}
+
+
+def match_tracks(prev, cur, frames, min_iou=0.5):
+    """Map track ids of `cur` onto ids of `prev` using the frames both segments tracked.
+
+    Boxes of the same class are paired greedily by IoU in every shared frame; each
+    cur id then takes the prev id it was paired with most often (one-to-one).
+    """
+    votes = defaultdict(int)
+    ps, cs = _frame_slices(prev), _frame_slices(cur)
+    xyxy = lambda c, sl: np.stack([c[k][sl] for k in ("x1", "y1", "x2", "y2")], 1)
+    for f in frames:
+        if f not in ps or f not in cs: continue
+        p, c = ps[f], cs[f]
+        iou = box_iou(xyxy(prev, p), xyxy(cur, c))
+        iou[prev["class"][p][:, None] != cur["class"][c][None, :]] = 0
+        iou[prev["track_id"][p] < 0] = 0
+        iou[:, cur["track_id"][c] < 0] = 0
+        pairs = np.argwhere(iou >= min_iou)
+        taken_p, taken_c = set(), set()
+        for pi, ci in pairs[np.argsort(-iou[pairs[:, 0], pairs[:, 1]], kind="stable")]:
+            if pi in taken_p or ci in taken_c: continue    # each box pairs at most once per frame
+            taken_p.add(pi); taken_c.add(ci)
+            votes[int(cur["track_id"][c][ci]), int(prev["track_id"][p][pi])] += 1
+    mapping, used = {}, set()
+    for (cid, pid), _ in sorted(votes.items(), key=lambda kv: -kv[1]):
+        if cid not in mapping and pid not in used:
+            mapping[cid] = pid; used.add(pid)
+    return mapping
+
+
+def remap_ids(ids, mapping):
+    """Vectorized mapping.get(id, -1) over an int array."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if not mapping or not len(ids):
+        return np.full(len(ids), -1, dtype=np.int64)
+    keys = np.array(sorted(mapping), dtype=np.int64)
+    vals = np.array([mapping[k] for k in keys], dtype=np.int64)
+    pos  = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+    return np.where(keys[pos] == ids, vals[pos], -1)
+
+
+def stitch_segments(segments, bounds, overlap):
+    """Join per-segment detections into one table with globally consistent track ids.
+
+    Segment k covers [bounds[k] - overlap, bounds[k+1]); its first `overlap` frames only
+    warm up the tracker and are used to match its ids to segment k-1, then dropped.
+    Returns (cols, report) — report has one (matched, lost) pair per cut, where `lost`
+    counts tracks alive at the cut that were not continued (likely ID switches).
+    """
+    out, report = [], []
+    prev, prev_map, next_id = None, {}, 1
+    for k, cols in enumerate(segments):
+        lo = bounds[k]
+        keep = cols["frame"] >= lo
+        ids = cols["track_id"]
+        mapping = {}
+        if prev is not None:
+            matched = match_tracks(prev, cols, range(lo - overlap, lo))
+            mapping = {cid: prev_map[pid] for cid, pid in matched.items() if pid in prev_map}
+            alive = set(prev["track_id"][prev["frame"] == lo - 1].tolist()) - {-1}
+            report.append((len(mapping), len(alive - set(matched.values()))))
+        for cid in dict.fromkeys(ids[keep & (ids >= 0)].tolist()):    # first-appearance order
+            if cid not in mapping:
+                mapping[cid] = next_id; next_id += 1
+        seg = {c: v[keep] for c, v in cols.items()}
+        seg["track_id"] = remap_ids(seg["track_id"], mapping)
+        out.append(seg)
+        prev, prev_map = cols, mapping
+    return {c: np.concatenate([s[c] for s in out]) for c in CSV_COLUMNS}, report
+
+
+def extract_csv_segments(video_in, size="n", conf=0.25, imgsz=1280, fmt="csv", segments=4, overlap=30,
+                         backend="pt", threads=None, roi=0, roi_crop=320):
+    """extract_csv() for one long video, split into `segments` time ranges tracked in parallel.
+
+    Each segment runs in its own worker process / model and starts `overlap` frames early;
+    tracks in those shared frames are matched by IoU so ids continue across every cut.
+    Output is the same runs/<stem>_detections.<fmt> table with global frame indices.
+    """
+    import multiprocessing as mp
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from time import perf_counter
+
+    video_in = Path(video_in)
+    csv_out  = ROOT / "runs" / f"{video_in.stem}_detections{DETECTION_FORMATS[fmt]}"
+    csv_out.parent.mkdir(parents=True, exist_ok=True)
+    n = video_frame_count(video_in)                    # container estimate: the last segment reads to EOF
+    if n < 1:
+        raise ValueError(f"Cannot read a frame count for {video_in} — run it without --segments")
+    segments = max(1, min(segments, n // max(1, overlap)))
+    bounds   = np.linspace(0, n, segments + 1).astype(int).tolist()
+    threads  = threads or max(1, (os.cpu_count() or 1) // segments)
+    print(f"[csv] {n:,} frames -> {segments} segments (overlap {overlap}), {segments} workers x {threads} threads ...",
+          flush=True)
+    t0 = perf_counter()
+    with spawn_env(threads), ProcessPoolExecutor(segments, mp_context=mp.get_context("spawn"),
+                                                 initializer=_csv_worker_init,
+                                                 initargs=(size, backend, threads)) as pool:
+        parts = list(pool.map(_segment_worker_run,
+                              [video_in] * segments,
+                              [max(0, b - overlap) for b in bounds[:-1]], bounds[1:-1] + [None],
+                              [size] * segments, [conf] * segments, [imgsz] * segments,
+                              [backend] * segments, [threads] * segments,
+                              [roi] * segments, [roi_crop] * segments))
+    cols, report = stitch_segments(parts, bounds, overlap)
+    if len(cols["frame"]): n = max(n, int(cols["frame"].max()) + 1)
+    part = csv_out.with_name(csv_out.name + ".part")
+    with DetectionWriter(part, fmt) as w:
+        if len(cols["frame"]): w.write(cols)
+    part.replace(csv_out)
+    wall = perf_counter() - t0
+    for k, (matched, lost) in enumerate(report, 1):
+        print(f"  cut @ frame {bounds[k]:,}: {matched} tracks continued, {lost} lost")
+    print(f"[csv] {n:,} frames in {wall:.1f} s ({n / wall:.1f} fps), "
+          f"{sum(lost for _, lost in report)} boundary ID switches")
+    print(f"Saved -> {csv_out}")
+    return csv_out
+
 
+def label(images_dir, size="n", conf=0.25, imgsz=1280, batch_size=1, writers=4, jpeg_quality=95,
+          backend="pt", threads=None):
+    """Auto-label a folder of images into data/labeled/ (images/, preview/, labels/).
 
-def label(images_dir, size="n", conf=0.25, imgsz=1280):
+    --backend onnx      run the exported best.onnx on ONNX Runtime (CPU)
+    --batch-size N      run N images per forward pass (same-sized images only)
+    --writers N         background threads for copies / previews / labels (0 = inline)
+    --jpeg-quality Q    JPEG quality of the preview images (default 95)
+    """
     images_dir = Path(images_dir)
     out = ROOT / "data" / "labeled"
     (out / "images").mkdir(parents=True, exist_ok=True)    # clean originals → for Roboflow
     (out / "preview").mkdir(parents=True, exist_ok=True)   # annotated copies → for visual review
     (out / "labels").mkdir(parents=True, exist_ok=True)
     print(f"[label] Loading model ...", flush=True)
-    model = YOLO(str(best_weights(size)))
+    model = load_model(size, backend, threads)
     print(f"[label] Running predictions on {images_dir} ...", flush=True)
     saved = empty = 0
-    for r in model.predict(source=str(images_dir), conf=conf, imgsz=imgsz,
-                            device=get_device(), stream=True):
-        p = Path(r.path)
-        shutil.copy(p, out / "images" / p.name)                    # original, no boxes
-        r.save(filename=str(out / "preview" / p.name))             # boxes drawn on for review
-        if not r.boxes or len(r.boxes) == 0:
-            empty += 1; continue
-        lines = [f"{int(b.cls.item())} {' '.join(f'{v:.6f}' for v in b.xywhn[0].tolist())}"
-                 for b in r.boxes]
-        (out / "labels" / p.stem).with_suffix(".txt").write_text("\n".join(lines))
-        saved += 1
+    with AsyncWriter(writers, jpeg_quality=jpeg_quality) as writer:
+        for p, r in predict_batched(model, iter_images(images_dir), batch_size,
+                                    conf=conf, **run_args(model, imgsz)):
+            writer.copy(p, out / "images" / p.name)                       # original, no boxes
+            writer.imwrite(out / "preview" / p.name, r.plot)              # boxes drawn on for review
+            if not r.boxes or len(r.boxes) == 0:
+                empty += 1; continue
+            lines = [f"{int(b.cls.item())} {' '.join(f'{v:.6f}' for v in b.xywhn[0].tolist())}"
+                     for b in r.boxes]
+            writer.write_text((out / "labels" / p.stem).with_suffix(".txt"), "\n".join(lines))
+            saved += 1
     print(f"Labeled: {saved}  |  Empty: {empty}  ->  {out}")
     print(f"  images/  <- clean originals (use these for Roboflow)")
     print(f"  preview/ <- annotated copies (use these to visually review)")
+    return out
 
 
-def label_video(video_in, size="n", conf=0.25, imgsz=1280, every=1, preview_pct=5):
+def label_video(video_in, size="n", conf=0.25, imgsz=1280, every=1, preview_pct=5, batch_size=1,
+                writers=4, jpeg_quality=95, backend="pt", threads=None, profile=None, roi=0, roi_crop=320):
     """Extract frames from a video, auto-label each one, and save to data/labeled/.
 
     --every N          keep every Nth frame (default 1 = all frames)
     --preview-pct N    save annotated preview for N% of kept frames (default 5)
+    --batch-size N     run N frames per forward pass (default 1)
+    --writers N        background threads for JPEG encoding / label writes (0 = inline)
+    --jpeg-quality Q   JPEG quality of images/ and preview/ (default 95)
+    --backend onnx     run the exported best.onnx on ONNX Runtime (CPU)
+    --profile [P]      per-stage p50/p95/p99 + fps, dumped to P (.json, or .prom for Prometheus text)
+    --roi [N]          find players / ball at imgsz N, then infer only --roi-crop crops (one frame at a time)
     """
-    import cv2
+    from time import perf_counter
     video_in = Path(video_in)
     out = ROOT / "data" / "labeled"
     (out / "images").mkdir(parents=True, exist_ok=True)
@@ -257,79 +1700,529 @@ def label_video(video_in, size="n", conf=0.25, imgsz=1280, every=1, preview_pct=
 
     preview_every = max(1, round(100 / preview_pct))
     print(f"[label-video] Loading model ...", flush=True)
-    model = YOLO(str(best_weights(size)))
+    model = load_model(size, backend, threads)
     print(f"[label-video] Processing {video_in.name} (every={every}, preview={preview_pct}%) ...", flush=True)
-    saved = empty = skipped = kept = 0
-    for i, r in enumerate(model.predict(source=str(video_in), imgsz=imgsz, conf=conf,
-                                         device=get_device(), stream=True, verbose=False)):
-        if i % every != 0:
-            skipped += 1; continue
-        stem = f"{video_in.stem}_{i:06d}"
-        cv2.imwrite(str(out / "images" / f"{stem}.jpg"), r.orig_img)
-        if kept % preview_every == 0:
-            r.save(filename=str(out / "preview" / f"{stem}.jpg"))
-        kept += 1
-        if not r.boxes or len(r.boxes) == 0:
-            empty += 1; continue
-        lines = [f"{int(b.cls.item())} {' '.join(f'{v:.6f}' for v in b.xywhn[0].tolist())}"
-                 for b in r.boxes]
-        (out / "labels" / stem).with_suffix(".txt").write_text("\n".join(lines))
-        saved += 1
-        if saved % 100 == 0:
-            print(f"  {i:,} frames processed — {saved} labeled, {empty} empty")
+    saved = empty = kept = 0
+    frames = VideoFrames(video_in, every)             # skipped frames are never decoded or inferred
+    timer, t_start = (StageTimer() if profile else None), perf_counter()
+    items = timer.timed(frames) if timer else frames
+    if roi:
+        detector = RoiDetector(model, conf, imgsz, roi, roi_crop)
+        results = ((i, detector(f)) for i, f in items)
+    else:
+        results = predict_batched(model, items, batch_size, conf=conf, verbose=False, **run_args(model, imgsz))
+    with AsyncWriter(writers, jpeg_quality=jpeg_quality, timer=timer) as writer:
+        for i, r in results:
+            t0 = perf_counter()
+            try:
+                stem = f"{video_in.stem}_{i:06d}"
+                writer.imwrite(out / "images" / f"{stem}.jpg", r.orig_img)
+                if kept % preview_every == 0:
+                    writer.imwrite(out / "preview" / f"{stem}.jpg", r.plot)
+                kept += 1
+                if not r.boxes or len(r.boxes) == 0:
+                    empty += 1; continue
+                lines = [f"{int(b.cls.item())} {' '.join(f'{v:.6f}' for v in b.xywhn[0].tolist())}"
+                         for b in r.boxes]
+                writer.write_text((out / "labels" / stem).with_suffix(".txt"), "\n".join(lines))
+                saved += 1
+                if saved % 100 == 0:
+                    print(f"  {i:,} frames processed — {saved} labeled, {empty} empty, {writer.pending} writes queued")
+            finally:
+                if timer:                                  # model stages from r.speed; write = queueing cost
+                    timer.add_result(r); timer.add("write", perf_counter() - t0)
+    skipped = frames.total - kept
     print(f"[label-video] Done: {saved} labeled, {empty} empty, {skipped} skipped")
     print(f"  preview/ contains ~{round(kept * preview_pct / 100)} of {kept} frames")
+    if roi: detector.report("label-video")
+    if timer:
+        timer.wall = perf_counter() - t_start
+        timer.report("label-video", kept)
+        path = timer.dump(profile_path(profile, video_in, "label-video"), "label-video", kept, backend=backend,
+                          imgsz=run_args(model, imgsz)["imgsz"], batch_size=batch_size, writers=writers, roi=roi)
+        print(f"[label-video] Profile -> {path}")
+    return out
 
 
-def stats(csv_path):
-    import pandas as pd
-    import matplotlib.pyplot as plt
-
-    df = pd.read_csv(csv_path)
-    total_frames  = df["frame"].nunique()
-    frames_w_ball = int((df["class"] == "sports_ball").groupby(df["frame"]).any().sum())
+def stats(csv_path, chunk_rows=0):
+    """Summarise an extract_csv() output (.csv, .parquet or .arrow).
 
-    print(f"\nDetections  : {len(df):,}")
-    print(f"Frames      : {total_frames:,}")
-    print(f"Mean conf   : {df['conf'].mean():.4f}")
-    print(f"Track IDs   : {df['track_id'].nunique()}")
-    print(f"Ball in frame: {frames_w_ball/total_frames*100:.1f}%")
-    for cls, n in df["class"].value_counts().items():
-        print(f"  {cls}: {n:,}")
+    --chunk-rows N   stream the file N rows at a time (two passes, memory bounded by the
+                     number of frames rather than detections) — for season-sized files
+    """
+    cols = ["frame", "track_id", "class", "conf"]
+    s = (stats_summary_chunked(csv_path, chunk_rows) if chunk_rows
+         else stats_summary(read_detections(csv_path, cols)))
+    print(f"\nDetections  : {s['detections']:,}")
+    print(f"Frames      : {s['frames']:,}")
+    print(f"Mean conf   : {s['mean_conf']:.4f}")
+    print(f"Track IDs   : {s['track_ids']}")
+    print(f"Ball in frame: {s['frames_w_ball']/s['frames']*100:.1f}%")
+    for cls, n in s["class_counts"].items():
+        if n: print(f"  {cls}: {n:,}")
 
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(1, 3, figsize=(16, 4))
     for ax, name in zip(axes[:2], CLASS_NAMES.values()):
-        ax.hist(df[df["class"] == name]["conf"], bins=20, edgecolor="white")
+        counts, edges = s["hist"][name]
+        ax.hist(edges[:-1], edges, weights=counts, edgecolor="white")
         ax.set_title(f"{name} confidence"); ax.set_xlim(0, 1)
-    per_frame = df.groupby(["frame", "class"]).size().unstack(fill_value=0)
-    for col in per_frame.columns:
-        axes[2].plot(per_frame.index, per_frame[col], label=col, linewidth=0.8)
+    index, per_frame = s["per_frame"]
+    for col, counts in per_frame.items():
+        axes[2].plot(index, counts, label=col, linewidth=0.8)
     axes[2].set_title("Detections per frame"); axes[2].legend()
     plt.tight_layout(); plt.savefig(Path(csv_path).parent / "stats.png", dpi=150)
     print(f"Plot saved -> {Path(csv_path).parent / 'stats.png'}")
 
 
-def collect_used_images():
+def stats_summary(df):
+    """stats() numbers for a whole detections DataFrame held in memory."""
+    total_frames = df["frame"].nunique()
+    per_frame = df.groupby(["frame", "class"], observed=True).size().unstack(fill_value=0)
+    return {
+        "detections":    len(df),
+        "frames":        total_frames,
+        "frames_w_ball": int((df["class"] == "sports_ball").groupby(df["frame"]).any().sum()),
+        "mean_conf":     df["conf"].mean(),
+        "track_ids":     df["track_id"].nunique(),
+        "class_counts":  {str(k): int(n) for k, n in df["class"].value_counts().items()},
+        "hist":          {name: np.histogram(df[df["class"] == name]["conf"], bins=20)
+                          for name in CLASS_NAMES.values()},
+        "per_frame":     (per_frame.index.to_numpy(), {str(c): per_frame[c].to_numpy() for c in per_frame.columns}),
+    }
+
+
+def stats_summary_chunked(path, chunk_rows=1 << 20):
+    """stats_summary() computed in two streaming passes over `path`.
+
+    Pass 1 accumulates counts, sums, per-frame tallies (arrays indexed by frame) and the
+    per-class confidence range; pass 2 bins confidences on the same 20 edges np.histogram
+    would pick for the whole column, so the histograms match the in-memory path exactly.
+    """
+    cols, names = ["frame", "track_id", "class", "conf"], list(CLASS_NAMES.values())
+    n = conf_sum = 0
+    per_frame = np.zeros((len(names), 0), np.int64)            # class x frame detection counts
+    tracks, lo, hi = set(), {}, {}
+    for df in iter_detections(path, cols, chunk_rows):
+        n += len(df); conf_sum += df["conf"].to_numpy(np.float64).sum()
+        tracks.update(_unique_ints(df["track_id"]))
+        frame = df["frame"].to_numpy(np.int64)
+        code  = _class_codes(df["class"], names)
+        if len(frame) and frame.max() >= per_frame.shape[1]:
+            grown = np.zeros((len(names), max(2 * per_frame.shape[1], int(frame.max()) + 1)), np.int64)
+            grown[:, :per_frame.shape[1]] = per_frame; per_frame = grown
+        ok = code >= 0
+        np.add.at(per_frame, (code[ok], frame[ok]), 1)
+        conf = df["conf"].to_numpy()                         # native dtype: float32 columns bin as float32
+        for k, name in enumerate(names):
+            c = conf[code == k]
+            if len(c):
+                lo[name] = min(lo.get(name, c.min()), c.min()); hi[name] = max(hi.get(name, c.max()), c.max())
+    hist = {name: np.histogram(np.empty(0), bins=20) for name in names}
+    edges = {name: np.histogram_bin_edges(np.array([lo[name], hi[name]]), 20) for name in lo}
+    counts = {name: np.zeros(20, np.int64) for name in edges}
+    for df in iter_detections(path, ["class", "conf"], chunk_rows):
+        code, conf = _class_codes(df["class"], names), df["conf"].to_numpy()
+        for name in edges:
+            counts[name] += np.histogram(conf[code == names.index(name)], edges[name])[0]
+    hist.update({name: (counts[name], edges[name]) for name in edges})
+
+    present = per_frame.sum(0) > 0
+    observed = [k for k in range(len(names)) if per_frame[k].any()]
+    ball = names.index("sports_ball")
+    return {
+        "detections":    n,
+        "frames":        int(present.sum()),
+        "frames_w_ball": int((per_frame[ball] > 0).sum()),
+        "mean_conf":     conf_sum / n if n else float("nan"),
+        "track_ids":     len(tracks),
+        "class_counts":  dict(sorted(((names[k], int(per_frame[k].sum())) for k in observed),
+                                     key=lambda kv: -kv[1])),
+        "hist":          hist,
+        "per_frame":     (np.flatnonzero(present), {names[k]: per_frame[k][present] for k in observed}),
+    }
+
+
+def _unique_ints(s):
+    return s.dropna().astype(np.int64).unique().tolist()
+
+
+def _class_codes(s, names):
+    """Class column (names or categorical) -> int index into `names`, -1 for anything else."""
+    lookup = {name: k for k, name in enumerate(names)}
+    cat = s.astype("category")
+    table = np.array([lookup.get(str(c), -1) for c in cat.cat.categories] + [-1], np.int64)
+    return table[cat.cat.codes.to_numpy()]                # code -1 (missing) hits the trailing -1
+
+
+ANALYZE_COLUMNS = ["frame", "track_id", "class", "conf", "y1", "y2", "cx", "cy"]
+
+
+def _grow(a, n, fill):
+    """`a` extended to at least `n` entries (doubling), new entries set to `fill`."""
+    if n <= len(a): return a
+    out = np.full(max(2 * len(a), n), fill, a.dtype)
+    out[:len(a)] = a
+    return out
+
+
+def _reindex(a, at, n, fill):
+    """Rows of `a` moved to positions `at` of a new n-row array filled with `fill`."""
+    out = np.full((n,) + a.shape[1:], fill, a.dtype)
+    out[at] = a
+    return out
+
+
+def _group_starts(keys):
+    """Boolean mask of the first element of every run of equal values in sorted `keys`."""
+    return np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.zeros(0, bool)
+
+
+class MatchAnalyzer:
+    """Possession, passes, ball speed, distance covered and heatmaps over detection output.
+
+    Feed frame-ordered chunks to update(); the last frame of each chunk is held back until
+    a later chunk (or final=True) shows it is complete, so a file can be fed in any pieces,
+    including the .part file extract_csv() is still writing (see CsvFollower). All state
+    carried between chunks is per frame or per track, and results do not depend on where
+    the chunks were cut.
+
+    Teams are not in the detections, so possession is per track id and a pass is any
+    change of possession between two tracks (interceptions included). Distances are px.
+
+    reach    ball centre within reach * box height of a player's feet = that player has it
+    hold     frames a player must keep the ball for it to count as possession
+    max_gap  longest gap (frames) a pass, a ball-speed step or a player's path may bridge
+    """
+
+    def __init__(self, fps=25.0, reach=0.6, hold=5, max_gap=50, grid=(48, 27), extent=(1920, 1080)):
+        self.fps, self.reach, self.hold, self.max_gap = fps, reach, hold, max_gap
+        self.grid, self.extent = tuple(grid), tuple(extent)
+        self.frames = 0                                    # frames [0, frames) are final
+        self.bx = self.by = np.full(0, np.nan)             # ball centre per frame (NaN: not seen)
+        self.owner = np.full(0, -1, np.int64)              # nearest player in reach per frame
+        self.cursor, self.runs = 0, []                     # start of the open run; closed (3, k) runs
+        self.last_ball, self.speeds = -1, []
+        self.ids = np.zeros(0, np.int64)                   # sorted track ids; rows of the arrays below
+        self.heat = np.zeros((0, grid[1], grid[0]), np.int64)
+        self.dist = np.zeros(0)
+        self.last_f, self.last_x, self.last_y = np.zeros(0, np.int64), np.zeros(0), np.zeros(0)
+        self.tail = None
+
+    def update(self, df, final=False):
+        """Add a DataFrame of ANALYZE_COLUMNS (or None); final=True also flushes the held frame."""
+        cols = None
+        if df is not None and len(df):
+            cols = {c: df[c].to_numpy(np.float64) for c in ("conf", "y1", "y2", "cx", "cy")}
+            cols.update(frame=df["frame"].to_numpy(np.int64), track=df["track_id"].to_numpy(np.int64),
+                        code=_class_codes(df["class"], list(CLASS_NAMES.values())))
+        if self.tail is not None:
+            cols = self.tail if cols is None else {c: np.concatenate([self.tail[c], cols[c]]) for c in cols}
+        self.tail = None
+        if cols is None:
+            if final: self._close_runs(final)
+            return
+        if not final:
+            held = cols["frame"] == cols["frame"].max()
+            self.tail = {c: v[held] for c, v in cols.items()}
+            cols = {c: v[~held] for c, v in cols.items()}
+        if len(cols["frame"]): self._add(cols)
+        self._close_runs(final)
+
+    def _add(self, c):
+        lo, hi = self.frames, int(c["frame"].max()) + 1
+        self.bx, self.by = _grow(self.bx, hi, np.nan), _grow(self.by, hi, np.nan)
+        self.owner = _grow(self.owner, hi, -1)
+        names = list(CLASS_NAMES.values())
+
+        # ball: the most confident ball detection of each frame
+        b = np.flatnonzero(c["code"] == names.index("sports_ball"))
+        b = b[np.lexsort((-c["conf"][b], c["frame"][b]))]
+        b = b[_group_starts(c["frame"][b])]
+        self.bx[c["frame"][b]], self.by[c["frame"][b]] = c["cx"][b], c["cy"][b]
+
+        # owner: the tracked player whose feet are nearest the ball, within reach
+        p = np.flatnonzero((c["code"] == names.index("person")) & (c["track"] >= 0))
+        f, tid, x, y = c["frame"][p], c["track"][p], c["cx"][p], c["y2"][p]
+        dx, dy = self.bx[f] - x, self.by[f] - y
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d = np.sqrt(dx * dx + dy * dy) / (y - c["y1"][p])
+        near = np.flatnonzero(d <= self.reach)             # NaN (no ball) never compares true
+        near = near[np.lexsort((d[near], f[near]))]
+        near = near[_group_starts(f[near])]
+        self.owner[f[near]] = tid[near]
+
+        # ball speed between consecutive sightings, px/s
+        seen = np.flatnonzero(np.isfinite(self.bx[lo:hi])) + lo
+        if self.last_ball >= 0: seen = np.r_[self.last_ball, seen]
+        if len(seen) > 1:
+            gap = np.diff(seen)
+            step = np.hypot(np.diff(self.bx[seen]), np.diff(self.by[seen]))
+            self.speeds.append((step / gap * self.fps)[gap <= self.max_gap])
+        if len(seen): self.last_ball = int(seen[-1])
+
+        # per-track arrays sorted by (track, frame): heatmap cells and path length
+        new = np.setdiff1d(tid, self.ids)
+        if len(new):
+            ids = np.union1d(self.ids, new)
+            at = np.searchsorted(ids, self.ids)
+            self.heat, self.dist = _reindex(self.heat, at, len(ids), 0), _reindex(self.dist, at, len(ids), 0)
+            self.last_f = _reindex(self.last_f, at, len(ids), np.iinfo(np.int64).min // 2)
+            self.last_x = _reindex(self.last_x, at, len(ids), np.nan)
+            self.last_y = _reindex(self.last_y, at, len(ids), np.nan)
+            self.ids = ids
+        order = np.lexsort((f, tid))
+        row, f, x, y = np.searchsorted(self.ids, tid[order]), f[order], x[order], y[order]
+        (gx, gy), (w, h) = self.grid, self.extent
+        cell = (np.clip((y / h * gy).astype(np.int64), 0, gy - 1) * gx
+                + np.clip((x / w * gx).astype(np.int64), 0, gx - 1))
+        self.heat += np.bincount(row * (gx * gy) + cell, minlength=self.heat.size).reshape(self.heat.shape)
+        first = _group_starts(row)
+        prev_f = np.where(first, self.last_f[row], np.r_[0, f[:-1]])
+        prev_x = np.where(first, self.last_x[row], np.r_[0, x[:-1]])
+        prev_y = np.where(first, self.last_y[row], np.r_[0, y[:-1]])
+        ok = f - prev_f <= self.max_gap
+        self.dist += np.bincount(row[ok], np.hypot(x - prev_x, y - prev_y)[ok], minlength=len(self.ids))
+        last = np.r_[first[1:], True] if len(row) else first
+        self.last_f[row[last]], self.last_x[row[last]], self.last_y[row[last]] = f[last], x[last], y[last]
+        self.frames = hi
+
+    def _runs(self, final):
+        """(owner, start, end) possession runs from the cursor on; the run touching the last
+        frame is left open (and the cursor parked on it) unless `final`."""
+        o = self.owner[self.cursor:self.frames]
+        start = np.flatnonzero(_group_starts(o))
+        end = np.r_[start[1:], len(o)]
+        cursor = self.cursor + (start[-1] if len(start) and not final else len(o))
+        if not final: start, end = start[:-1], end[:-1]
+        keep = (o[start] >= 0) & (end - start >= self.hold)
+        return np.stack([o[start][keep], start[keep] + self.cursor, end[keep] + self.cursor]), cursor
+
+    def _close_runs(self, final):
+        runs, self.cursor = self._runs(final)
+        if runs.shape[1]: self.runs.append(runs)
+
+    def report(self):
+        """Summary dict of everything so far; the open possession run counts as if it ended now."""
+        tail, _ = self._runs(final=True)
+        owner, start, end = np.concatenate(self.runs + [tail], axis=1)
+        held = np.bincount(np.searchsorted(self.ids, owner), end - start, minlength=len(self.ids))
+        p = np.flatnonzero((owner[1:] != owner[:-1]) & (start[1:] - end[:-1] <= self.max_gap))
+        release, arrive = end[p] - 1, start[p + 1]
+        length = np.hypot(self.bx[arrive] - self.bx[release], self.by[arrive] - self.by[release])
+        speeds = np.concatenate(self.speeds) if self.speeds else np.zeros(0)
+        pct = (lambda q: round(float(np.percentile(speeds, q)), 1)) if len(speeds) else (lambda q: None)
+        by_held = np.argsort(-held, kind="stable")
+        return {
+            "frames":     self.frames,
+            "fps":        self.fps,
+            "ball_frames": int(np.isfinite(self.bx[:self.frames]).sum()),
+            "possession": {int(self.ids[k]): int(held[k]) for k in by_held if held[k]},
+            "passes":     [{"from": int(owner[i]), "to": int(owner[i + 1]), "release": int(r),
+                            "arrive": int(a), "px": round(float(n), 1)}
+                           for i, r, a, n in zip(p, release, arrive, length)],
+            "ball_speed": {"median": pct(50), "p95": pct(95), "max": pct(100)},
+            "distance":   {int(i): round(float(d), 1) for i, d in zip(self.ids, self.dist)},
+        }
+
+
+class CsvFollower:
+    """Reads the rows appended to a CSV since the last read(), up to the last complete line.
+
+    `path` may name either the final .csv or the .part file extract_csv() writes while it
+    runs: the .part is read while it exists, and once it has been renamed the remaining
+    rows are read from the final name and `done` is set (the rename means the run ended).
+    """
+
+    def __init__(self, path, columns=None):
+        path = Path(path)
+        self.final = path.with_suffix("") if path.suffix == ".part" else path
+        self.part = self.final.with_name(self.final.name + ".part")
+        self.columns, self.offset, self.header, self.done = columns, 0, None, False
+
+    def read(self):
+        import io
+        import pandas as pd
+        try:
+            f = open(self.part, "rb")
+        except FileNotFoundError:
+            try:
+                f = open(self.final, "rb")
+            except FileNotFoundError:
+                return None                                  # not started yet
+            self.done = True                                 # renamed: nothing more will be written
+        with f:
+            f.seek(self.offset)
+            buf = f.read()
+        buf = buf[:buf.rfind(b"\n") + 1]
+        self.offset += len(buf)
+        if self.header is None and buf:
+            line, _, buf = buf.partition(b"\n")
+            self.header = line.decode().strip().split(",")
+        if not buf: return None
+        return pd.read_csv(io.BytesIO(buf), header=None, names=self.header, usecols=self.columns)
+
+
+def analyze(csv_path, fps=25.0, reach=0.6, hold=5, max_gap=50, grid=(48, 27), extent=(1920, 1080),
+            follow=0.0, idle=60.0, chunk_rows=1 << 20):
+    """Possession, passes, ball speed, distance covered and heatmaps per track.
+
+    --fps F        frame rate of the source video (ball speed is px/s, times in seconds)
+    --reach R      possession radius around a player's feet, in player box heights
+    --hold N       frames a player must keep the ball for possession / a pass to count
+    --max-gap N    longest owner-less gap (frames) between two possessions that is still a pass
+    --grid X Y     heatmap cells over --extent W H (the video resolution)
+    --follow S     the CSV is still being written (pass the .csv or its .csv.part): poll every
+                   S seconds and only read the new rows, rewriting the outputs as frames come
+                   in; stops when extract_csv() renames the .part, after --idle seconds
+                   without growth, or on Ctrl-C
+
+    Writes <name>_analysis.json and <name>_heatmaps.npz next to the input.
+    """
+    import time
+    path = Path(csv_path)
+    if path.suffix == ".part": path = path.with_suffix("")    # outputs named after the finished file
+    out_json = path.with_name(f"{path.stem}_analysis.json")
+    out_npz  = path.with_name(f"{path.stem}_heatmaps.npz")
+    a = MatchAnalyzer(fps, reach, hold, max_gap, grid, extent)
+
+    def save():
+        report = a.report()
+        out_json.write_text(json.dumps(report, indent=1))
+        np.savez_compressed(out_npz, track_id=a.ids, heat=a.heat, extent=np.array(a.extent))
+        return report
+
+    t0 = time.perf_counter()
+    if not follow:
+        for df in iter_detections(path, ANALYZE_COLUMNS, chunk_rows):
+            a.update(df)
+        a.update(None, final=True)
+    else:
+        tail, quiet_since = CsvFollower(path, ANALYZE_COLUMNS), time.monotonic()
+        try:
+            while not tail.done and time.monotonic() - quiet_since < idle:
+                frames = a.frames
+                a.update(tail.read())
+                if a.frames > frames:
+                    quiet_since = time.monotonic()
+                    r = save()
+                    print(f"[analyze] {a.frames:,} frames  {len(r['passes']):,} passes")
+                if not tail.done: time.sleep(follow)
+        except KeyboardInterrupt:
+            pass
+        a.update(tail.read(), final=True)
+    r = save()
+    elapsed = time.perf_counter() - t0
+
+    minutes, seconds = divmod(round(r["frames"] / fps), 60)
+    held = sum(r["possession"].values())
+    top = ", ".join(f"#{t} {n / max(held, 1) * 100:.1f}%" for t, n in list(r["possession"].items())[:5])
+    print(f"\nFrames      : {r['frames']:,} ({minutes}:{seconds:02d} at {fps:g} fps)")
+    print(f"Ball seen   : {r['ball_frames'] / max(r['frames'], 1) * 100:.1f}% of frames")
+    print(f"Possession  : {held / max(r['ball_frames'], 1) * 100:.1f}% of ball frames held; top {top or '-'}")
+    if r["passes"]:
+        print(f"Passes      : {len(r['passes']):,} (median {np.median([q['px'] for q in r['passes']]):.0f} px)")
+    else:
+        print("Passes      : 0")
+    if r["ball_speed"]["median"] is not None:
+        s = r["ball_speed"]
+        print(f"Ball speed  : median {s['median']:.0f}  p95 {s['p95']:.0f}  max {s['max']:.0f} px/s")
+    print(f"Analysed in {elapsed:.2f} s -> {out_json}, {out_npz}")
+    return r
+
+
+LINK_MODES = ("auto", "reflink", "hardlink", "symlink", "copy")
+
+
+def _reflink(src, dst):
+    """Copy-on-write clone (Btrfs, XFS, ...) via the Linux FICLONE ioctl; OSError where unsupported."""
+    import fcntl
+    import os
+    if not hasattr(fcntl, "ioctl") or os.uname().sysname != "Linux":
+        raise OSError("reflink needs Linux")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), 0x40049409, s.fileno())          # FICLONE
+        except OSError:
+            d.close(); os.unlink(dst)
+            raise
+
+
+def materialize(src, dst, modes, disabled):
+    """Create `dst` from `src` with the first of `modes` that works; returns the mode used.
+
+    A mode that fails for filesystem reasons (cross-device, unsupported) is added to
+    `disabled` so the remaining files go straight to the next one.
+    """
+    import os
+    for mode in modes:
+        if mode in disabled: continue
+        try:
+            if   mode == "reflink":  _reflink(src, dst)
+            elif mode == "hardlink": os.link(src, dst)
+            elif mode == "symlink":  os.symlink(os.path.abspath(src), dst)
+            else:                    shutil.copyfile(src, dst)
+            return mode
+        except FileExistsError:
+            raise
+        except OSError:
+            if mode == "copy": raise
+            disabled.add(mode)
+    raise OSError(f"no link mode left for {src}")
+
+
+def collect_used_images(mode="auto", workers=8):
+    """Materialize the filtered training images under data/coco_filtered/.
+
+    --mode auto       reflink (copy-on-write), else hardlink, else copy — no extra disk where possible
+    --mode M          reflink / hardlink / symlink only, falling back to copy; or copy
+    --workers N       threads creating files (default 8)
+
+    Images already present with the same size are skipped, so re-runs are incremental.
+    """
+    import os
+    from collections import Counter
+    from concurrent.futures import ThreadPoolExecutor
+    modes    = ("reflink", "hardlink", "copy") if mode == "auto" else tuple(dict.fromkeys((mode, "copy")))
+    disabled = set()
     dest = ROOT / "data" / "coco_filtered"
     for split in ("train2017", "val2017"):
         (dest / split).mkdir(parents=True, exist_ok=True)
 
+    def one(p):
+        d = dest / split / os.path.basename(p)
+        try:
+            if d.stat().st_size == os.stat(p).st_size: return "present"
+            d.unlink()
+        except FileNotFoundError:
+            pass
+        return materialize(p, d, modes, disabled)
+
     for txt, split in [(ROOT / "data/train.txt", "train2017"),
                        (ROOT / "data/val.txt",   "val2017")]:
         if not txt.exists():
             print(f"[collect] {txt.name} not found — run prepare first.")
             continue
         paths = [p for p in txt.read_text().splitlines() if p]
-        print(f"[collect] Copying {len(paths):,} {split} images ...", flush=True)
-        for p in tqdm(paths, desc=split, unit="img"):
-            shutil.copy(p, dest / split / Path(p).name)
+        print(f"[collect] Linking {len(paths):,} {split} images (mode={mode}, {workers} threads) ...", flush=True)
+        with ThreadPoolExecutor(max(1, workers)) as pool:
+            used = Counter(tqdm(pool.map(one, paths), total=len(paths), desc=split, unit="img"))
+        print(f"  {', '.join(f'{n:,} {m}' for m, n in used.most_common())}")
 
     print(f"[collect] Done -> {dest}")
 
 
-def roboflow_export():
-    """Package data/labeled/ into a Roboflow-ready zip (YOLOv8 format)."""
+ZIP_STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}    # already compressed: DEFLATE only costs time
+
+
+def roboflow_export(workers=8):
+    """Package data/labeled/ into a Roboflow-ready zip (YOLOv8 format).
+
+    Images are stored (ZIP_STORED) and read ahead by `workers` threads; labels are deflated.
+    """
     import zipfile
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
     labeled   = ROOT / "data" / "labeled"
     images_dir = labeled / "images"
     labels_dir = labeled / "labels"
@@ -341,16 +2234,24 @@ def roboflow_export():
         print("[roboflow] No images found in data/labeled/images/ — run label first.")
         return
 
+    def read(path, arcname):
+        info = zipfile.ZipInfo.from_file(path, arcname)
+        info.compress_type = zipfile.ZIP_STORED if path.suffix.lower() in ZIP_STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+        return info, path.read_bytes()
+
+    entries = [(p, f"images/{p.name}") for p in images] + [(p, f"labels/{p.name}") for p in labels]
     out_zip = ROOT / "data" / "roboflow_export.zip"
-    with zipfile.ZipFile(out_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+    with zipfile.ZipFile(out_zip, "w", zipfile.ZIP_DEFLATED) as zf, ThreadPoolExecutor(max(1, workers)) as pool:
         # classes.txt — required by Roboflow for YOLO format
         zf.writestr("classes.txt", "\n".join(CLASS_NAMES[i] for i in sorted(CLASS_NAMES)))
 
-        for img in images:
-            zf.write(img, f"images/{img.name}")
-
-        for lbl in labels:
-            zf.write(lbl, f"labels/{lbl.name}")
+        ahead, todo = deque(), iter(entries)                  # bounded read-ahead: memory ~ 4 x workers files
+        for path, arcname in todo:
+            ahead.append(pool.submit(read, path, arcname))
+            if len(ahead) >= 4 * max(1, workers):
+                zf.writestr(*ahead.popleft().result())
+        while ahead:
+            zf.writestr(*ahead.popleft().result())
 
     print(f"[roboflow] Exported {len(images)} images, {len(labels)} labels -> {out_zip}")
     print("[roboflow] Upload steps:")
@@ -359,16 +2260,285 @@ def roboflow_export():
     print("  3. Format → YOLOv8")
 
 
-def clean_cache():
-    """Delete Ultralytics disk-cache files (.npy, .cache) from the dataset dirs."""
-    exts = {".npy", ".cache"}
-    total_files, total_bytes = 0, 0
-    for path in COCO_ROOT.rglob("*"):
-        if path.suffix in exts and path.is_file():
-            total_bytes += path.stat().st_size
-            path.unlink()
-            total_files += 1
-    print(f"[clean] Removed {total_files:,} cache files ({total_bytes / 1e9:.2f} GB)")
+def scan_suffix(root, suffixes, workers=8, action=None):
+    """Yield action(entry) (default: the os.DirEntry) for files under `root` whose
+    suffix is in `suffixes`.
+
+    Directories are listed in parallel (one os.scandir per task) and `action` runs
+    inside that task; only matching entries are touched, so nothing else is
+    stat()ed or turned into a Path.
+    """
+    import os
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    def scan(d):
+        subdirs, hits = [], []
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False): subdirs.append(e.path)
+                    elif os.path.splitext(e.name)[1] in suffixes and e.is_file(follow_symlinks=False):
+                        hits.append(action(e) if action else e)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            pass
+        return subdirs, hits
+
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        pending = {pool.submit(scan, str(root))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                subdirs, hits = fut.result()
+                pending |= {pool.submit(scan, d) for d in subdirs}
+                yield from hits
+
+
+def clean_cache(workers=8):
+    """Delete Ultralytics disk-cache files (.npy, .cache) from the dataset dirs.
+
+    --workers N   threads scanning directories and deleting files (default 8)
+    """
+    import os
+
+    def remove(entry):
+        size = entry.stat(follow_symlinks=False).st_size
+        os.unlink(entry.path)
+        return size
+
+    sizes = list(scan_suffix(COCO_ROOT, {".npy", ".cache"}, workers, remove))
+    print(f"[clean] Removed {len(sizes):,} cache files ({sum(sizes) / 1e9:.2f} GB)")
+
+
+# ── Inference server ───────────────────────────────────────────────────────────
+
+SERVE_PORT = 8765
+
+
+def _serve_jobs():
+    return {"track": track, "csv": extract_csv, "label": label, "label-video": label_video}
+
+
+def _serve_worker(wid, warm, threads, tasks, results):
+    """Worker process: load and warm the models once, then run jobs until a None task arrives."""
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        for spec in warm:
+            size, backend = spec.split(":")
+            model = load_model(size, backend, threads)
+            model.predict(np.zeros((640, 640, 3), np.uint8), verbose=False, **run_args(model, 640))
+    except Exception as e:
+        results.put(("error", wid, f"{type(e).__name__}: {e}"))
+        return
+    results.put(("ready", wid, None))
+    jobs = _serve_jobs()
+    while (task := tasks.get()) is not None:
+        jid, cmd, kwargs = task
+        if kwargs.get("threads") is None: kwargs["threads"] = threads    # same cache key as the warm-up
+        results.put(("start", jid, wid))
+        try:
+            out = jobs[cmd](**kwargs)
+            event = ("done", jid, None if out is None else str(out))
+        except Exception as e:
+            event = ("failed", jid, f"{type(e).__name__}: {e}")
+        results.put(("models", wid, [":".join(str(k) for k in key) for key in _MODELS]))
+        results.put(event)
+
+
+class JobBoard:
+    """Server-side job table: queue state of every job plus wait / run latency per command."""
+
+    def __init__(self, tasks):
+        import threading
+        self.tasks, self.cond = tasks, threading.Condition()
+        self.jobs, self.ready, self.errors, self.dead = {}, set(), {}, {}   # worker id -> reason
+        self.models = {}                                                   # worker id -> cached model keys
+        self.latency = defaultdict(list)                                   # cmd -> [(wait_s, run_s)]
+
+    def submit(self, cmd, kwargs):
+        from time import time
+        with self.cond:
+            jid = len(self.jobs) + 1
+            self.jobs[jid] = {"id": jid, "cmd": cmd, "state": "queued", "submitted": time()}
+        self.tasks.put((jid, cmd, kwargs))
+        return jid
+
+    def collect(self, results):
+        """Apply worker events (ready / start / done / failed) until a None arrives."""
+        from time import time
+        while (msg := results.get()) is not None:
+            event, jid, value = msg
+            with self.cond:
+                if event == "ready":
+                    self.ready.add(jid)
+                elif event == "error":
+                    self.errors[jid] = f"worker {jid}: {value}"
+                elif event == "models":
+                    self.models[jid] = value
+                elif event == "start":
+                    self.jobs[jid].update(state="running", worker=value, started=time())
+                    if value in self.dead: self._finish(self.jobs[jid], "failed", self.dead[value])
+                else:
+                    self._finish(self.jobs[jid], event, value)
+                self.cond.notify_all()
+
+    def _finish(self, job, event, value):
+        from time import time
+        job.update(state=event, finished=time(), **{"output" if event == "done" else "error": value})
+        job.setdefault("started", job["finished"])                     # failed while still queued
+        job["wait_s"]    = job["started"] - job["submitted"]
+        job["run_s"]     = job["finished"] - job["started"]
+        job["latency_s"] = job["finished"] - job["submitted"]
+        self.latency[job["cmd"]].append((job["wait_s"], job["run_s"]))
+
+    def watch(self, procs, every=1.0):
+        """Fail the jobs of worker processes that died (crash, OOM kill) instead of leaving them
+        "running" forever; once no worker is left, fail the queued jobs too."""
+        from time import sleep
+        while True:
+            for wid, proc in enumerate(procs):
+                if wid in self.dead or proc.is_alive(): continue
+                reason = f"worker {wid} exited with code {proc.exitcode}"
+                with self.cond:
+                    self.dead[wid] = reason
+                    if wid not in self.ready: self.errors.setdefault(wid, reason)   # died warming up
+                    for job in self.jobs.values():
+                        if (job["state"] == "running" and job["worker"] == wid
+                                or job["state"] == "queued" and len(self.dead) == len(procs)):
+                            self._finish(job, "failed", reason)
+                    self.cond.notify_all()
+            sleep(every)
+
+    def get(self, jid, wait=0.0):
+        """Job dict, waiting up to `wait` s for it to finish (long poll)."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.jobs[jid]["state"] in ("done", "failed"), timeout=wait)
+            return dict(self.jobs[jid])
+
+    def metrics(self):
+        with self.cond:
+            states = defaultdict(int)
+            for job in self.jobs.values(): states[job["state"]] += 1
+            per_cmd = {}
+            for cmd, xs in self.latency.items():
+                wait, run = np.array(xs).T
+                total = wait + run
+                per_cmd[cmd] = {"jobs": len(xs),
+                                "wait_p50_s": float(np.percentile(wait, 50)),
+                                "run_p50_s":  float(np.percentile(run, 50)),
+                                "latency_p50_s": float(np.percentile(total, 50)),
+                                "latency_p95_s": float(np.percentile(total, 95))}
+            return {"workers_ready": len(self.ready), "workers_dead": len(self.dead), "queue_depth": states["queued"], "running": states["running"],
+                    "done": states["done"], "failed": states["failed"], "latency": per_cmd,
+                    "models": {str(w): keys for w, keys in self.models.items()}}
+
+
+def serve(host="127.0.0.1", port=SERVE_PORT, workers=1, warm=("n:pt",), threads=None):
+    """Keep warmed models resident in `workers` processes and run jobs submitted over HTTP.
+
+    POST /jobs {"cmd": "csv", "kwargs": {...}}  -> {"id": N}   (cmd: track, csv, label, label-video)
+    GET  /jobs/N?wait=30                        -> job state, output / error, wait_s / run_s / latency_s
+    GET  /metrics                               -> queue depth, running / done / failed, latency per cmd,
+                                                   models cached per worker
+
+    --warm size:backend   models each worker loads and warms before taking jobs (others load on first use)
+    --threads N           torch / ONNX Runtime threads per worker (default: cores / workers)
+    """
+    import multiprocessing as mp
+    import os
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    ctx = mp.get_context("spawn")                    # fresh interpreters: no forked torch / CUDA state
+    tasks, results = ctx.Queue(), ctx.Queue()
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    procs = [ctx.Process(target=_serve_worker, args=(i, list(warm), threads, tasks, results), daemon=True)
+             for i in range(workers)]
+    for proc in procs: proc.start()
+    board = JobBoard(tasks)
+    threading.Thread(target=board.collect, args=(results,), daemon=True).start()
+    threading.Thread(target=board.watch, args=(procs,), daemon=True).start()
+    print(f"[serve] Starting {workers} worker(s) x {threads} threads, warming {', '.join(warm)} ...", flush=True)
+    with board.cond:
+        board.cond.wait_for(lambda: len(board.ready | set(board.errors)) == workers)
+    if board.errors:
+        for proc in procs: proc.terminate()
+        raise SystemExit("[serve] Warm-up failed — " + "; ".join(board.errors.values()))
+    jobs = _serve_jobs()
+
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, code, body):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                return self.reply(404, {"error": "not found"})
+            try:
+                req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError:
+                return self.reply(400, {"error": "body must be JSON"})
+            if req.get("cmd") not in jobs:
+                return self.reply(400, {"error": f"cmd must be one of {sorted(jobs)}"})
+            self.reply(202, {"id": board.submit(req["cmd"], req.get("kwargs", {}))})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                return self.reply(200, board.metrics())
+            parts = url.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit() and int(parts[1]) in board.jobs:
+                wait = float(parse_qs(url.query).get("wait", ["0"])[0])
+                return self.reply(200, board.get(int(parts[1]), min(wait, 60)))
+            self.reply(404, {"error": "not found"})
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    print(f"[serve] Ready — listening on http://{host}:{port}", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[serve] Shutting down ...", flush=True)
+    finally:
+        httpd.server_close()
+        for _ in procs: tasks.put(None)
+        for proc in procs: proc.join(timeout=10)
+        results.put(None)
+
+
+def submit_job(server, cmd, kwargs, poll=30, timeout=6 * 3600):
+    """Thin client: run `cmd` on a `serve` instance and block until it finishes,
+    giving up (SystemExit) when it has not finished after `timeout` seconds."""
+    import urllib.request
+    from time import monotonic
+    for key in ("video_in", "images_dir"):                 # the server may run from another cwd
+        if key in kwargs: kwargs[key] = str(Path(kwargs[key]).resolve())
+    req = urllib.request.Request(f"{server}/jobs", json.dumps({"cmd": cmd, "kwargs": kwargs}).encode(),
+                                 {"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        jid = json.load(resp)["id"]
+    print(f"[client] Job {jid} queued on {server}", flush=True)
+    deadline = monotonic() + timeout
+    while True:
+        wait = max(0, min(poll, deadline - monotonic()))
+        with urllib.request.urlopen(f"{server}/jobs/{jid}?wait={wait:.1f}", timeout=wait + 60) as resp:
+            job = json.load(resp)
+        if job["state"] in ("done", "failed"): break
+        if monotonic() >= deadline:
+            raise SystemExit(f"[client] Job {jid} still {job['state']} after {timeout:.0f} s — gave up waiting")
+    if job["state"] == "failed":
+        raise SystemExit(f"[client] Job {jid} failed: {job['error']}")
+    print(f"[client] Job {jid} done in {job['latency_s']:.2f} s "
+          f"({job['wait_s']:.2f} s queued, {job['run_s']:.2f} s running)"
+          + (f" -> {job['output']}" if job.get("output") else ""))
+    return job
 
 
 # ── CLI ────────────────────────────────────────────────────────────────────────
@@ -377,7 +2547,9 @@ if __name__ == "__main__":
     p = argparse.ArgumentParser()
     sub = p.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("prepare")
+    pr = sub.add_parser("prepare")
+    pr.add_argument("--workers", type=int, default=1, help="processes writing label files")
+    pr.add_argument("--full",    action="store_true", help="ignore the manifest and rewrite every label")
 
     t = sub.add_parser("train")
     t.add_argument("--size",   default="n", choices=["n","s","m","l"])
@@ -392,21 +2564,63 @@ if __name__ == "__main__":
     e = sub.add_parser("export")
     e.add_argument("--size",  default="n", choices=["n","s","m","l"])
     e.add_argument("--imgsz", type=int, default=640)
+    e.add_argument("--int8",    action="store_true", help="also write a calibrated INT8 ONNX model")
+    e.add_argument("--calib",   type=int, default=200, help="val images used for INT8 calibration")
+    e.add_argument("--compare", action="store_true", help="with --int8: validate FP32 vs INT8 and print a comparison table")
 
     tk = sub.add_parser("track")
     tk.add_argument("--video", required=True)
     tk.add_argument("--size",  default="n", choices=["n","s","m","l"])
     tk.add_argument("--conf",  type=float, default=0.25)
+    tk.add_argument("--pipeline", action="store_true", help="overlap decode / inference / encode on threads")
+    tk.add_argument("--queue",    type=int, default=8, help="frames buffered between pipeline stages")
+    tk.add_argument("--backend",  default="pt", choices=["pt", "onnx"])
+    tk.add_argument("--threads",  type=int, default=None, help="ONNX Runtime intra-op threads (default: all cores)")
+    tk.add_argument("--profile", nargs="?", const=True, default=None, metavar="PATH",
+                     help="per-stage latency report + JSON (or .prom) dump")
+    tk.add_argument("--server", default=None, metavar="URL", help="run the job on a `serve` instance")
+    tk.add_argument("--server-timeout", type=float, default=6 * 3600, metavar="SECONDS",
+                    help="give up waiting for a --server job after this long")
+    tk.add_argument("--roi",      type=int, nargs="?", const=640, default=0, metavar="IMGSZ",
+                    help="coarse pass at IMGSZ (default 640), full resolution only in crops around players / ball")
+    tk.add_argument("--roi-crop", type=int, default=320, help="crop size (pixels) for --roi")
 
     c = sub.add_parser("csv")
-    c.add_argument("--video", required=True)
+    c.add_argument("--video", required=True, help="a video, a directory of videos, or a glob (quoted)")
     c.add_argument("--size",  default="n", choices=["n","s","m","l"])
     c.add_argument("--conf",  type=float, default=0.25)
+    c.add_argument("--format", default="csv", choices=list(DETECTION_FORMATS),
+                   help="output format (parquet/arrow need pyarrow)")
+    c.add_argument("--pipeline", action="store_true", help="overlap decode / inference / writing on threads")
+    c.add_argument("--queue",    type=int, default=8, help="frames buffered between pipeline stages")
+    c.add_argument("--backend",  default="pt", choices=["pt", "onnx"])
+    c.add_argument("--threads",  type=int, default=None, help="ONNX Runtime intra-op threads (default: all cores; per worker with --jobs)")
+    c.add_argument("--segments", type=int, default=1, help="split one video into N time ranges tracked in parallel")
+    c.add_argument("--overlap",  type=int, default=30, help="frames shared by neighbouring segments for id matching")
+    c.add_argument("--jobs",     type=int, default=1, help="worker processes when --video is a directory / glob")
+    c.add_argument("--profile", nargs="?", const=True, default=None, metavar="PATH",
+                    help="per-stage latency report + JSON (or .prom) dump")
+    c.add_argument("--server", default=None, metavar="URL", help="run the job on a `serve` instance")
+    c.add_argument("--server-timeout", type=float, default=6 * 3600, metavar="SECONDS",
+                    help="give up waiting for a --server job after this long")
+    c.add_argument("--roi",      type=int, nargs="?", const=640, default=0, metavar="IMGSZ",
+                   help="coarse pass at IMGSZ (default 640), full resolution only in crops around players / ball")
+    c.add_argument("--roi-crop", type=int, default=320, help="crop size (pixels) for --roi")
+    c.add_argument("--detect-every", type=int, default=1, metavar="K",
+                   help="run the detector every K frames, optical flow in between (adds an `interpolated` column)")
 
     lb = sub.add_parser("label")
     lb.add_argument("--images", required=True)
     lb.add_argument("--size",   default="n", choices=["n","s","m","l"])
     lb.add_argument("--conf",   type=float, default=0.25)
+    lb.add_argument("--batch-size", type=int, default=1, help="images per forward pass")
+    lb.add_argument("--writers",    type=int, default=4, help="background writer threads (0 = inline)")
+    lb.add_argument("--jpeg-quality", type=int, default=95)
+    lb.add_argument("--backend",    default="pt", choices=["pt", "onnx"])
+    lb.add_argument("--threads",    type=int, default=None, help="ONNX Runtime intra-op threads")
+    lb.add_argument("--server", default=None, metavar="URL", help="run the job on a `serve` instance")
+    lb.add_argument("--server-timeout", type=float, default=6 * 3600, metavar="SECONDS",
+                    help="give up waiting for a --server job after this long")
 
     lv = sub.add_parser("label-video")
     lv.add_argument("--video", required=True)
@@ -417,25 +2631,102 @@ if __name__ == "__main__":
                     help="keep every Nth frame (e.g. 5 = one frame per ~0.2s at 25fps)")
     lv.add_argument("--preview-pct", type=int,   default=5,
                     help="percentage of kept frames to save as annotated previews (default 5)")
-
-    sub.add_parser("collect")
-    sub.add_parser("clean")
-    sub.add_parser("roboflow")
+    lv.add_argument("--batch-size",  type=int,   default=1,
+                    help="frames per forward pass (default 1)")
+    lv.add_argument("--writers",     type=int,   default=4,
+                    help="background writer threads for JPEGs / labels (0 = write inline)")
+    lv.add_argument("--jpeg-quality", type=int,  default=95)
+    lv.add_argument("--backend",     default="pt", choices=["pt", "onnx"])
+    lv.add_argument("--threads",     type=int,   default=None, help="ONNX Runtime intra-op threads")
+    lv.add_argument("--profile", nargs="?", const=True, default=None, metavar="PATH",
+                     help="per-stage latency report + JSON (or .prom) dump")
+    lv.add_argument("--server", default=None, metavar="URL", help="run the job on a `serve` instance")
+    lv.add_argument("--server-timeout", type=float, default=6 * 3600, metavar="SECONDS",
+                    help="give up waiting for a --server job after this long")
+    lv.add_argument("--roi",         type=int, nargs="?", const=640, default=0, metavar="IMGSZ",
+                    help="coarse pass at IMGSZ (default 640), full resolution only in crops around players / ball")
+    lv.add_argument("--roi-crop",    type=int, default=320, help="crop size (pixels) for --roi")
+
+    sv = sub.add_parser("serve")
+    sv.add_argument("--host",    default="127.0.0.1")
+    sv.add_argument("--port",    type=int, default=SERVE_PORT)
+    sv.add_argument("--workers", type=int, default=1, help="worker processes, each with its own resident models")
+    sv.add_argument("--warm",    nargs="+", default=["n:pt"], metavar="SIZE:BACKEND",
+                    help="models loaded and warmed at startup (e.g. n:pt n:onnx)")
+    sv.add_argument("--threads", type=int, default=None, help="torch / ONNX Runtime threads per worker")
+
+    co = sub.add_parser("collect")
+    co.add_argument("--mode",    default="auto", choices=LINK_MODES,
+                    help="auto: reflink, else hardlink, else copy; other modes fall back to copy")
+    co.add_argument("--workers", type=int, default=8, help="threads creating files")
+    cl = sub.add_parser("clean")
+    cl.add_argument("--workers", type=int, default=8, help="threads scanning / deleting")
+    rf = sub.add_parser("roboflow")
+    rf.add_argument("--workers", type=int, default=8, help="threads reading files into the zip")
 
     st = sub.add_parser("stats")
     st.add_argument("--csv", required=True)
+    st.add_argument("--chunk-rows", type=int, default=0,
+                    help="stream N rows at a time in bounded memory (0 = load the whole file)")
+
+    an = sub.add_parser("analyze")
+    an.add_argument("--csv", required=True)
+    an.add_argument("--fps",     type=float, default=25.0)
+    an.add_argument("--reach",   type=float, default=0.6, help="possession radius, in player box heights")
+    an.add_argument("--hold",    type=int, default=5, help="frames on the ball before possession counts")
+    an.add_argument("--max-gap", type=int, default=50, help="longest gap (frames) a pass may bridge")
+    an.add_argument("--grid",    type=int, nargs=2, default=[48, 27], metavar=("X", "Y"))
+    an.add_argument("--extent",  type=float, nargs=2, default=[1920, 1080], metavar=("W", "H"),
+                    help="video resolution the heatmap grid covers")
+    an.add_argument("--follow",  type=float, default=0, metavar="SECONDS",
+                    help="poll a growing CSV every SECONDS, reading only the appended rows")
+    an.add_argument("--idle",    type=float, default=60, help="--follow stops after this long without new rows")
 
     args = p.parse_args()
 
-    if   args.cmd == "prepare":  prepare()
+    if   args.cmd == "prepare":  prepare(args.workers, args.full)
     elif args.cmd == "train":    train(args.size, args.epochs, args.batch, args.imgsz, args.resume)
     elif args.cmd == "validate": validate(args.size)
-    elif args.cmd == "export":   export(args.size, args.imgsz)
-    elif args.cmd == "track":    track(args.video, args.size, args.conf)
-    elif args.cmd == "csv":      extract_csv(args.video, args.size, args.conf)
-    elif args.cmd == "label":       label(args.images, args.size, args.conf)
-    elif args.cmd == "label-video": label_video(args.video, args.size, args.conf, args.imgsz, args.every, args.preview_pct)
-    elif args.cmd == "stats":    stats(args.csv)
-    elif args.cmd == "collect":  collect_used_images()
-    elif args.cmd == "clean":    clean_cache()
-    elif args.cmd == "roboflow": roboflow_export()
+    elif args.cmd == "export":
+        if args.compare and not args.int8: p.error("--compare compares FP32 against INT8; add --int8")
+        export(args.size, args.imgsz, args.int8, args.calib, args.compare)
+    elif args.cmd == "csv" and (videos := find_videos(args.video)) is not None:
+        if args.server: p.error("--server takes a single --video")
+        if args.segments > 1: p.error("--segments splits a single --video; drop it for a folder / glob")
+        if args.pipeline or args.profile: p.error("--pipeline / --profile time a single video; drop them for a batch")
+        extract_csv_batch(videos, args.size, args.conf, fmt=args.format, jobs=args.jobs,
+                          backend=args.backend, threads=args.threads, roi=args.roi, roi_crop=args.roi_crop,
+                          detect_every=args.detect_every)
+    elif args.cmd == "csv" and args.segments > 1:
+        if args.server: p.error("--server runs a single segment; drop --segments")
+        if args.detect_every > 1: p.error("--detect-every tracks one video start to end; drop --segments")
+        if args.pipeline or args.profile: p.error("--pipeline / --profile time a single pass; drop --segments")
+        extract_csv_segments(args.video, args.size, args.conf, fmt=args.format, segments=args.segments,
+                             overlap=args.overlap, backend=args.backend, threads=args.threads,
+                             roi=args.roi, roi_crop=args.roi_crop)
+    elif args.cmd in ("track", "csv", "label", "label-video"):
+        common = dict(size=args.size, conf=args.conf, backend=args.backend, threads=args.threads)
+        if args.cmd != "label": common.update(roi=args.roi, roi_crop=args.roi_crop)
+        if   args.cmd == "track": job = dict(video_in=args.video, pipeline=args.pipeline, depth=args.queue,
+                                             profile=args.profile)
+        elif args.cmd == "csv":   job = dict(video_in=args.video, fmt=args.format, pipeline=args.pipeline,
+                                             depth=args.queue, profile=args.profile, detect_every=args.detect_every)
+        elif args.cmd == "label": job = dict(images_dir=args.images, batch_size=args.batch_size,
+                                             writers=args.writers, jpeg_quality=args.jpeg_quality)
+        else:                     job = dict(video_in=args.video, imgsz=args.imgsz, every=args.every,
+                                             preview_pct=args.preview_pct, batch_size=args.batch_size,
+                                             writers=args.writers, jpeg_quality=args.jpeg_quality,
+                                             profile=args.profile)
+        if args.server: submit_job(args.server.rstrip("/"), args.cmd, {**common, **job},
+                                   timeout=args.server_timeout)
+        else:           _serve_jobs()[args.cmd](**common, **job)
+    elif args.cmd == "serve":    serve(args.host, args.port, args.workers, args.warm, args.threads)
+    elif args.cmd == "stats":    stats(args.csv, args.chunk_rows)
+    elif args.cmd == "analyze":
+        if args.follow and not args.csv.endswith((".csv", ".csv.part")):
+            p.error("--follow reads a growing .csv (or the .csv.part extract_csv is writing)")
+        analyze(args.csv, args.fps, args.reach, args.hold, args.max_gap, args.grid, args.extent,
+                args.follow, args.idle)
+    elif args.cmd == "collect":  collect_used_images(args.mode, args.workers)
+    elif args.cmd == "clean":    clean_cache(args.workers)
+    elif args.cmd == "roboflow": roboflow_export(args.workers)